@@ -0,0 +1,74 @@
+import hashlib
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+# The fields of a .geom file that are coordinates of an image's corners in degrees (read as floats instead of text)
+GEOM_COORDINATE_FIELDS = frozenset({'ll_lat', 'll_lon', 'lr_lat', 'lr_lon',
+                                    'ul_lat', 'ul_lon', 'ur_lat', 'ur_lon'})
+
+# The field that holds the MD5 hash of the .geom file itself (not a line of the file)
+GEOM_CHECKSUM_FIELD = 'geom_checksum'
+
+
+def parse_geom(content: bytes) -> Dict[str, str]:
+    """Split the lines of a .geom file (`key:  value`, e.g. 'll_lat:  35.829193780614') into a dictionary in a single
+    pass over the file. Any line ending is accepted, and the first line of a key wins if a key is listed twice.
+
+    :param content: The content of the .geom file
+    :return: The text value of every key in the file
+    """
+    values: Dict[str, str] = dict()
+
+    for line in content.decode(errors='replace').splitlines():
+        key, separator, value = line.partition(':')
+
+        if separator:
+            key = key.strip()
+
+            if key not in values:
+                values[key] = value.strip()
+
+    return values
+
+
+def to_value(field_id: str, text: str) -> str or float:
+    """Convert the text value of a field to its type (a float for coordinates, or NaN if it is not a number)
+
+    :param field_id: The field the value belongs to (e.g. 'll_lat')
+    :param text: The text value of the field
+    :return: The typed value
+    """
+    if field_id not in GEOM_COORDINATE_FIELDS:
+        return text
+
+    try:
+        return float(text)
+    except ValueError:
+        return np.nan
+
+
+def read_geom_fields(content: bytes, field_ids: Iterable[str]) -> Tuple[Dict[str, str or float], set]:
+    """Find the values of fields in a .geom file, parsing and hashing the same bytes once each
+
+    :param content: The content of the .geom file
+    :param field_ids: The fields to find ('geom_checksum' for the MD5 hash of the file)
+    :return: The value of each field found (coordinates as floats), and the fields that were not in the file
+    """
+    values = parse_geom(content)
+
+    result: Dict[str, str or float] = dict()
+    missing = set()
+
+    for field_id in field_ids:
+        if field_id == GEOM_CHECKSUM_FIELD:
+            # Generate a md5 hash to help ensure the correct data is being referenced if compared elsewhere
+            result[field_id] = hashlib.md5(content).hexdigest()
+
+        elif values.get(field_id):
+            result[field_id] = to_value(field_id, values[field_id])
+
+        else:
+            missing.add(field_id)
+
+    return result, missing
@@ -1,18 +1,26 @@
-import hashlib
 import math
 import os
 import re
 import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import Union, List, Dict, Set, Pattern
+from typing import Union, List, Dict, Set, Pattern, Tuple, Iterator
 
 import numpy as np
 import pandas as pd
 
+from psicollect.cataloging.geom import GEOM_COORDINATE_FIELDS, read_geom_fields
+from psicollect.cataloging.sources import CatalogSource, FileSystemSource, RemoteArchiveSource, get_geom_name
+from psicollect.collector.storm import Storm
 from psicollect.common import h, s
 
 flag_unsaved_changes = False  # Keep track of if files have been committed to the disk
 
+# The date an image was taken in its path, e.g. '20180915' (assume years can only be 2000 to 2099, current unix time
+# ends at 2038 anyways)
+DATE_PATTERN: Pattern = re.compile('[\\D]*(20\\d{2})(\\d{2})(\\d{2})\\D')
+
 
 class Cataloging:
 
@@ -68,6 +76,8 @@ class Cataloging:
                                   save_interval: int = 1000,
                                   require_geom: bool = False,
                                   override_catalog_path: Union[bytes, str, None] = None,
+                                  source: CatalogSource = None,
+                                  geom_workers: int = s.DEFAULT_CATALOG_WORKERS,
                                   debug: bool = s.DEFAULT_DEBUG,
                                   verbosity: int = s.DEFAULT_VERBOSITY,
                                   **kwargs) -> None:
@@ -83,6 +93,10 @@ class Cataloging:
         :param require_geom: Whether (True) or not (False) to require a .geom file present in search for valid files
         :param override_catalog_path: If set, the program will not search for a catalog, and instead use the path to
         the catalog provided as a string.
+        :param source: Where to read the images from (defaults to the extracted files in the scope, see
+        `sources.ArchiveSource` for reading them straight out of the downloaded archives)
+        :param geom_workers: The number of processes to read the .geom files with (batches of files are handed out to
+        each process and the values are put back into the catalog by row, 1 = read them all in this process)
         :param debug: Whether (True) or not (False) to override default debug flag and output additional statements
         :param verbosity: The frequency of debug statement output (1 = LOW, 2 = MEDIUM, 3 = HIGH)
         """
@@ -92,6 +106,10 @@ class Cataloging:
         print('Parsing out current path to determine catalog variables to use ... ', end='')
 
         scope_path = h.validate_and_expand_path(path=scope_path)
+
+        if source is None:
+            source = FileSystemSource(scope_path=scope_path)
+
         storm_id: str or None = Cataloging._get_storm_from_path(scope_path=scope_path, debug=debug)
 
         if override_catalog_path is None:  # pragma: no cover
@@ -113,8 +131,7 @@ class Cataloging:
         print('Getting a list of all valid images ... ', end='')
 
         # Get a list of all files starting at the path specified
-        files: List[str] = h.all_files_recursively(scope_path, unix_sep=True, require_geom=require_geom,
-                                                   debug=debug, verbosity=verbosity, **kwargs)
+        files: List[str] = source.list_files(require_geom=require_geom, debug=debug, verbosity=verbosity, **kwargs)
 
         all_files = files.copy()
         for file_path in all_files:
@@ -164,18 +181,10 @@ class Cataloging:
 
             print('Parsing out information about images from their paths ... ', end='')
 
-            entries: List[Dict[str, str or int]] = list()
+            paths: pd.Series = pd.Series([source.get_path(file) for file in files], dtype=object)
 
-            for i in range(len(files)):
-                entry: dict = dict()
-                entry['file'] = files[i]
-                entry['storm_id'] = Cataloging._get_storm_from_path(os.path.join(scope_path, files[i])).lower()
-                entry['archive'] = Cataloging._get_archive_from_path(scope_path=os.path.join(scope_path, files[i]),
-                                                                     storm_id=entry['storm_id']).lower()
-                entry['image'] = Cataloging._get_image_from_path(os.path.join(scope_path, files[i]))
-                entries.append(entry)
-
-            catalog: pd.DataFrame = pd.DataFrame(entries)
+            catalog: pd.DataFrame = pd.DataFrame({'file': files})
+            catalog = catalog.join(Cataloging._get_path_columns(paths))
 
             # DataFrame is populated with these fields, so remove them from the needed list
             current_fields_needed -= {'file', 'storm_id', 'archive', 'image'}
@@ -189,37 +198,33 @@ class Cataloging:
 
                     print(f'\rGetting size of file {i + 1} of {len(files)} ({round((i / len(files)) * 100, 2)}%) ' +
                           '.' * (math.floor(((i + 1) % 9) / 3) + 1), end=' ')
-                    sizes.append(os.path.getsize(os.path.join(scope_path, files[i])))
+                    sizes.append(source.get_size(files[i]))
 
                 catalog['size'] = sizes
                 flag_unsaved_changes = True
                 current_fields_needed.remove('size')
 
             if 'date' in current_fields_needed:
-                dates: List[str] = list()
 
-                stat_count_missing_date: int = 0
+                print('\rGetting the dates the images were taken from their paths ... ', end='')
 
-                for i in range(len(files)):
+                # Search the paths of every image for a matching date format at once (if no date can be found, the
+                # entry is left blank)
+                parts: pd.DataFrame = paths.str.extract(DATE_PATTERN)
+                dates: pd.Series = parts[0] + '/' + parts[1] + '/' + parts[2]
 
-                    print(f'\rGetting date taken from file {i + 1} of {len(files)} ({round((i / len(files)) * 100, 2)}%) ' +
-                          '.' * (math.floor(((i + 1) % 9) / 3) + 1), end=' ')
+                stat_count_missing_date: int = int(dates.isna().sum())
 
-                    best_date: str or None = Cataloging._get_best_date(os.path.join(scope_path, files[i]))
-
-                    if best_date is None:
-                        # If no date can be found, leave the entry blank
-                        dates.append(np.nan)
-                        stat_count_missing_date += 1
-                    else:
-                        dates.append(Cataloging._get_best_date(os.path.join(scope_path, files[i])))
+                if debug:
+                    for file_path in paths[dates.isna()]:
+                        h.print_error('Could not find any date in ' + file_path + ' ... leaving it blank!')
 
                 if stat_count_missing_date > 0:
                     print(str(stat_count_missing_date) + ' images had unknown dates!')
                 else:
                     print('DONE')
 
-                catalog['date'] = dates
+                catalog['date'] = dates.to_numpy()
                 flag_unsaved_changes = True
                 current_fields_needed.remove('date')
 
@@ -247,6 +252,8 @@ class Cataloging:
                                                      save_interval=save_interval,
                                                      require_geom=require_geom,
                                                      override_catalog_path=override_catalog_path,
+                                                     source=source,
+                                                     geom_workers=geom_workers,
                                                      debug=debug,
                                                      verbosity=verbosity,
                                                      **kwargs)
@@ -267,88 +274,127 @@ class Cataloging:
         for field in current_fields_needed:
 
             # If a column for each field does not exist, create one for each field with all the values as empty strings
+            # (or as NaN for the coordinates, which are read from the .geom files as floats)
             if field not in catalog:
-                catalog[field] = ''
+                catalog[field] = np.nan if field in GEOM_COORDINATE_FIELDS else ''
                 flag_unsaved_changes = True
 
         stat_files_accessed: int = 0
         stat_count_missing_geom: int = 0
 
-        # For any remaining fields needed (i.e. ll_lat), look for them in the .geom files
-        for i, row in catalog.iterrows():
+        ending: str
+        if debug and verbosity >= 3:
+            ending = '\n'
+        else:
+            ending = '\r'
 
-            dots = math.floor(((i + 1) % 9) / 3) + 1
+        fields: List[str] = sorted(current_fields_needed)
 
-            print(f'\rProcessing .geom attributes of file {i + 1} of {len(files)} '
-                  f'({round((i / len(files)) * 100, 2)}%) ' +
-                  '.' * dots + ' ' * (3 - dots), end=' ')
+        # The values of each field by row (floats for the coordinates), filled in from the .geom files as they come in
+        # and put back into the catalog all at once instead of one cell at a time
+        columns: Dict[str, np.ndarray] = dict()
 
-            row_fields_needed = current_fields_needed.copy()
-            row_fields_existing = set()
+        # Whether (True) or not (False) each row still needs a value for each field (a column for each field)
+        needed = np.zeros((catalog.shape[0], len(fields)), dtype=bool)
 
-            # Remove redundant queries to .geom file if the data is already present in the catalog
-            for field in current_fields_needed:
-                if (type(row[field]) is str and len(row[field]) > 0) \
-                        or (type(row[field]) is not str and str(row[field]).lower() != "nan"):
-                    row_fields_existing.add(field)
-                    row_fields_needed.remove(field)
-
-            ending: str
-            if debug and verbosity >= 3:
-                ending = '\n'
+        for k, field in enumerate(fields):
+            values: pd.Series = catalog[field]
+
+            if field in GEOM_COORDINATE_FIELDS:
+                columns[field] = pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64, copy=True)
             else:
-                ending = '\r'
+                columns[field] = values.to_numpy(dtype=object, copy=True)
 
-            if len(row_fields_existing) > 0:
-                print(f'Found existing data for {row_fields_existing} ... skipping these fields!', end=ending)
+            # Remove redundant queries to .geom file if the data is already present in the catalog
+            needed[:, k] = (values.isna() | (values.astype(str).str.len() == 0)).to_numpy()
 
-            # Only query the .geom file if there are fields still unfilled
-            if len(row_fields_needed) > 0:
+            count_existing = catalog.shape[0] - int(needed[:, k].sum())
 
-                # Look up the fields that are needed and still missing data
-                geom_data: Dict[str, str] or None = Cataloging._get_geom_fields(
-                    field_id_set=row_fields_needed, file_path=os.path.join(
-                        scope_path, os.path.normpath(row['file'])), debug=debug, verbosity=verbosity)
-                stat_files_accessed += 1
+            if count_existing > 0:
+                print(f'Found existing data for {field} in {count_existing} of {catalog.shape[0]} rows ... skipping '
+                      f'these rows!', end=ending)
 
-                if geom_data is None:
-                    # The geom file does not exist
+        # The rows that still have fields to fill in from their .geom file (row, file, fields needed), where rows that
+        # need the same fields share the same set
+        tasks: List[Tuple[int, str, Set[str]]] = list()
+        field_sets: Dict[bytes, Set[str]] = dict()
+        files_column: np.ndarray = catalog['file'].to_numpy()
 
-                    geom_data = dict()
+        # Only query the .geom file if there are fields still unfilled
+        for i in np.flatnonzero(needed.any(axis=1)):
+            key = needed[i].tobytes()
 
-                    for field_id in row_fields_needed:
-                        # Since no .geom file was found, fill with nan values
-                        geom_data[field_id] = np.nan
+            if key not in field_sets:
+                field_sets[key] = {field for field, is_needed in zip(fields, needed[i]) if is_needed}
 
-                    stat_count_missing_geom += 1
+            tasks.append((int(i), files_column[i], field_sets[key]))
 
-                else:
-                    # Store the values in the catalog's respective column by field name, in memory
-                    for key, value in geom_data.items():
-                        try:
-                            catalog.at[i, key] = value
-                        except ValueError as e:
-                            h.print_error('The catalog seems to be corrupted or out of date! Deleting old one and '
-                                          f'trying again ... \nError: {e}')
-                            os.remove(catalog_path)
-                            Cataloging.generate_index_from_scope(scope_path=scope_path,
-                                                                 fields_needed=fields_needed,
-                                                                 save_interval=save_interval,
-                                                                 require_geom=require_geom,
-                                                                 override_catalog_path=override_catalog_path,
-                                                                 debug=debug,
-                                                                 verbosity=verbosity,
-                                                                 **kwargs)
-                            exit(0)
-
-                        flag_unsaved_changes = True
+        # Look up the fields that are needed and still missing data, in this process or spread over a pool of processes
+        if geom_workers > 1 and len(tasks) > 1:
+            results = Cataloging._read_geom_fields_parallel(tasks=tasks, source=source, workers=geom_workers,
+                                                            debug=debug, verbosity=verbosity)
+        else:
+            results = ((i, Cataloging._parse_geom_fields(field_id_set=row_fields_needed, content=source.read_geom(file),
+                                                         file_path=source.get_path(file), debug=debug,
+                                                         verbosity=verbosity))
+                       for i, file, row_fields_needed in tasks)
+
+        # The values are put into their columns by row as they come in (in the order of the rows)
+        for (i, geom_data), (_, _, row_fields_needed) in zip(results, tasks):
+
+            dots = math.floor(((i + 1) % 9) / 3) + 1
+
+            print(f'\rProcessing .geom attributes of file {i + 1} of {len(files)} '
+                  f'({round((i / len(files)) * 100, 2)}%) ' +
+                  '.' * dots + ' ' * (3 - dots), end=' ')
+
+            stat_files_accessed += 1
+
+            if geom_data is None:
+                # The geom file does not exist
+
+                geom_data = dict()
+
+                for field_id in row_fields_needed:
+                    # Since no .geom file was found, fill with nan values
+                    geom_data[field_id] = np.nan
+
+                stat_count_missing_geom += 1
+
+            else:
+                # Store the values in the respective column by field name, in memory
+                for key, value in geom_data.items():
+                    try:
+                        columns[key][i] = value
+                    except ValueError as e:
+                        h.print_error('The catalog seems to be corrupted or out of date! Deleting old one and '
+                                      f'trying again ... \nError: {e}')
+                        os.remove(catalog_path)
+                        Cataloging.generate_index_from_scope(scope_path=scope_path,
+                                                             fields_needed=fields_needed,
+                                                             save_interval=save_interval,
+                                                             require_geom=require_geom,
+                                                             override_catalog_path=override_catalog_path,
+                                                             source=source,
+                                                             geom_workers=geom_workers,
+                                                             debug=debug,
+                                                             verbosity=verbosity,
+                                                             **kwargs)
+                        exit(0)
+
+                    flag_unsaved_changes = True
 
             if save_interval > 0 and stat_files_accessed != 0 and stat_files_accessed % save_interval == 0:
 
                 print('\rSaving catalog to disk (' + str(stat_files_accessed) +
                       ' .geom files accessed) ... ', end='')
+
+                # Put the values found so far into the catalog (whole columns at once) before saving it
+                catalog = catalog.assign(**columns)
                 Cataloging._force_save_catalog(catalog=catalog, scope_path=scope_path)
 
+        catalog = catalog.assign(**columns)
+
         if stat_count_missing_geom > 0:
             print(str(stat_count_missing_geom) + ' images were missing a .geom file!')
         else:
@@ -364,23 +410,78 @@ class Cataloging:
         # Do a final save of the file
         Cataloging._force_save_catalog(catalog=catalog, scope_path=scope_path)
 
+        source.close()
+
         print('Saved all existing data successfully!\n')
 
+    @staticmethod
+    def generate_index_from_website(storm: Storm, download_path: Union[str, bytes] = s.ARCHIVE_CACHE_PATH,
+                                    search_re: str = '.*', workers: int = s.DEFAULT_REMOTE_WORKERS, **kwargs) -> None:
+        """
+        Generate the catalog of a storm from its zip archives on the website, before (or instead of) downloading them.
+        Only the central directory of each archive and the .geom files of the images are fetched (see
+        `sources.RemoteArchiveSource`), and the catalog is the same as one made from the downloaded archives.
+
+        :param storm: The storm to catalog
+        :param download_path: The path the storm's archives would be downloaded to (see `pstorm collect --path`), which
+        the paths of the images in the catalog are relative to
+        :param search_re: The regular expression that archives must match to be cataloged
+        :param workers: The number of .geom files to fetch at the same time
+        :param kwargs: The options passed on to `generate_index_from_scope`
+        """
+
+        scope_path = os.path.join(h.validate_and_expand_path(download_path), storm.storm_id.title())
+        source = RemoteArchiveSource(scope_path=scope_path, archives=storm.get_archive_list(search_re),
+                                     workers=workers)
+
+        Cataloging.generate_index_from_scope(scope_path=scope_path, source=source, **kwargs)
+
+        print('Fetched ' + h.to_readable_bytes(source.get_bytes_fetched()) + ' from the website to catalog ' +
+              str(storm) + '\n')
+
     #####################################
     # Catalog-Specific Helper Functions #
     #####################################
 
+    @staticmethod
+    def _get_path_columns(paths: pd.Series) -> pd.DataFrame:
+        """Parse the storm, archive and image of many images out of their full paths. The storm and archive only depend
+        on the directory an image is in, so they are parsed once for each directory instead of once for each image.
+
+        :param paths: The full path of each image (see `CatalogSource.get_path`)
+        :return: The storm_id, archive and image of each image (lower-cased, except for the image), by the same index
+        """
+        directories: pd.Series = paths.map(os.path.dirname)
+        names: pd.Series = paths.map(os.path.basename)
+
+        storm_ids: Dict[str, str] = dict()
+        archives: Dict[str, str or None] = dict()
+
+        for directory in directories.unique():
+            storm_ids[directory] = Cataloging._get_storm_from_path(directory).lower()
+
+            if os.path.basename(directory).lower() == storm_ids[directory]:
+                # Images right in the storm directory are their own archive
+                archives[directory] = None
+            else:
+                archives[directory] = Cataloging._get_archive_from_path(scope_path=directory,
+                                                                        storm_id=storm_ids[directory]).lower()
+
+        return pd.DataFrame({'storm_id': directories.map(storm_ids),
+                             'archive': directories.map(archives).fillna(names.str.lower()),
+                             'image': names.where(names.str.contains('.jpg', regex=False), None)},
+                            index=paths.index)
+
     @staticmethod
     def _get_best_date(file_path: Union[bytes, str],
                        debug: bool = s.DEFAULT_DEBUG,
                        verbosity: int = s.DEFAULT_VERBOSITY) -> str or None:
 
-        # Assume years can only be 2000 to 2099 (current unix time ends at 2038 anyways)
-        pattern: Pattern = re.compile('[\\D]*(20\\d{2})(\\d{2})(\\d{2})\\D')
+        # Search the entire path for a matching date format, take the first occurrence
+        match = DATE_PATTERN.search(file_path)
 
-        # Search the entire path for a matching date format, take the last occurrence
-        if re.search(pattern, file_path):
-            year, month, day = re.search(pattern, file_path).groups()
+        if match:
+            year, month, day = match.groups()
 
             if debug and verbosity >= 1:
                 # In-line progress (no spam when verbosity is 1)
@@ -500,11 +601,82 @@ class Cataloging:
         print('Saved catalog to disk! ', end='')
         flag_unsaved_changes = False
 
+    @staticmethod
+    def _read_geom_fields_parallel(tasks: List[Tuple[int, str, Set[str]]], source: CatalogSource,
+                                   workers: int = s.DEFAULT_CATALOG_WORKERS, batch_size: int = s.CATALOG_BATCH_SIZE,
+                                   debug: bool = s.DEFAULT_DEBUG, verbosity: int = s.DEFAULT_VERBOSITY) \
+            -> Iterator[Tuple[int, Union[Dict[str, str or float], None]]]:
+        """Read and parse the .geom files of many rows on a pool of processes, handing them out in batches of rows and
+        giving back the values in the same order as the rows. Only a couple of batches per process are handed out ahead
+        of the rows being filled in, so that the catalog can still be saved every so often (see `save_interval`).
+
+        :param tasks: The rows to find the fields of (the index of the row, its file, and the fields it needs)
+        :param source: Where the images and their .geom files are read from
+        :param workers: The number of processes to use
+        :param batch_size: The number of rows handed to a process at a time
+        :param debug: Whether (True) or not (False) to override default debug flag and output additional statements
+        :param verbosity: The frequency of debug statement output (1 = LOW, 2 = MEDIUM, 3 = HIGH)
+        :return: The index of each row and the values of its fields (None if it has no .geom file), in order
+        """
+
+        def get_batches():
+            for start in range(0, len(tasks), batch_size):
+                batch = list()
+
+                for i, file, row_fields_needed in tasks[start:start + batch_size]:
+                    # .geom files that are not on the disk (e.g. inside of an archive) are read here and handed over
+                    content = None if source.geom_on_disk else source.read_geom(file)
+                    batch.append((i, source.get_path(file), content, row_fields_needed))
+
+                yield batch
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+
+            for batch in get_batches():
+                pending.append(executor.submit(_read_geom_batch, batch, source.geom_on_disk, debug, verbosity))
+
+                # Wait for the oldest batch before handing out more (the results are put back in order anyways)
+                if len(pending) >= 2 * workers:
+                    yield from pending.popleft().result()
+
+            while len(pending) > 0:
+                yield from pending.popleft().result()
+
     @staticmethod
     def _get_geom_fields(field_id_set: Set[str] or str, file_path: Union[bytes, str],
                          debug: bool = s.DEFAULT_DEBUG, verbosity: int = s.DEFAULT_VERBOSITY) \
             -> Union[Dict[str, str], str, None]:
 
+        # Get the .geom file that corresponds to this file (substitute existing extension for ".geom")
+        geom_path = h.validate_and_expand_path(get_geom_name(file_path))
+
+        content: bytes or None = None
+
+        if os.path.exists(geom_path):
+            with open(geom_path, 'rb') as f:
+                content = f.read()
+
+        return Cataloging._parse_geom_fields(field_id_set=field_id_set, content=content, file_path=file_path,
+                                             debug=debug, verbosity=verbosity)
+
+    @staticmethod
+    def _parse_geom_fields(field_id_set: Set[str] or str, content: bytes or None, file_path: Union[bytes, str],
+                           debug: bool = s.DEFAULT_DEBUG, verbosity: int = s.DEFAULT_VERBOSITY) \
+            -> Union[Dict[str, str or float], str, None]:
+        """Find the values of fields in the content of an image's .geom file (read from the disk or straight out of
+        an archive). The file is parsed and hashed in a single pass (see `geom.read_geom_fields`), and the coordinates of
+        the image's corners are floats.
+
+        :param field_id_set: The fields to find (or a single field)
+        :param content: The content of the .geom file (None if the image has no .geom file)
+        :param file_path: The path of the image the .geom file belongs to
+        :param debug: Whether (True) or not (False) to override default debug flag and output additional statements
+        :param verbosity: The frequency of debug statement output (1 = LOW, 2 = MEDIUM, 3 = HIGH)
+        :return: The value of each field, a single value (as text) if a single field was given, or None if there is no
+        .geom file
+        """
+
         is_single_input = False
 
         # If only one id is entered (a single string), convert to a set of 1 element
@@ -512,17 +684,16 @@ class Cataloging:
             field_id_set: Set[str] = {field_id_set}
             is_single_input = True
 
-        # Get the .geom file that corresponds to this file (substitute existing extension for ".geom")
-        geom_path = h.validate_and_expand_path(re.sub(pattern='\\.[^.]*$', repl='.geom', string=str(file_path)))
+        geom_path = get_geom_name(file_path)
 
         result: Dict[str] = dict()
 
-        if os.path.exists(geom_path) is False:
+        if content is None:
             if debug:
                 h.print_error('Could not find .geom file for "' + file_path + '": "' + geom_path + '"')
             return None
 
-        if os.path.getsize(geom_path) == 0:
+        if len(content) == 0:
             h.print_error('\n\nThe .geom file for "' + file_path + '": "' + geom_path + '" is 0 KiBs.\n'
                           'Bad file access may have caused this, so check the archive to see if the image and '
                           'the .geom files in the archive are the same as the unzipped versions!\n')
@@ -532,52 +703,57 @@ class Cataloging:
 
             return result
 
-        # Generate a new hash object to store the hash data
-        hashing: hashlib.md5 = hashlib.md5()
+        # Parse and hash the .geom file in a single pass over its bytes (coordinates come back as floats)
+        result, missing = read_geom_fields(content, field_id_set)
 
-        with open(geom_path, 'rb') as f:
-            # Use the geom file's bytes to generate a checksum
+        if len(missing) > 0:
+            h.print_error('\nCould not find any values for fields ' + str(missing) + ' in ' + geom_path)
 
-            if 'geom_checksum' in field_id_set:
-                # Generate a md5 hash to help ensure the correct data is being referenced if compared elsewhere
-                hashing.update(f.read())
-                result['geom_checksum'] = hashing.hexdigest()
-                field_id_set.remove('geom_checksum')
+            for field_id in missing:
+                # Fill missing fields with nan values
+                result[field_id] = np.nan
 
-        with open(geom_path, 'r') as f:
+            return result
 
-            for line in f.readlines():
+        if debug and verbosity >= 2:
+            print('\rFound ' + str(len(result)) + ' value(s) in ' + geom_path, end='')
 
-                # If there are no more fields to find, close the file and return the resulting dictionary or string
-                if len(field_id_set) == 0:
-                    f.close()
+            if verbosity >= 3:
+                print()  # RIP your console if you get here
 
-                    if debug and verbosity >= 2:
-                        print('\rFound ' + str(len(result)) + ' value(s) in ' + geom_path, end='')
+        if is_single_input and len(result) == 1:
+            # Return the first (and only value) as a single string
+            return str(list(result.values())[0])
 
-                        if verbosity >= 3:
-                            print()  # RIP your console if you get here
+        return result
 
-                    if is_single_input and len(result) == 1:
-                        # Return the first (and only value) as a single string
-                        return str(list(result.values())[0])
 
-                    return result
+def _read_geom_batch(batch: List[Tuple[int, str, bytes or None, Set[str]]], geom_on_disk: bool,
+                     debug: bool = s.DEFAULT_DEBUG, verbosity: int = s.DEFAULT_VERBOSITY) \
+        -> List[Tuple[int, Union[Dict[str, str or float], None]]]:
+    """Find the fields of a batch of rows in their .geom files, in a process of the pool (see
+    `Cataloging._read_geom_fields_parallel`)
 
-                field_id_set_full = field_id_set.copy()
-                for field_id in field_id_set_full:
-                    value = re.findall(field_id + ':\\s+(.*)', line)
-                    if len(value) == 1:
-                        result[field_id] = str(value[0])
-                        field_id_set.remove(field_id)
+    :param batch: The index of each row, the full path of its image, the content of its .geom file (if it was read
+    already) and the fields it needs
+    :param geom_on_disk: Whether (True) or not (False) to read each .geom file from the disk next to its image
+    :param debug: Whether (True) or not (False) to override default debug flag and output additional statements
+    :param verbosity: The frequency of debug statement output (1 = LOW, 2 = MEDIUM, 3 = HIGH)
+    :return: The index of each row and the values of its fields
+    """
+    results = list()
 
-            f.close()
-            h.print_error('\nCould not find any values for fields ' + str(field_id_set) + ' in ' + geom_path)
-            for field_id in field_id_set:
-                # Fill missing fields with nan values
-                result[field_id] = np.nan
+    for i, file_path, content, row_fields_needed in batch:
+        if geom_on_disk:
+            geom_data = Cataloging._get_geom_fields(field_id_set=row_fields_needed, file_path=file_path, debug=debug,
+                                                    verbosity=verbosity)
+        else:
+            geom_data = Cataloging._parse_geom_fields(field_id_set=row_fields_needed, content=content,
+                                                      file_path=file_path, debug=debug, verbosity=verbosity)
 
-            return result
+        results.append((i, geom_data))
+
+    return results
 
 
 class CatalogNoEntriesException(IOError):
@@ -0,0 +1,330 @@
+import os
+import re
+from typing import Dict, List, Pattern, Tuple, Union
+
+from psicollect.collector.archive import Archive
+from psicollect.collector.member_index import MemberIndex
+from psicollect.collector.remote_zip import RemoteZip
+from psicollect.common import h, s
+
+# The archive file types that can be cataloged without extracting them
+ARCHIVE_EXTENSIONS = ('.tar', '.zip')
+
+
+def get_geom_name(file_path: str) -> str:
+    """Get the path of the .geom file that belongs to an image (substitute the existing extension for '.geom')
+
+    :param file_path: The path of the image
+    :return: The path of the image's .geom file
+    """
+    return re.sub(pattern='\\.[^.]*$', repl='.geom', string=str(file_path))
+
+
+def match_members(archive_label: str, sizes: Dict[str, int], require_geom: bool = False,
+                  file_extension: str = 'jpg', file_search_re: Pattern = '.*', debug: bool = s.DEFAULT_DEBUG,
+                  verbosity: int = s.DEFAULT_VERBOSITY) -> List[str]:
+    """Pick the images out of the members of an archive, the same way `h.find_images` picks them out of a
+    directory tree
+
+    :param archive_label: The archive's path or url (for debug messages)
+    :param sizes: The size in bytes of every file member of the archive by its path inside of the archive
+    :param require_geom: Whether (True) or not (False) to only pick images that have a .geom file
+    :param file_extension: The file extension of images
+    :param file_search_re: The file name (including the extension) to be searched for as a regular expression
+    :param debug: Whether (True) or not (False) to override default debug flag and output additional statements
+    :param verbosity: The frequency of debug statement output (1 = LOW, 2 = MEDIUM, 3 = HIGH)
+    :return: The paths of the images inside of the archive
+    """
+
+    # Make search pattern case-insensitive
+    file_search_re = re.compile(file_search_re, re.IGNORECASE)
+
+    members: List[str] = list()
+
+    for member_name, size in sizes.items():
+        file_name = member_name.rsplit('/', 1)[-1]
+
+        if not file_name.endswith('.' + file_extension):
+            continue
+
+        if debug and verbosity >= 1:
+            print('\r' + archive_label + ':' + member_name + ' ... ', end='')
+
+        original_name = h.DUPLICATE_NAME_RE.sub('.', member_name)
+
+        # A member whose name ends with '(#)' is a duplicate if the original has the same size
+        if original_name != member_name and sizes.get(original_name) == size:
+            message = 'duplicate file!'
+
+        elif require_geom and get_geom_name(member_name) not in sizes:
+            message = 'does not have required .geom file!'
+
+        elif re.search(file_search_re, file_name):
+            message = 'matches pattern!'
+            members.append(member_name)
+
+        else:
+            message = 'does not match pattern!'
+
+        if debug and verbosity >= 1:
+            # In-line progress (no spam when verbosity is 1), multi-line when verbosity is 2 or more
+            print(message, end='\n' if verbosity >= 2 else '')
+
+    return members
+
+
+class CatalogSource:
+    """Where the images of a catalog are read from. Every file is named by its path relative to the scope with '/' as
+    the separator (e.g. '20180915a_jpgs/jpgs/C25870213.jpg'), the same no matter which source is used, so every source
+    produces the same catalog."""
+
+    scope_path: Union[bytes, str]  # The root path of the scope that files are named relative to
+
+    # Whether (True) or not (False) the .geom file of an image sits next to it on the disk (see `get_path`), so that
+    # another process can read it on its own instead of being handed its content
+    geom_on_disk: bool = False
+
+    def __init__(self, scope_path: Union[bytes, str]):
+        """Create a source for the images in a scope
+
+        :param scope_path: The root path of the scope
+        """
+        self.scope_path = h.validate_and_expand_path(scope_path)
+
+    def list_files(self, require_geom: bool = False, debug: bool = s.DEFAULT_DEBUG,
+                   verbosity: int = s.DEFAULT_VERBOSITY, **kwargs) -> List[str]:
+        """Get every image in the scope
+
+        :param require_geom: Whether (True) or not (False) to only list images that have a .geom file
+        :param debug: Whether (True) or not (False) to override default debug flag and output additional statements
+        :param verbosity: The frequency of debug statement output (1 = LOW, 2 = MEDIUM, 3 = HIGH)
+        :param kwargs: The file_extension and file_search_re to match images with (see `h.find_images`)
+        :return: The paths of the images relative to the scope
+        """
+        raise NotImplementedError
+
+    def get_path(self, file: str) -> str:
+        """Get the full path of an image, which storm, archive, image and date are parsed from. Images inside of an
+        archive get the path they would have once extracted.
+
+        :param file: The path of the image relative to the scope
+        :return: The full path of the image
+        """
+        return os.path.join(self.scope_path, os.path.normpath(file))
+
+    def get_size(self, file: str) -> int:
+        """Get the size of an image
+
+        :param file: The path of the image relative to the scope
+        :return: The size of the image in bytes
+        """
+        raise NotImplementedError
+
+    def read_geom(self, file: str) -> bytes or None:
+        """Read the .geom file that belongs to an image
+
+        :param file: The path of the image relative to the scope
+        :return: The content of the .geom file, or None if the image has no .geom file
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release any open files"""
+        pass
+
+
+class FileSystemSource(CatalogSource):
+    """Images in a directory tree of extracted archives. The sizes of the images are kept from the search for them
+    (see `h.find_images`), so they are not asked for again one file at a time."""
+
+    _sizes: Dict[str, int]  # The size of each image found by its path relative to the scope
+
+    geom_on_disk = True
+
+    def __init__(self, scope_path: Union[bytes, str]):
+        CatalogSource.__init__(self, scope_path)
+
+        self._sizes = dict()
+
+    def list_files(self, require_geom: bool = False, debug: bool = s.DEFAULT_DEBUG,
+                   verbosity: int = s.DEFAULT_VERBOSITY, **kwargs) -> List[str]:
+        files: List[str] = list()
+
+        for file_path, size in h.find_images(self.scope_path, require_geom=require_geom, debug=debug,
+                                             verbosity=verbosity, **kwargs):
+            file = os.path.relpath(file_path, start=self.scope_path).replace('\\', '/')
+            self._sizes[file] = size
+            files.append(file)
+
+        return files
+
+    def get_size(self, file: str) -> int:
+        if file in self._sizes:
+            return self._sizes[file]
+
+        return os.path.getsize(self.get_path(file))
+
+    def read_geom(self, file: str) -> bytes or None:
+        geom_path = get_geom_name(self.get_path(file))
+
+        if not os.path.exists(geom_path):
+            return None
+
+        with open(geom_path, 'rb') as f:
+            return f.read()
+
+
+class ArchiveSource(CatalogSource):
+    """Images inside of the downloaded archives (.tar and .zip) in a directory tree, read in place without extracting
+    them. Sizes come from the member headers and .geom files are read straight out of the archive (see
+    `MemberIndex`)."""
+
+    # The archive and member path of each image by its path relative to the scope
+    _members: Dict[str, Tuple[MemberIndex, str]]
+
+    def __init__(self, scope_path: Union[bytes, str]):
+        CatalogSource.__init__(self, scope_path)
+
+        self._members = dict()
+        self._indexes: List[MemberIndex] = list()
+
+    def _get_archive_paths(self) -> List[str]:
+        """Find every fully downloaded archive in the scope (in a stable order)"""
+        archive_paths: List[str] = list()
+
+        for dir_path, dir_names, file_names in os.walk(self.scope_path, followlinks=True):
+            dir_names.sort()
+
+            for file_name in sorted(file_names):
+                if os.path.splitext(file_name)[1].lower() in ARCHIVE_EXTENSIONS:
+                    archive_paths.append(os.path.join(dir_path, file_name))
+
+        return archive_paths
+
+    def list_files(self, require_geom: bool = False, debug: bool = s.DEFAULT_DEBUG,
+                   verbosity: int = s.DEFAULT_VERBOSITY, **kwargs) -> List[str]:
+
+        files: List[str] = list()
+
+        if debug and verbosity >= 1:
+            print('\nSearching through archives in ' + self.scope_path + ' ...')
+
+        for archive_path in self._get_archive_paths():
+            index = MemberIndex.get(archive_path)
+            self._indexes.append(index)
+
+            # Members are named as if the archive was extracted next to itself (see `pipeline.process_archive`)
+            prefix = os.path.relpath(os.path.splitext(archive_path)[0], self.scope_path).replace('\\', '/') + '/'
+
+            sizes = {member_name: entry.size for member_name, entry in index.entries.items()}
+
+            for member_name in match_members(archive_path, sizes, require_geom=require_geom, debug=debug,
+                                             verbosity=verbosity, **kwargs):
+                files.append(prefix + member_name)
+                self._members[prefix + member_name] = (index, member_name)
+
+        if debug:
+            # Clear pattern matching output on current line
+            print('\r', end='')
+
+        return files
+
+    def _get_member(self, file: str) -> Tuple[MemberIndex, str]:
+        """Get the archive index and member path of an image listed by `list_files`"""
+        if file not in self._members:
+            raise IOError('File ' + file + ' is not in any archive in ' + self.scope_path)
+
+        return self._members[file]
+
+    def get_size(self, file: str) -> int:
+        index, member_name = self._get_member(file)
+        return index.entries[member_name].size
+
+    def read_geom(self, file: str) -> bytes or None:
+        index, member_name = self._get_member(file)
+        geom_name = get_geom_name(member_name)
+
+        if geom_name not in index.entries:
+            return None
+
+        return index.read(geom_name)
+
+    def close(self) -> None:
+        for index in self._indexes:
+            index.close()
+
+
+class RemoteArchiveSource(CatalogSource):
+    """Images inside of zip archives that are still on the website, read with range requests so that a catalog can be
+    made before anything is downloaded. Only each archive's central directory and the .geom files of the images are
+    fetched (tar archives have no central directory, so they are skipped). Images get the path they would have once
+    the archive is downloaded to the scope and extracted."""
+
+    archives: List[Archive]  # The archives to catalog
+    workers: int  # The number of .geom files to fetch at the same time
+
+    # The remote archive and member path of each image by its path relative to the scope
+    _members: Dict[str, Tuple[RemoteZip, str]]
+
+    def __init__(self, scope_path: Union[bytes, str], archives: List[Archive],
+                 workers: int = s.DEFAULT_REMOTE_WORKERS):
+        """Create a source for the images in archives on the website
+
+        :param scope_path: The directory the archives would be downloaded to (e.g. the storm's directory)
+        :param archives: The archives to catalog
+        :param workers: The number of .geom files to fetch at the same time
+        """
+        CatalogSource.__init__(self, scope_path)
+
+        self.archives = archives
+        self.workers = workers
+
+        self._members = dict()
+        self._remotes: List[RemoteZip] = list()
+        self._geoms: Dict[str, bytes] = dict()  # The .geom files fetched so far by their path relative to the scope
+
+    def list_files(self, require_geom: bool = False, debug: bool = s.DEFAULT_DEBUG,
+                   verbosity: int = s.DEFAULT_VERBOSITY, **kwargs) -> List[str]:
+
+        files: List[str] = list()
+
+        for archive in self.archives:
+            if not archive.is_zip():
+                h.print_error('Skipping ' + archive.name + archive.get_ext() + ', only zip archives can be cataloged '
+                              'from the website')
+                continue
+
+            remote = archive.open_remote()
+            self._remotes.append(remote)
+
+            sizes = {name: info.file_size for name, info in remote.infos.items() if not name.endswith('/')}
+            member_names = match_members(archive.url, sizes, require_geom=require_geom, debug=debug,
+                                         verbosity=verbosity, **kwargs)
+
+            # Fetch the .geom files of every image up front, a few at a time
+            geom_names = [get_geom_name(member_name) for member_name in member_names
+                          if get_geom_name(member_name) in sizes]
+
+            for geom_name, content in remote.read_members(geom_names, workers=self.workers):
+                self._geoms[archive.name + '/' + geom_name] = content
+
+            for member_name in member_names:
+                files.append(archive.name + '/' + member_name)
+                self._members[archive.name + '/' + member_name] = (remote, member_name)
+
+        if debug:
+            # Clear pattern matching output on current line
+            print('\r', end='')
+
+        return files
+
+    def get_size(self, file: str) -> int:
+        remote, member_name = self._members[file]
+        return remote.infos[member_name].file_size
+
+    def read_geom(self, file: str) -> bytes or None:
+        return self._geoms.get(get_geom_name(file))
+
+    def get_bytes_fetched(self) -> int:
+        """Get the number of bytes fetched from the website so far"""
+        return sum(remote.bytes_fetched for remote in self._remotes)
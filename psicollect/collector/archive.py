@@ -2,8 +2,6 @@ import os
 import re
 import tarfile
 import zipfile
-from datetime import datetime, timedelta
-from math import ceil
 from tarfile import TarFile, TarInfo
 from typing import Union
 from zipfile import ZipFile, ZipInfo
@@ -11,8 +9,16 @@ from zipfile import ZipFile, ZipInfo
 import requests
 from tqdm import tqdm
 
+from psicollect.collector.chunk_journal import ChunkJournal, repair_part
+from psicollect.collector.io_engine import LockHeartbeat, write_response
 from psicollect.collector.locking import update_file_lock
+from psicollect.collector.member_index import MemberIndex
+from psicollect.collector.pipeline import MemberFilter, get_manifest_path, process_archive
+from psicollect.collector.remote_zip import RemoteZip
 from psicollect.collector.response_getter import get_full_content_length
+from psicollect.collector.segmented import SegmentJournal, download_segmented
+from psicollect.collector.session import get_session
+from psicollect.collector.streaming import StreamingTarExtractor
 from psicollect.common import h, s
 
 UNKNOWN = 'Unknown'
@@ -38,6 +44,9 @@ class Archive:
     # Save a cache of the file size in bytes
     file_origin_size: int or None = None
 
+    # Where each member's data is inside of the local copy of the archive (loaded on first read of a member)
+    member_index: MemberIndex or None = None
+
     def __init__(self, archive_url: str, archive_date: str = UNKNOWN, archive_label: str = UNKNOWN,
                  file_size_origin: int = None):
         """Initializes the object with required information for a archive file
@@ -85,7 +94,10 @@ class Archive:
         """
         return self.type == 'tar'
 
-    def download_url(self, output_dir: str, user: str, overwrite: bool = False) \
+    def download_url(self, output_dir: str, user: str, overwrite: bool = False, progress=None,
+                     segments: int = s.DEFAULT_DOWNLOAD_SEGMENTS,
+                     stream_extract: bool = s.DEFAULT_STREAM_EXTRACT,
+                     extract_workers: int = s.DEFAULT_EXTRACT_WORKERS, member_filter: MemberFilter = None) \
             -> Union[TarFile, ZipFile, None]:  # pragma: no cover
         """Download the archive file to the given path. Whether or not to overwrite
         any existing file can also be specified by the `overwrite` parameter.
@@ -93,16 +105,29 @@ class Archive:
         :param user: The user to download as (locking mechanism)
         :param output_dir: The location to save the downloaded archive file to (a path on the local machine)
         :param overwrite: Whether or not to overwrite a file if one already exists by the same name
+        :param progress: A shared progress display (see `scheduler.AggregateProgress`) to report to instead of
+        showing a progress bar for only this archive
+        :param segments: The number of byte ranges to split the archive into and download at the same time (falls
+        back to a single stream if the server does not support range requests)
+        :param stream_extract: Whether (True) or not (False) to extract a tar archive while it downloads instead of
+        reading it again afterwards (only when downloading as a single stream)
+        :param extract_workers: The number of processes to extract a zip archive with once it is downloaded
+        :param member_filter: Picks which members of the archive to extract (None for every member)
         :returns: The archive file that was downloaded
         """
         # The full path of the file including the file name and file type
         self.path = os.path.join(output_dir, str(self.name) + self.get_ext())
 
+        # Messages are written above the shared progress bar (if there is one) so it is not broken apart
+        log = print if progress is None else progress.write
+
         if not overwrite:
 
             # If the archive file does not exist locally in the cache
             if os.path.exists(output_dir) and os.path.isfile(self.path):
-                print('File \"' + self.path + '\" already exists!  ... Skipping')
+                log('File \"' + self.path + '\" already exists!  ... Skipping')
+                if progress is not None:
+                    progress.resume(self.path, self.get_file_size_origin())
                 if self.is_tar():
                     return tarfile.open(self.path)
                 else:
@@ -115,25 +140,151 @@ class Archive:
         # Suffix for the file until download is complete
         file_path_part: str = self.path + s.PART_SUFFIX
 
+        full_size_origin = self.get_file_size_origin()
+
+        downloaded: bool = False
+        extracted: bool = False
+
+        if full_size_origin > 0 and os.path.exists(file_path_part) \
+                and os.path.getsize(file_path_part) == full_size_origin \
+                and not os.path.exists(SegmentJournal.get_path(file_path_part)):
+            # Every byte was already downloaded as a single stream (it stopped before the archive was renamed)
+            downloaded = True
+
+        # Continue a segmented download even if no segments were asked for, since its .part file is already full size.
+        # An empty archive has nothing to split into segments, so it is downloaded as a single stream.
+        elif full_size_origin > 0 and (segments > 1 or os.path.exists(SegmentJournal.get_path(file_path_part))):
+            log('\nDownloading ' + self.name + self.get_ext() + ' in segments ...')
+            downloaded = download_segmented(url=self.url, part_file=file_path_part, total_size_byte=full_size_origin,
+                                            segment_count=segments, user=user, progress=progress,
+                                            desc='Downloading ' + self.name + self.get_ext())
+
+            if downloaded is False:
+                log('The server does not support downloading ' + self.name + self.get_ext() +
+                    ' in segments. Downloading as a single stream instead ...')
+
+        if downloaded is False:
+            extracted = self._download_stream(file_path_part=file_path_part, user=user,
+                                              full_size_origin=full_size_origin, progress=progress, log=log,
+                                              stream_extract=stream_extract, member_filter=member_filter)
+
+        return self.finish_download(user=user, full_size_origin=full_size_origin, log=log, extracted=extracted,
+                                    extract_workers=extract_workers, member_filter=member_filter)
+
+    def finish_download(self, user: str, full_size_origin: int, log=print, extracted: bool = False,
+                        extract_workers: int = s.DEFAULT_EXTRACT_WORKERS, member_filter: MemberFilter = None) \
+            -> Union[TarFile, ZipFile, None]:  # pragma: no cover
+        """Once every byte of the archive is in its .part file, give the archive its proper name, tell others that it
+        is fully downloaded, and then verify, extract, and hash it (see `pipeline.process_archive`). Used by every
+        download backend.
+
+        :param user: The user that downloaded the archive (locking mechanism)
+        :param full_size_origin: The size of the archive on the website in bytes
+        :param log: The function used to print messages
+        :param extracted: Whether (True) or not (False) every member was already extracted while downloading (reading
+        the whole archive that way already verified it)
+        :param extract_workers: The number of processes to extract a zip archive with
+        :param member_filter: Picks which members of the archive to extract (None for every member)
+        :returns: The archive file that was downloaded
+        :raises UnsafeMemberException: If a member would be extracted outside of the extract directory (the archive is
+        kept, since downloading it again would not help)
+        """
+
+        # Suffix for the file until download is complete
+        file_path_part: str = self.path + s.PART_SUFFIX
+
+        local_size = os.path.getsize(file_path_part)
+
+        # Check to see that the file size is correct (in case of dropped connection)
+        if local_size < full_size_origin:
+            raise ConnectionError('File was not fully downloaded. Retry download!')
+
+        # File download is complete. Change the name to reflect that it is a proper archive file
+        os.rename(file_path_part, self.path)
+
+        # Remove the lock file and the checksums of the .part file
+        if os.path.exists(file_path_part + s.LOCK_SUFFIX):
+            os.remove(file_path_part + s.LOCK_SUFFIX)
+
+        if os.path.exists(ChunkJournal.get_path(file_path_part)):
+            os.remove(ChunkJournal.get_path(file_path_part))
+
+        # Tell others that the full file is downloaded
+        update_file_lock(base_file=self.path, user=user,
+                         total_size_byte=full_size_origin, part_size_byte=full_size_origin)
+
+        if extracted:
+            log('Files of ' + self.name + self.get_ext() + ' were extracted while downloading')
+
+        # Verify, extract, and hash every member in a single read of the archive
+        elif process_archive(self.path, log=log, workers=extract_workers, member_filter=member_filter) is False:
+            os.remove(self.path)
+
+            if os.path.exists(self.path + s.LOCK_SUFFIX):
+                os.remove(self.path + s.LOCK_SUFFIX)
+
+            # Download the archive again
+            raise ConnectionError('Integrity of ' + self.name + self.get_ext() + ' could not be verified! Deleted it!')
+
+        # Where each member is was saved while the archive was read (it is only built from the archive if it is missing)
+        self.member_index = MemberIndex.get(self.path)
+
+        if self.is_tar():
+            return tarfile.open(self.path)
+        else:
+            return ZipFile(self.path)
+
+    def _download_stream(self, file_path_part: Union[bytes, str], user: str, full_size_origin: int,
+                         progress=None, log=print, stream_extract: bool = False,
+                         member_filter: MemberFilter = None) -> bool:  # pragma: no cover
+        """Download the archive as a single stream of bytes, appending to (resuming) the .part file if it exists. A tar
+        archive can also be extracted while it downloads: every chunk written to the .part file is also fed to a
+        streaming tar reader (after the part downloaded before, when resuming). A checksum of every chunk of fixed size
+        is kept next to the .part file, so that the end of the .part file can be checked (and damaged chunks downloaded
+        again on their own) before resuming.
+
+        :param file_path_part: The path to the .part file to download to
+        :param user: The user to download as (locking mechanism)
+        :param full_size_origin: The size of the archive on the website in bytes
+        :param progress: A shared progress display to report to instead of showing a progress bar for only this archive
+        :param log: The function used to print messages
+        :param stream_extract: Whether (True) or not (False) to extract a tar archive while it downloads
+        :param member_filter: Picks which members of the archive to extract (None for every member)
+        :returns: Whether (True) or not (False) every member of the archive was extracted while downloading
+        """
+
+        if os.path.exists(file_path_part) and os.path.getsize(file_path_part) > 0:
+            journal = ChunkJournal.load(file_path_part)
+
+            if journal is None:
+                # Started before checksums were kept, so the data on the disk has to be trusted as it is
+                journal = ChunkJournal.rebuild(file_path_part)
+
+            # Check the end of the .part file and keep only the complete chunks that match their checksums
+            repair_part(self.url, journal, log=log)
+        else:
+            journal = ChunkJournal.create(file_path_part)
+
         # See how far a file has been downloaded at the specified path if one exists
         with open(file_path_part, 'ab') as f:
             headers = {}
             pos = f.tell()
 
-            full_size_origin = self.get_file_size_origin()
-
             if pos:
                 # Add a header that specifies only to send back the bytes needed
                 headers['Range'] = 'bytes=' + str(pos) + '-' + str(full_size_origin)
 
+            # Every chunk received from here on is added to the checksums
+            journal.start(pos)
+
             # Send the HTTP request asking for the remaining bytes
-            dl_r = requests.get(self.url, headers=headers, stream=True)
+            dl_r = get_session().get(self.url, headers=headers, stream=True)
 
             # Check if the server sent only the remaining data
             if dl_r.status_code == requests.codes.partial_content:
-                print('\nDownloading the rest of ' + self.name + self.get_ext() + ' ...')
+                log('\nDownloading the rest of ' + self.name + self.get_ext() + ' ...')
             else:
-                print('\nDownloading files...')
+                log('\nDownloading ' + self.name + self.get_ext() + ' ...')
 
             # Get the current amount of bytes downloaded
             local_size = os.path.getsize(file_path_part)
@@ -143,63 +294,121 @@ class Archive:
 
             full_size_local: int = local_size + remaining_size
 
-            # Ensure that both the program and the website are on the same page
+            # Ensure that both the program and the website are on the same page (tried again like a dropped connection,
+            # instead of stopping every other download)
             if full_size_local != full_size_origin:
-                h.print_error('Remaining file size does not match with local cache. '
-                              'Something went wrong with partial file request!')
-                exit(1)
+                dl_r.close()
+                raise ConnectionError('Remaining file size of ' + self.name + self.get_ext() + ' does not match with '
+                                      'local cache. Something went wrong with partial file request!')
 
-            # How many bytes to load into memory before saving to the file
-            chunk_size: int = 1024 * 1024
+            bar: tqdm or None = None
 
-            # The label of the given chunk size above (1024 * 1024 Bytes = 1 MiB)
-            unit = 'MiB'
+            if progress is None:
+                # Show a progress bar for only this archive
+                bar = tqdm(desc='Downloading ' + self.name + self.get_ext(), total=remaining_size + local_size,
+                           initial=local_size, unit='B', unit_scale=True, unit_divisor=1024, miniters=1)
+            else:
+                # The part of the archive already downloaded does not count towards the shared progress
+                progress.resume(self.path, local_size)
 
-            last_lock_update = datetime.now() - timedelta(hours=1)
+            extractor: StreamingTarExtractor or None = None
 
-            # Write the data and output the progress
-            for data in tqdm(iterable=dl_r.iter_content(chunk_size=chunk_size),
-                             desc='Downloading ' + self.name + self.get_ext(),
-                             total=ceil((remaining_size + local_size) / chunk_size),
-                             initial=ceil(local_size / chunk_size), unit=unit, miniters=1):
+            if stream_extract and self.is_tar():
+                # Extract to a directory of the same name, but without the file extension (like `extract_archive`)
+                extractor = StreamingTarExtractor(extract_dir=os.path.splitext(self.path)[0],
+                                                  manifest_path=get_manifest_path(self.path),
+                                                  member_filter=member_filter, archive_file_path=self.path)
 
-                # Update the lock file every so often so others know it is being downloaded
-                if (datetime.now() - last_lock_update).total_seconds() > 180:  # 1800 seconds = 30 minutes
-                    update_file_lock(base_file=file_path_part, user=user,
-                                     part_size_byte=os.path.getsize(file_path_part),
-                                     total_size_byte=full_size_origin)
-                f.write(data)
+                # When resuming, the tar reader has to see the start of the archive again (already on the disk)
+                f.flush()
+                extractor.feed_file(file_path_part, size=local_size)
 
-            dl_r.close()
+            def on_data(data: memoryview) -> None:
+                """Pass each chunk written on to the checksums, the extractor and the progress display"""
+                journal.update(data)
 
-        local_size = os.path.getsize(file_path_part)
+                if extractor is not None:
+                    # The chunk's buffer is reused for the next chunk, but the extractor reads it later
+                    extractor.feed(bytes(data))
 
-        # Check to see that the file size is correct (in case of dropped connection)
-        if local_size < full_size_origin:
-            raise ConnectionError('File was not fully downloaded. Retry download!')
+                if bar is not None:
+                    bar.update(len(data))
+                else:
+                    progress.update(len(data), key=self.path)
 
-        # File download is complete. Change the name to reflect that it is a proper archive file
-        os.rename(file_path_part, self.path)
+            # Update the lock file every so often (on a separate thread) so others know it is being downloaded
+            heartbeat = LockHeartbeat(part_file=file_path_part, user=user, total_size_byte=full_size_origin,
+                                      get_done=lambda: os.path.getsize(file_path_part))
 
-        # Remove the lock file
-        os.remove(file_path_part + s.LOCK_SUFFIX)
+            try:
+                # Write the data (into reused buffers, a few MiB at a time) and output the progress
+                with heartbeat:
+                    write_response(dl_r, f, on_data=on_data)
 
-        # Tell others that the full file is downloaded
-        update_file_lock(base_file=self.path, user=user,
-                         total_size_byte=full_size_origin, part_size_byte=full_size_origin)
+            except BaseException:
+                if extractor is not None:
+                    extractor.abort()
+                raise
 
-        if Archive.verify_integrity(self.path) is False:
-            os.remove(self.path)
-            Exception('Integrity could not be verified! Deleting it!')
+            finally:
+                dl_r.close()
 
-        else:
-            print('Extracting files...')
-            Archive.extract_archive(self.path)
+                if bar is not None:
+                    bar.close()
 
-        if self.is_tar():
-            return tarfile.open(self.path)
-        else:
-            return ZipFile(self.path)
+            if extractor is None:
+                return False
+
+            if extractor.close() is False:
+                log('Could not extract ' + self.name + self.get_ext() + ' while downloading (' + str(extractor.error) +
+                    '). It will be checked and extracted once downloaded instead')
+                return False
+
+            return True
+
+    def get_member_index(self) -> MemberIndex:
+        """Get where each member's data is inside of the local copy of the archive, loading the index saved next to
+        the archive (or building it if there is none)
+
+        :return: The index of the archive's members
+        """
+        if self.path is None:
+            raise IOError('Archive ' + self.name + self.get_ext() + ' has not been downloaded!')
+
+        if self.member_index is None:
+            self.member_index = MemberIndex.get(self.path)
+
+        return self.member_index
+
+    def read_member(self, name: str) -> bytes:
+        """Read a single member (e.g. an image or a .geom file) out of the local copy of the archive without
+        extracting it
+
+        :param name: The path of the member inside of the archive
+        :return: The member's content
+        """
+        return self.get_member_index().read(name)
+
+    def view_member(self, name: str) -> memoryview:
+        """Get a zero-copy view of a single uncompressed member of the local copy of the archive (see
+        `MemberIndex.view`)
+
+        :param name: The path of the member inside of the archive
+        :return: A read-only view of the member's content
+        """
+        return self.get_member_index().view(name)
+
+    def open_remote(self) -> RemoteZip:
+        """Open the archive on the website without downloading it, so its members can be listed and single members
+        read with range requests (only zip archives list their members in one place)
+
+        :return: The remote archive
+        """
+        if not self.is_zip():
+            raise IOError('Only zip archives can be read from the website, ' + self.name + self.get_ext() +
+                          ' has to be downloaded!')
+
+        return RemoteZip(self.url, size=self.get_file_size_origin())
 
     def get_file_size_origin(self) -> int:  # pragma: no cover
         """Checks to see if the Archive object has its full size cached. If it doesn't then it will make a request to
@@ -255,10 +464,11 @@ class Archive:
         return True
 
     @staticmethod
-    def extract_archive(archive_file_path: Union[bytes, str]):
+    def extract_archive(archive_file_path: Union[bytes, str], member_filter: MemberFilter = None):
         """Extract all the contents of a archive file into a directory of the same name (minus the file extension).
 
         :param archive_file_path: The path to the archive file (including the file extension) to extract
+        :param member_filter: Picks which members to extract (None for every member)
         """
 
         f: TarFile or ZipFile
@@ -288,6 +498,10 @@ class Archive:
             else:
                 name = member.name
 
+            # Leave out members that are not needed
+            if member_filter is not None and not member_filter.matches(name):
+                continue
+
             if os.path.exists(os.path.join(extract_dir_path, os.path.split(name)[1])) is False:
                 print('\rCreating \t' + name + ' ... ', end='')
                 f.extract(member, extract_dir_path)
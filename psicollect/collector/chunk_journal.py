@@ -0,0 +1,259 @@
+import os
+import zlib
+from typing import Dict, List, Union
+
+import requests
+
+from psicollect.collector.session import get_session
+from psicollect.common import s
+
+
+class ChunkJournal:
+    """Keeps a checksum (CRC-32) of every complete chunk of fixed size written to the .part file of a download, stored
+    in a small text file next to the .part file so that the data already on the disk can be checked before a download
+    is resumed. The first line of the journal is `chunk_size = <size>` and each line after it is written as
+    `<index> = <crc>` (a chunk written again is appended, the last line for a chunk wins)."""
+
+    path: Union[bytes, str]  # The path to the journal file
+    part_file: Union[bytes, str]  # The path to the .part file the checksums are of
+    chunk_size: int  # The size of each chunk in bytes
+    checksums: Dict[int, int]  # The checksum of each complete chunk by its index
+
+    def __init__(self, part_file: Union[bytes, str], chunk_size: int = s.CHUNK_JOURNAL_CHUNK_SIZE,
+                 checksums: Dict[int, int] = None):
+        self.path = ChunkJournal.get_path(part_file)
+        self.part_file = part_file
+        self.chunk_size = chunk_size
+        self.checksums = dict() if checksums is None else checksums
+
+        # The chunk being received (see `update`)
+        self._index = 0
+        self._filled = 0
+        self._crc = 0
+
+    @staticmethod
+    def get_path(part_file: Union[bytes, str]) -> Union[bytes, str]:
+        """Get the path of the journal belonging to a .part file
+
+        :param part_file: The path to the .part file being downloaded
+        :return: The path to the journal file
+        """
+        return part_file + s.CHUNK_JOURNAL_SUFFIX
+
+    @staticmethod
+    def create(part_file: Union[bytes, str], chunk_size: int = s.CHUNK_JOURNAL_CHUNK_SIZE) -> 'ChunkJournal':
+        """Start a new (empty) journal for a .part file, replacing any journal already on the disk
+
+        :param part_file: The path to the .part file being downloaded
+        :param chunk_size: The size of each chunk in bytes
+        :return: The new journal
+        """
+        journal = ChunkJournal(part_file=part_file, chunk_size=chunk_size)
+
+        with open(journal.path, 'w') as f:
+            f.write('chunk_size = ' + str(chunk_size) + '\n')
+
+        return journal
+
+    @staticmethod
+    def load(part_file: Union[bytes, str]) -> 'ChunkJournal' or None:
+        """Read the journal belonging to a .part file from the disk
+
+        :param part_file: The path to the .part file being downloaded
+        :return: The journal or None if there is no (readable) journal for the file
+        """
+        path = ChunkJournal.get_path(part_file)
+
+        if os.path.exists(path) is False:
+            return None
+
+        chunk_size = None
+        checksums: Dict[int, int] = dict()
+
+        with open(path, 'r') as f:
+            for line in f.readlines():
+                if ' = ' not in line:
+                    # Blank, or the last line was cut off while being written
+                    continue
+
+                key, value = line.strip().split(' = ', 1)
+
+                try:
+                    if key == 'chunk_size':
+                        chunk_size = int(value)
+                    else:
+                        checksums[int(key)] = int(value, 16)
+                except ValueError:
+                    continue
+
+        if chunk_size is None:
+            return None
+
+        return ChunkJournal(part_file=part_file, chunk_size=chunk_size, checksums=checksums)
+
+    @staticmethod
+    def rebuild(part_file: Union[bytes, str], chunk_size: int = s.CHUNK_JOURNAL_CHUNK_SIZE) -> 'ChunkJournal':
+        """Create a journal from the complete chunks already in a .part file (for a download started without a journal,
+        whose data has to be trusted as it is)
+
+        :param part_file: The path to the .part file being downloaded
+        :param chunk_size: The size of each chunk in bytes
+        :return: The new journal (saved to the disk)
+        """
+        journal = ChunkJournal.create(part_file=part_file, chunk_size=chunk_size)
+
+        with open(part_file, 'rb') as f:
+            index = 0
+
+            while True:
+                data = f.read(chunk_size)
+
+                if len(data) < chunk_size:
+                    break
+
+                journal.record(index, zlib.crc32(data))
+                index += 1
+
+        return journal
+
+    def record(self, index: int, crc: int) -> None:
+        """Add the checksum of a complete chunk to the journal (appended to the file on the disk right away)
+
+        :param index: The index of the chunk
+        :param crc: The CRC-32 of the chunk
+        """
+        self.checksums[index] = crc
+
+        with open(self.path, 'a') as f:
+            f.write(str(index) + ' = ' + format(crc, '08x') + '\n')
+
+    def get_verified_size(self) -> int:
+        """Get the number of bytes at the start of the .part file covered by the checksums of consecutive chunks (the
+        part of the download that can be kept)"""
+        index = 0
+
+        while index in self.checksums:
+            index += 1
+
+        return index * self.chunk_size
+
+    def forget(self, first_index: int) -> None:
+        """Drop the checksums of a chunk and every chunk after it (before the .part file is cut back to that chunk)
+
+        :param first_index: The index of the first chunk to forget
+        """
+        self.checksums = {index: crc for index, crc in self.checksums.items() if index < first_index}
+
+        with open(self.path + '.tmp', 'w') as f:
+            f.write('chunk_size = ' + str(self.chunk_size) + '\n')
+
+            for index in sorted(self.checksums):
+                f.write(str(index) + ' = ' + format(self.checksums[index], '08x') + '\n')
+
+        os.replace(self.path + '.tmp', self.path)
+
+    def find_bad_chunks(self, tail_chunks: int = s.RESUME_VERIFY_CHUNKS) -> List[int]:
+        """Read the last chunks of the verified part of the .part file again and compare them to their checksums
+
+        :param tail_chunks: The number of chunks at the end of the verified part to check (None for every chunk)
+        :return: The indexes of the chunks whose data does not match (or is missing)
+        """
+        chunk_count = self.get_verified_size() // self.chunk_size
+        first = 0 if tail_chunks is None else max(0, chunk_count - tail_chunks)
+        bad: List[int] = list()
+
+        with open(self.part_file, 'rb') as f:
+            for index in range(first, chunk_count):
+                if hasattr(os, 'pread'):
+                    data = os.pread(f.fileno(), self.chunk_size, index * self.chunk_size)
+                else:
+                    # Windows has no os.pread
+                    f.seek(index * self.chunk_size)
+                    data = f.read(self.chunk_size)
+
+                if len(data) != self.chunk_size or zlib.crc32(data) != self.checksums[index]:
+                    bad.append(index)
+
+        return bad
+
+    def start(self, position: int) -> None:
+        """Get ready to receive the download from a position of the file (see `update`)
+
+        :param position: Where in the file the next data received goes (the start of a chunk)
+        """
+        if position % self.chunk_size != 0:
+            raise ValueError('A download has to continue at the start of a chunk, not at byte ' + str(position))
+
+        self._index = position // self.chunk_size
+        self._filled = 0
+        self._crc = 0
+
+    def update(self, data: memoryview) -> None:
+        """Add data received (in order, see `start`) to the checksum of the current chunk, recording the checksum of
+        every chunk that is completed
+
+        :param data: The data written to the .part file
+        """
+        while len(data) > 0:
+            take = min(len(data), self.chunk_size - self._filled)
+
+            self._crc = zlib.crc32(data[:take], self._crc)
+            self._filled += take
+            data = data[take:]
+
+            if self._filled == self.chunk_size:
+                self.record(self._index, self._crc)
+                self._index += 1
+                self._filled = 0
+                self._crc = 0
+
+    def remove(self) -> None:
+        """Delete the journal from the disk"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def repair_part(url: str, journal: ChunkJournal, tail_chunks: int = s.RESUME_VERIFY_CHUNKS, log=print) -> int:
+    """Check the data already downloaded to a .part file before resuming its download. Chunks whose data does not match
+    their checksums are downloaded again on their own (with range requests), and anything after the last complete chunk
+    (which has no checksum yet) is cut off so the download continues from there.
+
+    :param url: The url of the file being downloaded
+    :param journal: The checksums of the .part file
+    :param tail_chunks: The number of chunks at the end of the .part file to check (None for every chunk)
+    :param log: The function used to print messages
+    :return: The number of bytes of the .part file that are kept (where the download continues)
+    """
+    bad = journal.find_bad_chunks(tail_chunks=tail_chunks)
+
+    if len(bad) > 0:
+        log('Downloading ' + str(len(bad)) + ' damaged chunk(s) of ' + str(journal.part_file) + ' again ...')
+
+    with open(journal.part_file, 'r+b') as f:
+        for index in bad:
+            start = index * journal.chunk_size
+            end = start + journal.chunk_size - 1
+
+            with get_session().get(url, headers={'Range': 'bytes=' + str(start) + '-' + str(end)}) as r:
+                data = r.content if r.status_code == requests.codes.partial_content else None
+
+            if data is None or len(data) != journal.chunk_size:
+                # The chunk cannot be downloaded on its own, so keep only what comes before it
+                log('Could not download chunk ' + str(index) + ' of ' + str(journal.part_file) + ' on its own. '
+                    'Resuming from before it instead')
+                journal.forget(index)
+                break
+
+            if hasattr(os, 'pwrite'):
+                os.pwrite(f.fileno(), data, start)
+            else:
+                # Windows has no os.pwrite
+                f.seek(start)
+                f.write(data)
+            journal.record(index, zlib.crc32(data))
+
+        # The data after the last complete chunk was never checked, so it is downloaded again
+        kept = journal.get_verified_size()
+        f.truncate(kept)
+
+    return kept
@@ -1,25 +1,60 @@
 import re
-from typing import List
+from typing import List, Union
 
-from psicollect.collector.response_getter import get_http_response
+from psicollect.collector.response_getter import get_http_text
 from psicollect.collector.storm import Storm
 from psicollect.common import s
 
 
 class ConnectionHandler:
     """An object that facilitates the connection between the user's computer and
-    the NOAA website, reachable by HTTP(S)
+    the NOAA website, reachable by HTTP(S). Nothing is downloaded until the list of storms is first needed.
     """
 
-    html_text: str  # Declare variable to hold the HTML file text
+    url: str  # The url of the page that lists every storm
 
-    storm_list: List[Storm] = list()
-    storm_list_last_pattern: str = None
+    storm_list: List[Storm]
+    storm_list_last_pattern: str or None
 
-    def __init__(self, html_text: str = get_http_response(s.URL_BASE).text):
-        """Connect to the website and analyze the content"""
-        self.html_text = html_text
-        self.generate_storm_list()
+    def __init__(self, html_text: str = None, url: str = s.URL_BASE):
+        """Prepare to connect to the website (the page listing every storm is fetched on first use)
+
+        :param html_text: The HTML text of the page listing every storm, or None to fetch it from `url` when needed
+        :param url: The url of the page that lists every storm
+        """
+        self.url = url
+        self._html_text = html_text
+
+        self.storm_list = list()
+        self.storm_list_last_pattern = None
+
+    @classmethod
+    def from_snapshot(cls, path: Union[bytes, str]) -> 'ConnectionHandler':
+        """Create a handler from a copy of the page listing every storm saved on the disk, without connecting to the
+        website (useful offline, see `save_snapshot`)
+
+        :param path: The path to the saved copy of the page
+        :returns: The new handler
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(html_text=f.read())
+
+    @property
+    def html_text(self) -> str:
+        """The HTML text of the page listing every storm (fetched from the website on first use)"""
+        if self._html_text is None:
+            self._html_text = get_http_text(self.url)
+
+        return self._html_text
+
+    def save_snapshot(self, path: Union[bytes, str]) -> None:
+        """Save a copy of the page listing every storm to the disk so it can be used offline later (see
+        `from_snapshot`)
+
+        :param path: The path to save the copy of the page to
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.html_text)
 
     def generate_storm_list(self, search_re: str = '.*') -> List[Storm]:
         """Generates a list of tracked storms from the HTTP request
@@ -0,0 +1,356 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Tuple, Union, Dict
+from urllib.parse import urlparse
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+from psicollect.collector.archive import Archive
+from psicollect.collector.http_cache import HttpCache, get_cache, is_success
+from psicollect.collector.io_engine import LockHeartbeat
+from psicollect.collector.pipeline import MemberFilter, UnsafeMemberException
+from psicollect.collector.response_getter import get_full_content_length
+from psicollect.collector.retry import CircuitOpenError, RetryPolicy, get_circuit_breaker, get_host, get_retry_policy
+from psicollect.collector.scheduler import AggregateProgress, DownloadScheduler, get_skip_reason
+from psicollect.common import h, s
+
+
+class Downloader:
+    """The interface shared by every download backend. A downloader can ask for the sizes of many files at once and
+    download a queue of archives, keeping the same .part / .lock resume and skip behavior no matter the backend."""
+
+    user: str  # The user to download as (locking mechanism)
+    jobs: int  # The maximum number of archives to download at the same time
+    jobs_per_host: int  # The maximum number of archives to download from any single host at the same time
+    overwrite: bool  # Whether or not to overwrite existing archive files with the same name
+    retry_policy: RetryPolicy  # How many times to try each download and how long to wait in between
+    probe_concurrency: int  # The maximum number of requests for file sizes to have open at the same time
+    extract_workers: int  # The number of processes to extract each zip archive with once it is downloaded
+    member_filter: MemberFilter or None  # Picks which members of each archive to extract (None for every member)
+
+    failed: List[Archive]  # The archives that could not be downloaded in any of the attempts allowed
+
+    def __init__(self, user: str, jobs: int = s.DEFAULT_DOWNLOAD_JOBS,
+                 jobs_per_host: int = s.DEFAULT_DOWNLOAD_JOBS_PER_HOST, overwrite: bool = False,
+                 retry_policy: RetryPolicy = None, probe_concurrency: int = s.DEFAULT_PROBE_CONCURRENCY,
+                 extract_workers: int = s.DEFAULT_EXTRACT_WORKERS, member_filter: MemberFilter = None):
+        """Initializes the downloader with the limits shared by every backend
+
+        :param user: The user to download as (locking mechanism)
+        :param jobs: The maximum number of archives to download at the same time
+        :param jobs_per_host: The maximum number of archives to download from any single host at the same time
+        :param overwrite: Whether or not to overwrite existing archive files with the same name
+        :param retry_policy: How many times to try each download and how long to wait in between (defaults to the
+        policy shared by the whole process, see `retry.configure_retry`)
+        :param probe_concurrency: The maximum number of requests for file sizes to have open at the same time
+        :param extract_workers: The number of processes to extract each zip archive with once it is downloaded
+        :param member_filter: Picks which members of each archive to extract (None for every member)
+        """
+        self.user = user
+        self.jobs = max(1, jobs)
+        self.jobs_per_host = max(1, jobs_per_host)
+        self.overwrite = overwrite
+        self.retry_policy = get_retry_policy() if retry_policy is None else retry_policy
+        self.probe_concurrency = max(1, probe_concurrency)
+        self.extract_workers = max(1, extract_workers)
+        self.member_filter = member_filter
+
+        self.failed = list()
+
+    def get_content_lengths(self, urls: List[str]) -> List[int]:
+        """Ask the website for the size of each file (0 if the size could not be found)
+
+        :param urls: The urls of the files
+        :return: The size of each file in bytes, in the same order as the urls
+        """
+        raise NotImplementedError
+
+    def download(self, queue: List[Tuple[Archive, Union[bytes, str]]]) -> None:
+        """Download every archive in the queue, blocking until all of them are either downloaded, skipped, or out of
+        attempts (see `failed`)
+
+        :param queue: The archives to download and the directory to save each to
+        """
+        raise NotImplementedError
+
+
+class ThreadedDownloader(Downloader):
+    """Downloads using blocking `requests` calls spread over a pool of threads"""
+
+    segments: int  # The number of byte ranges to split each archive into and download at the same time
+    stream_extract: bool  # Whether (True) or not (False) to extract tar archives while they download
+
+    def __init__(self, user: str, segments: int = s.DEFAULT_DOWNLOAD_SEGMENTS,
+                 stream_extract: bool = s.DEFAULT_STREAM_EXTRACT, **kwargs):
+        """Initializes the downloader
+
+        :param user: The user to download as (locking mechanism)
+        :param segments: The number of byte ranges to split each archive into and download at the same time
+        :param stream_extract: Whether (True) or not (False) to extract tar archives while they download
+        :param kwargs: The limits shared by every backend (see `Downloader`)
+        """
+        Downloader.__init__(self, user=user, **kwargs)
+        self.segments = segments
+        self.stream_extract = stream_extract
+
+    def get_content_lengths(self, urls: List[str]) -> List[int]:
+        with ThreadPoolExecutor(max_workers=self.probe_concurrency) as executor:
+            return list(executor.map(get_full_content_length, urls))
+
+    def download(self, queue: List[Tuple[Archive, Union[bytes, str]]]) -> None:
+        scheduler = DownloadScheduler(user=self.user, jobs=self.jobs, jobs_per_host=self.jobs_per_host,
+                                      overwrite=self.overwrite, retry_policy=self.retry_policy, segments=self.segments,
+                                      stream_extract=self.stream_extract, extract_workers=self.extract_workers,
+                                      member_filter=self.member_filter)
+
+        for archive, output_dir in queue:
+            scheduler.add(archive=archive, output_dir=output_dir)
+
+        scheduler.run()
+        self.failed.extend(scheduler.failed)
+
+
+class AsyncDownloader(Downloader):
+    """Downloads using a single asyncio event loop (with aiohttp), so hundreds of requests for file sizes and several
+    archive streams can be open at the same time without a thread for each. Semaphores bound how many requests are
+    open at once. Archives are downloaded as a single stream each (segmented downloads need the threaded backend)."""
+
+    timeout: float  # The amount of seconds to wait for a connection or for more data before giving up on a request
+
+    def __init__(self, user: str, timeout: float = s.DEFAULT_READ_TIMEOUT, **kwargs):
+        """Initializes the downloader
+
+        :param user: The user to download as (locking mechanism)
+        :param timeout: The amount of seconds to wait for a connection or for more data before giving up on a request
+        :param kwargs: The limits shared by every backend (see `Downloader`)
+        """
+        if aiohttp is None:  # pragma: no cover
+            raise ImportError('The asyncio download backend requires aiohttp. '
+                              'Install it with "pip install psi-collect[async]"')
+
+        Downloader.__init__(self, user=user, **kwargs)
+        self.timeout = timeout
+
+    @staticmethod
+    def _run(coroutine):
+        """Run a coroutine on a new event loop until it completes
+
+        :param coroutine: The coroutine to run
+        :return: The result of the coroutine
+        """
+        loop = asyncio.new_event_loop()
+
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            loop.close()
+
+    def _session(self) -> 'aiohttp.ClientSession':
+        """Create an HTTP session with enough connections for every probe and download allowed at the same time"""
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.probe_concurrency + self.jobs),
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=self.timeout, sock_read=self.timeout))
+
+    def get_content_lengths(self, urls: List[str]) -> List[int]:
+        return self._run(self._get_content_lengths(urls))
+
+    async def _get_content_lengths(self, urls: List[str], session: 'aiohttp.ClientSession' = None) -> List[int]:
+
+        if session is None:
+            async with self._session() as session:
+                return await self._get_content_lengths(urls, session=session)
+
+        limit = asyncio.Semaphore(self.probe_concurrency)
+        cache = get_cache()
+
+        async def get_content_length(url: str) -> int:
+            # Use the cached size if it is still fresh (see `get_full_content_length`)
+            entry = cache.get(url) if cache is not None else None
+
+            if cache is not None and cache.is_fresh(entry):
+                return entry['content_length'] or 0
+
+            async with limit:
+                try:
+                    # Ask the server how big its' package is
+                    async with session.head(url, allow_redirects=True,
+                                            headers=HttpCache.get_validators(entry)) as head:
+
+                        if head.status == 304 and entry is not None:
+                            cache.revalidate(url, entry)
+                            return entry['content_length'] or 0
+
+                        if cache is not None:
+                            cache.put(url, status=head.status, headers=head.headers)
+
+                        # The length of an error page (e.g. 404 or 500) is not the size of the file
+                        if not is_success(head.status) or head.headers.get('Content-Length') is None:
+                            return 0
+
+                        return int(head.headers.get('Content-Length'))
+
+                except (aiohttp.ClientError, asyncio.TimeoutError, OSError):  # pragma: no cover
+                    # The website cannot be reached, so make do with the old size (if there is one)
+                    return (entry['content_length'] or 0) if entry is not None else 0
+
+        return list(await asyncio.gather(*[get_content_length(url) for url in urls]))
+
+    def download(self, queue: List[Tuple[Archive, Union[bytes, str]]]) -> None:
+
+        if len(queue) == 0:
+            return
+
+        self._run(self._download_all(queue))
+
+    async def _download_all(self, queue: List[Tuple[Archive, Union[bytes, str]]]) -> None:
+
+        async with self._session() as session:
+
+            # Ask for every unknown archive size at once instead of one request at a time
+            unknown = [archive for archive, _ in queue if archive.file_origin_size is None]
+            for archive, size in zip(unknown, await self._get_content_lengths([a.url for a in unknown], session)):
+                archive.file_origin_size = size
+
+            progress = AggregateProgress(total_size_byte=sum(archive.get_file_size_origin() for archive, _ in queue))
+
+            limit = asyncio.Semaphore(self.jobs)
+            host_limits: Dict[str, asyncio.Semaphore] = dict()
+
+            for archive, _ in queue:
+                host = urlparse(archive.url).netloc
+                if host not in host_limits:
+                    host_limits[host] = asyncio.Semaphore(self.jobs_per_host)
+
+            try:
+                await asyncio.gather(*[
+                    self._download(session, limit, host_limits[urlparse(archive.url).netloc], archive, output_dir,
+                                   progress)
+                    for archive, output_dir in queue])
+            finally:
+                progress.close()
+
+    async def _download(self, session: 'aiohttp.ClientSession', limit: asyncio.Semaphore,
+                        host_limit: asyncio.Semaphore, archive: Archive, output_dir: Union[bytes, str],
+                        progress: AggregateProgress) -> None:
+        """Repeatedly try to download the archive until it completes successfully, is skipped because another
+        user is downloading (or has downloaded) it, or runs out of attempts (see `retry_policy`)"""
+
+        archive_file_path = os.path.join(output_dir, str(archive.name) + archive.get_ext())
+
+        # Requests made with aiohttp do not go through the shared session, so the circuit of the host is kept here
+        host = get_host(archive.url)
+        breaker = get_circuit_breaker()
+
+        for attempt in range(self.retry_policy.attempts):
+            try:
+                skip_reason = get_skip_reason(archive_file_path=archive_file_path, user=self.user,
+                                              overwrite=self.overwrite)
+
+                if skip_reason is not None:
+                    progress.write(skip_reason)
+                    progress.resume(archive_file_path, archive.get_file_size_origin())
+                else:
+                    async with limit, host_limit:
+                        breaker.check(host)
+                        await self._download_archive(session, archive, output_dir, progress)
+                        breaker.record_success(host)
+
+                return
+
+            except UnsafeMemberException as e:
+                # The archive is not corrupted, so downloading it again would run into the same member
+                h.print_error('Not extracting ' + archive.name + archive.get_ext() + ': ' + str(e))
+                self.failed.append(archive)
+
+                return
+
+            except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError, CircuitOpenError) as e:
+                h.print_error('The download ran into a connection error: ' + str(e))
+
+                if not isinstance(e, CircuitOpenError):
+                    breaker.record_failure(host)
+
+            if attempt + 1 < self.retry_policy.attempts:
+                # Wait longer after every failed attempt, and at least until the host is tried again
+                delay = max(self.retry_policy.get_delay(attempt), breaker.get_wait(host))
+
+                h.print_error('Will retry download of ' + archive.name + archive.get_ext() + ' in ' +
+                              str(round(delay)) + ' seconds...')
+                await asyncio.sleep(delay)
+
+        h.print_error('Giving up on ' + archive.name + archive.get_ext() + ' after ' +
+                      str(self.retry_policy.attempts) + ' attempts')
+        self.failed.append(archive)
+
+    async def _download_archive(self, session: 'aiohttp.ClientSession', archive: Archive,
+                                output_dir: Union[bytes, str], progress: AggregateProgress) -> None:
+        """Download the archive as a single stream of bytes, appending to (resuming) the .part file if it exists, then
+        verify and extract it on a separate thread so the event loop can keep serving other downloads"""
+
+        # The full path of the file including the file name and file type
+        archive.path = os.path.join(output_dir, str(archive.name) + archive.get_ext())
+
+        if self.overwrite is False and os.path.isfile(archive.path):
+            progress.write('File \"' + archive.path + '\" already exists!  ... Skipping')
+            progress.resume(archive.path, archive.get_file_size_origin())
+            return
+
+        # Create the directory specified if it does not exist
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+        file_path_part: str = archive.path + s.PART_SUFFIX
+        full_size_origin = archive.get_file_size_origin()
+
+        # See how far a file has been downloaded at the specified path if one exists
+        pos = os.path.getsize(file_path_part) if os.path.exists(file_path_part) else 0
+
+        headers = dict()
+        if pos:
+            # Add a header that specifies only to send back the bytes needed
+            headers['Range'] = 'bytes=' + str(pos) + '-' + str(full_size_origin)
+
+        async with session.get(archive.url, headers=headers) as dl_r:
+
+            if pos and dl_r.status != 206:
+                # The server sent back the whole file, so start over
+                pos = 0
+
+            # Ensure that both the program and the website are on the same page (tried again like a dropped connection,
+            # instead of stopping every other download)
+            if dl_r.content_length is not None and pos + dl_r.content_length != full_size_origin:
+                raise ConnectionError('Remaining file size of ' + archive.name + archive.get_ext() +
+                                      ' does not match with local cache. Something went wrong with partial file '
+                                      'request!')
+
+            progress.write('Downloading ' + ('the rest of ' if pos else '') + archive.name + archive.get_ext() +
+                           ' ...')
+
+            # The part of the archive already downloaded does not count towards the shared progress
+            progress.resume(archive.path, pos)
+
+            # Update the lock file every so often (on a separate thread) so others know it is being downloaded
+            heartbeat = LockHeartbeat(part_file=file_path_part, user=self.user, total_size_byte=full_size_origin,
+                                      get_done=lambda: os.path.getsize(file_path_part))
+
+            loop = asyncio.get_event_loop()
+
+            with open(file_path_part, 'ab' if pos else 'wb') as f, heartbeat:
+                async for data in dl_r.content.iter_chunked(s.DOWNLOAD_BUFFER_SIZE):
+                    # Writing to the disk can block (e.g. a network drive), so keep it off of the event loop
+                    await loop.run_in_executor(None, f.write, data)
+                    progress.update(len(data), key=archive.path)
+
+        # Verifying and extracting reads the whole archive, so keep it off of the event loop
+        result = await asyncio.get_event_loop().run_in_executor(
+            None, partial(archive.finish_download, user=self.user, full_size_origin=full_size_origin,
+                          log=progress.write, extract_workers=self.extract_workers,
+                          member_filter=self.member_filter))
+
+        if result is not None:
+            result.close()
@@ -0,0 +1,254 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Union
+
+from psicollect.common import s
+
+
+def is_success(status: int or None) -> bool:
+    """Get whether (True) or not (False) a status code is of a successful response (2xx)"""
+    return status is not None and 200 <= status < 300
+
+
+class HttpCache:
+    """A cache of HTTP responses stored on the disk so that pages and archive sizes do not have to be asked for again on
+    every run. Each url gets a small metadata file (status, size, ETag and Last-Modified) and, for pages, a file with
+    the page's text. Entries older than `ttl` seconds are stale: they are revalidated with a conditional request (which
+    costs no data if nothing changed) and are still used if the website cannot be reached (offline). The least recently
+    used entries are removed once the cache grows past `max_size` bytes."""
+
+    path: Union[bytes, str]  # The directory to store the cache in
+    ttl: float  # The amount of seconds an entry is used without asking the website if it changed
+    max_size: int  # The most bytes the cache may take up on the disk
+    refresh: bool  # Whether (True) or not (False) to treat every entry as stale (always revalidate)
+
+    def __init__(self, path: Union[bytes, str] = s.HTTP_CACHE_PATH, ttl: float = s.HTTP_CACHE_TTL,
+                 max_size: int = s.HTTP_CACHE_MAX_SIZE, refresh: bool = False):
+        """Initializes the cache, creating its directory if it does not exist
+
+        :param path: The directory to store the cache in
+        :param ttl: The amount of seconds an entry is used without asking the website if it changed
+        :param max_size: The most bytes the cache may take up on the disk
+        :param refresh: Whether (True) or not (False) to treat every entry as stale (always revalidate)
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.refresh = refresh
+
+        self._lock = threading.Lock()
+        self._size: int or None = None  # The current size of the cache in bytes (measured on first write)
+
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+
+    def _get_entry_path(self, url: str) -> Union[bytes, str]:
+        """Get the path of the metadata file of a url (the page text is stored next to it with a '.body' suffix)"""
+        return os.path.join(self.path, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, url: str) -> Dict or None:
+        """Get the cached entry of a url
+
+        :param url: The url to look up
+        :return: The entry (with the keys 'url', 'fetched', 'status', 'etag', 'last_modified', 'content_length', and
+        'has_body') or None if the url is not cached
+        """
+        entry_path = self._get_entry_path(url)
+
+        try:
+            with open(entry_path, 'r') as f:
+                entry = json.load(f)
+
+            # Mark the entry as recently used so it is evicted last
+            os.utime(entry_path)
+
+        except (OSError, ValueError):
+            return None
+
+        if entry.get('url') != url or not is_success(entry.get('status')):
+            # A different url with the same hash, or an error response stored before errors were left out
+            return None
+
+        return entry
+
+    def get_body(self, url: str) -> str or None:
+        """Get the cached text of a page
+
+        :param url: The url of the page
+        :return: The page's text or None if it is not cached
+        """
+        try:
+            with open(self._get_entry_path(url)[:-len('.json')] + '.body', 'r', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def is_fresh(self, entry: Dict or None) -> bool:
+        """Get whether (True) or not (False) an entry can be used without asking the website if it changed
+
+        :param entry: The entry to check (see `get`)
+        """
+        return entry is not None and self.refresh is False and time.time() - entry['fetched'] < self.ttl
+
+    @staticmethod
+    def get_validators(entry: Dict or None) -> Dict[str, str]:
+        """Get the headers that make a request conditional, so the website responds with '304 Not Modified' (and no
+        data) if nothing has changed since the entry was cached
+
+        :param entry: The cached entry of the url (see `get`) or None
+        :return: The headers to send with the request
+        """
+        headers = dict()
+
+        if entry is not None:
+            if entry.get('etag') is not None:
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified') is not None:
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        return headers
+
+    def put(self, url: str, status: int, headers, body: str = None) -> Dict or None:
+        """Store (or replace) the entry of a url. Only successful (2xx) responses are stored, since the size and text of
+        an error page (e.g. '404 Not Found') are not the ones of the url. An error response removes the url's entry.
+
+        :param url: The url of the response
+        :param status: The status code of the response
+        :param headers: The headers of the response
+        :param body: The text of the page or None to only store its metadata
+        :return: The new entry (None if the response was not stored)
+        """
+        if not is_success(status):
+            self.remove(url)
+            return None
+
+        content_length = headers.get('Content-Length')
+
+        entry = {'url': url, 'fetched': time.time(), 'status': status,
+                 'etag': headers.get('ETag'), 'last_modified': headers.get('Last-Modified'),
+                 'content_length': int(content_length) if content_length is not None else None,
+                 'has_body': body is not None}
+
+        entry_path = self._get_entry_path(url)
+        body_path = entry_path[:-len('.json')] + '.body'
+
+        with self._lock:
+            added = 0
+
+            if body is not None:
+                added += self._write(body_path, body)
+            elif os.path.exists(body_path):
+                added -= os.path.getsize(body_path)
+                os.remove(body_path)
+
+            added += self._write(entry_path, json.dumps(entry))
+
+            self._track_size(added)
+
+        return entry
+
+    def remove(self, url: str) -> None:
+        """Remove the entry of a url (if it is cached)
+
+        :param url: The url of the entry
+        """
+        entry_path = self._get_entry_path(url)
+
+        with self._lock:
+            removed = 0
+
+            for path in (entry_path, entry_path[:-len('.json')] + '.body'):
+                if os.path.exists(path):
+                    removed += os.path.getsize(path)
+                    os.remove(path)
+
+            if removed > 0:
+                self._track_size(-removed)
+
+    def revalidate(self, url: str, entry: Dict) -> Dict:
+        """Mark an entry as fresh again after the website said that it has not changed
+
+        :param url: The url of the entry
+        :param entry: The entry (see `get`)
+        :return: The updated entry
+        """
+        entry['fetched'] = time.time()
+
+        with self._lock:
+            self._track_size(self._write(self._get_entry_path(url), json.dumps(entry)))
+
+        return entry
+
+    @staticmethod
+    def _write(path: Union[bytes, str], text: str) -> int:
+        """Replace a file all at once so that it is never half-written
+
+        :return: The change in size of the file in bytes
+        """
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(text)
+
+        os.replace(path + '.tmp', path)
+
+        return os.path.getsize(path) - old_size
+
+    def _track_size(self, added: int) -> None:
+        """Keep track of the size of the cache and remove the least recently used entries if it is too big (must be
+        called while holding the lock)
+
+        :param added: The number of bytes added to (or removed from, if negative) the cache
+        """
+        if self._size is None:
+            self._size = sum(entry.stat().st_size for entry in os.scandir(self.path) if entry.is_file())
+        else:
+            self._size += added
+
+        if self._size <= self.max_size:
+            return
+
+        # Remove the least recently used entries until the cache is back down to three quarters of its maximum size
+        entries = sorted((entry for entry in os.scandir(self.path) if entry.name.endswith('.json')),
+                         key=lambda entry: entry.stat().st_mtime)
+
+        for entry in entries:
+            if self._size <= self.max_size * 0.75:
+                break
+
+            for path in (entry.path, entry.path[:-len('.json')] + '.body'):
+                if os.path.exists(path):
+                    self._size -= os.path.getsize(path)
+                    os.remove(path)
+
+
+_cache: HttpCache or None = None  # The cache shared by the whole process (None = caching is turned off)
+
+
+def get_cache() -> HttpCache or None:
+    """Get the HTTP cache shared by the whole process
+
+    :return: The shared cache or None if caching is turned off (the default, see `configure_cache`)
+    """
+    return _cache
+
+
+def configure_cache(enabled: bool = True, path: Union[bytes, str] = s.HTTP_CACHE_PATH, ttl: float = s.HTTP_CACHE_TTL,
+                    max_size: int = s.HTTP_CACHE_MAX_SIZE, refresh: bool = False) -> HttpCache or None:
+    """Turn the HTTP cache shared by the whole process on (or off) and change its settings
+
+    :param enabled: Whether (True) or not (False) to cache responses
+    :param path: The directory to store the cache in
+    :param ttl: The amount of seconds an entry is used without asking the website if it changed
+    :param max_size: The most bytes the cache may take up on the disk
+    :param refresh: Whether (True) or not (False) to treat every entry as stale (always revalidate)
+    :return: The shared cache or None if caching is turned off
+    """
+    global _cache
+
+    _cache = HttpCache(path=path, ttl=ttl, max_size=max_size, refresh=refresh) if enabled else None
+
+    return _cache
@@ -0,0 +1,255 @@
+import os
+import threading
+from typing import BinaryIO, Callable, List, Union
+
+from requests import Response
+
+from psicollect.collector.locking import update_file_lock
+from psicollect.common import h, s
+
+
+class BufferPool:
+    """Buffers that downloads are received into, reused from one chunk (and one download) to the next instead of
+    allocating a new bytes object for every chunk"""
+
+    buffer_size: int  # The size of each buffer in bytes
+    max_free: int  # The most unused buffers to keep around
+
+    def __init__(self, buffer_size: int = s.DOWNLOAD_BUFFER_SIZE, max_free: int = 16):
+        """Create an empty pool (buffers are allocated as they are needed)
+
+        :param buffer_size: The size of each buffer in bytes
+        :param max_free: The most unused buffers to keep around
+        """
+        self.buffer_size = buffer_size
+        self.max_free = max_free
+
+        self._free: List[bytearray] = list()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bytearray:
+        """Take a buffer out of the pool (allocating one if every buffer is in use)"""
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+
+        return bytearray(self.buffer_size)
+
+    def release(self, buffer: bytearray) -> None:
+        """Give a buffer back to the pool once it is no longer used"""
+        with self._lock:
+            if len(self._free) < self.max_free and len(buffer) == self.buffer_size:
+                self._free.append(buffer)
+
+
+_pool = BufferPool()  # The buffers shared by every download of the process
+
+
+def get_buffer_pool() -> BufferPool:
+    """Get the buffers shared by every download of the process"""
+    return _pool
+
+
+def preallocate(f: BinaryIO, size: int) -> None:
+    """Make a file the given size, reserving the disk space for it up front (`posix_fallocate`) so that it is not
+    fragmented and the disk cannot fill up halfway through a download. File systems that cannot reserve space (e.g.
+    network drives) just get a file of the right size. Files that are already at least as large are not changed.
+
+    :param f: The file (opened for writing)
+    :param size: The size to make the file in bytes
+    """
+    f.flush()
+
+    if os.fstat(f.fileno()).st_size >= size:
+        return
+
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+            return
+        except OSError:  # pragma: no cover
+            pass
+
+    f.truncate(size)
+
+
+def _get_body(response: Response) -> BinaryIO or None:
+    """Get the `http.client` response under a streamed response, which receives the body straight into a buffer
+    (`readinto`) without a bytes object in between. `urllib3`'s own `readinto` reads into a new bytes object and copies
+    it, so it is skipped (see `_release` for giving the connection back afterwards).
+
+    :param response: The response (requested with `stream=True`)
+    :return: The `http.client` response, or None if the body has to be decoded (e.g. gzip) and cannot be read that way
+    """
+    if response.headers.get('Content-Encoding', 'identity').lower() not in ('identity', ''):
+        return None
+
+    fp = getattr(response.raw, '_fp', None)
+
+    if fp is None or not hasattr(fp, 'readinto') or not hasattr(fp, 'isclosed'):  # pragma: no cover
+        return None
+
+    return fp
+
+
+def _release(response: Response, body: BinaryIO) -> None:
+    """Give the connection of a response back to the pool once its body was read past `urllib3` (see `_get_body`).
+    `urllib3` does not see the end of the body then, and would otherwise close the connection instead of reusing it.
+
+    :param response: The response (requested with `stream=True`)
+    :param body: The `http.client` response under it
+    """
+    # The `http.client` response closes itself once the whole body was read, a connection with part of a body left
+    # unread cannot be used for another request
+    if body.isclosed():
+        response.raw.release_conn()
+
+
+def _fill(readinto: Callable[[memoryview], int], view: memoryview) -> int:
+    """Receive into a buffer until it is full or the body ends
+
+    :param readinto: The function that receives part of the body into a buffer
+    :param view: The buffer to fill
+    :return: The number of bytes received (less than the size of the buffer only at the end of the body)
+    """
+    received = 0
+
+    while received < len(view):
+        n = readinto(view[received:])
+
+        if not n:
+            break
+
+        received += n
+
+    return received
+
+
+def write_response(response: Response, f: BinaryIO, on_data: Callable[[memoryview], None] = None,
+                   pool: BufferPool = None, alignment: int = s.DOWNLOAD_WRITE_ALIGNMENT) -> int:
+    """Write the body of a streamed response to a file at its current position, receiving into reusable buffers and
+    writing whole buffers at a time. The first write is cut short at an alignment boundary of the file (when resuming
+    part way into a file), so every write after it starts on a boundary.
+
+    :param response: The response (requested with `stream=True`)
+    :param f: The file to write to (opened for binary writing, positioned where the body goes)
+    :param on_data: Called with each chunk written. The chunk is a view of a buffer that is reused right after, so it
+    must be copied to be kept.
+    :param pool: The buffers to receive into (defaults to the ones shared by every download)
+    :param alignment: The block size in bytes that writes are aligned to
+    :return: The number of bytes written
+    """
+    body = _get_body(response)
+
+    if body is None:
+        # The body has to be decoded, so let `requests` do it a chunk at a time
+        written = 0
+
+        for data in response.iter_content(chunk_size=s.DOWNLOAD_BUFFER_SIZE):
+            f.write(data)
+            written += len(data)
+
+            if on_data is not None:
+                on_data(memoryview(data))
+
+        return written
+
+    pool = get_buffer_pool() if pool is None else pool
+    buffer = pool.acquire()
+    view = memoryview(buffer)
+
+    offset = f.tell()
+    written = 0
+
+    try:
+        while True:
+            # Fill only up to the next boundary of the file first, so that every later write starts on a boundary
+            wanted = len(buffer) - (offset % alignment if len(buffer) > alignment else 0)
+
+            n = _fill(body.readinto, view[:wanted])
+
+            if n == 0:
+                break
+
+            f.write(view[:n])
+            offset += n
+            written += n
+
+            if on_data is not None:
+                on_data(view[:n])
+
+            if n < wanted:
+                # The end of the body
+                break
+    finally:
+        view.release()
+        pool.release(buffer)
+
+    _release(response, body)
+
+    return written
+
+
+class LockHeartbeat:
+    """Updates the lock file of a download every so often on a separate thread (so others know it is still being
+    downloaded), keeping the clock and the lock file out of the loop that receives the download"""
+
+    part_file: Union[bytes, str]  # The path to the .part file being downloaded
+    user: str  # The user downloading the file (locking mechanism)
+    total_size_byte: int  # The total size of the file being downloaded in bytes
+    get_done: Callable[[], int]  # Gets the number of bytes downloaded so far
+    interval: float  # The amount of seconds between updates
+
+    def __init__(self, part_file: Union[bytes, str], user: str, total_size_byte: int, get_done: Callable[[], int],
+                 interval: float = s.LOCK_UPDATE_INTERVAL):
+        """Create a heartbeat for a download (see `start`)
+
+        :param part_file: The path to the .part file being downloaded
+        :param user: The user downloading the file (locking mechanism)
+        :param total_size_byte: The total size of the file being downloaded in bytes
+        :param get_done: Gets the number of bytes downloaded so far (called from the heartbeat's thread)
+        :param interval: The amount of seconds between updates
+        """
+        self.part_file = part_file
+        self.user = user
+        self.total_size_byte = total_size_byte
+        self.get_done = get_done
+        self.interval = interval
+
+        self._stopped = threading.Event()
+        self._thread: threading.Thread or None = None
+
+    def update(self) -> None:
+        """Update the lock file right away"""
+        try:
+            update_file_lock(base_file=self.part_file, user=self.user, part_size_byte=self.get_done(),
+                             total_size_byte=self.total_size_byte)
+        except OSError as e:  # pragma: no cover
+            # A lock file that could not be updated should not stop the download
+            h.print_error('Could not update the lock file of ' + str(self.part_file) + ': ' + str(e))
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.update()
+
+    def start(self) -> 'LockHeartbeat':
+        """Update the lock file now, and then every interval until stopped"""
+        self.update()
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+        return self
+
+    def stop(self) -> None:
+        """Stop updating the lock file"""
+        self._stopped.set()
+
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> 'LockHeartbeat':
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
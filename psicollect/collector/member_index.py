@@ -0,0 +1,237 @@
+import csv
+import mmap
+import os
+import struct
+import tarfile
+import zipfile
+import zlib
+from typing import BinaryIO, Dict, List, NamedTuple, Union
+
+from psicollect.common import s
+
+# The fixed-size start of a zip member's local header (the member's name and extra field follow it)
+ZIP_LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+ZIP_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+
+class IndexEntry(NamedTuple):
+    """Where a member's data is inside of an archive file"""
+
+    name: str  # The path of the member inside of the archive
+    offset: int  # The position of the member's (possibly compressed) data from the start of the archive file in bytes
+    size: int  # The size of the member in bytes
+    compress_size: int  # The size of the member's data inside of the archive in bytes (the same as `size` for tar)
+    compression: int  # How the member's data is compressed (zipfile.ZIP_STORED or zipfile.ZIP_DEFLATED)
+    crc: int or None  # The CRC-32 of the member's content (None for tar, which does not store one)
+
+
+def get_zip_data_offset(f: BinaryIO, info: zipfile.ZipInfo) -> int:
+    """Find where a zip member's (possibly compressed) data starts, from its local header. The data starts after the
+    local header, whose name and extra field can differ from the ones in the central directory.
+
+    :param f: The zip archive file (opened for binary reading, its position is moved)
+    :param info: The member's entry of the central directory
+    :return: The position of the member's data from the start of the archive file in bytes
+    """
+    f.seek(info.header_offset)
+    header = ZIP_LOCAL_HEADER.unpack(f.read(ZIP_LOCAL_HEADER.size))
+
+    if header[0] != ZIP_LOCAL_HEADER_SIGNATURE:  # pragma: no cover
+        raise zipfile.BadZipFile('Bad local header for member ' + info.filename)
+
+    return info.header_offset + ZIP_LOCAL_HEADER.size + header[9] + header[10]
+
+
+def get_zip_entry(f: BinaryIO, info: zipfile.ZipInfo) -> IndexEntry:
+    """Find where a zip member's data is inside of the archive
+
+    :param f: The zip archive file (opened for binary reading, its position is moved)
+    :param info: The member's entry of the central directory
+    :return: Where the member's data is and how it is stored
+    """
+    return IndexEntry(info.filename, get_zip_data_offset(f, info), info.file_size, info.compress_size,
+                      info.compress_type, info.CRC)
+
+
+def get_tar_entry(member: tarfile.TarInfo) -> IndexEntry:
+    """Find where a tar member's data is inside of the archive (tar members are stored without compression)
+
+    :param member: The member's header
+    :return: Where the member's data is
+    """
+    return IndexEntry(member.name, member.offset_data, member.size, member.size, zipfile.ZIP_STORED, None)
+
+
+def decode_member(entry: IndexEntry, data: bytes, archive_label: str) -> bytes:
+    """Turn the data of a member as stored in an archive into the member's content, decompressing it and checking its
+    size and CRC
+
+    :param entry: Where the member is and how it is stored
+    :param data: The member's data as stored in the archive (`entry.compress_size` bytes)
+    :param archive_label: The archive's path or url (for error messages)
+    :return: The member's content
+    """
+    if entry.compression == zipfile.ZIP_DEFLATED:
+        data = zlib.decompressobj(-zlib.MAX_WBITS).decompress(data)
+    elif entry.compression != zipfile.ZIP_STORED:
+        raise IOError('Member ' + entry.name + ' of ' + archive_label + ' uses an unsupported compression (' +
+                      str(entry.compression) + ')')
+
+    if len(data) != entry.size or (entry.crc is not None and zlib.crc32(data) != entry.crc):
+        raise IOError('Member ' + entry.name + ' of ' + archive_label + ' is corrupted!')
+
+    return data
+
+
+class MemberIndex:
+    """A list of where each member's data is inside of an archive file, saved next to the archive so a single member
+    can be read without extracting (or even scanning) the archive. Members are read with `os.pread` (`read`) or as
+    zero-copy views of the memory-mapped archive (`view`)."""
+
+    archive_file_path: Union[bytes, str]  # The path to the archive file
+    entries: Dict[str, IndexEntry]  # Where each member is by its path inside of the archive
+
+    def __init__(self, archive_file_path: Union[bytes, str], entries: List[IndexEntry]):
+        """Create an index from the location of each member
+
+        :param archive_file_path: The path to the archive file
+        :param entries: Where each member is inside of the archive
+        """
+        self.archive_file_path = archive_file_path
+        self.entries = {entry.name: entry for entry in entries}
+
+        self._file = None  # The archive file (opened on first read)
+        self._mmap: mmap.mmap or None = None  # The memory-mapped archive (mapped on first view)
+
+    @staticmethod
+    def get_path(archive_file_path: Union[bytes, str]) -> Union[bytes, str]:
+        """Get the path of the index of an archive (stored next to the archive)
+
+        :param archive_file_path: The path to the archive file
+        :return: The path to the archive's index
+        """
+        return archive_file_path + s.INDEX_SUFFIX
+
+    @classmethod
+    def build(cls, archive_file_path: Union[bytes, str]) -> 'MemberIndex':
+        """Find where each member's data is inside of an archive. Only the headers are read (a tar archive's data is
+        skipped over, a zip archive's central directory lists every member).
+
+        :param archive_file_path: The path to the archive file
+        :return: The index of the archive (not saved yet, see `save`)
+        """
+        entries: List[IndexEntry] = list()
+
+        if tarfile.is_tarfile(archive_file_path):
+            with tarfile.open(archive_file_path) as tar:
+                entries = [get_tar_entry(member) for member in tar if member.isfile()]
+
+        elif zipfile.is_zipfile(archive_file_path):
+            with zipfile.ZipFile(archive_file_path) as zf, open(archive_file_path, 'rb') as f:
+                entries = [get_zip_entry(f, info) for info in zf.infolist() if not info.filename.endswith('/')]
+
+        else:  # pragma: no cover
+            raise IOError('File is not of a supported archive type!')
+
+        return cls(archive_file_path, entries)
+
+    @classmethod
+    def load(cls, archive_file_path: Union[bytes, str]) -> 'MemberIndex' or None:
+        """Load the saved index of an archive
+
+        :param archive_file_path: The path to the archive file
+        :return: The index, or None if there is no index or it is older than the archive
+        """
+        index_path = cls.get_path(archive_file_path)
+
+        if not os.path.isfile(index_path) or os.path.getmtime(index_path) < os.path.getmtime(archive_file_path):
+            return None
+
+        with open(index_path, 'r', newline='') as f:
+            rows = list(csv.reader(f))[1:]
+
+        return cls(archive_file_path, [IndexEntry(name, int(offset), int(size), int(compress_size), int(compression),
+                                                  int(crc) if crc != '' else None)
+                                       for name, offset, size, compress_size, compression, crc in rows])
+
+    @classmethod
+    def get(cls, archive_file_path: Union[bytes, str]) -> 'MemberIndex':
+        """Load the saved index of an archive, building (and saving) it first if there is none
+
+        :param archive_file_path: The path to the archive file
+        :return: The index of the archive
+        """
+        index = cls.load(archive_file_path)
+
+        if index is None:
+            index = cls.build(archive_file_path)
+            index.save()
+
+        return index
+
+    def save(self) -> None:
+        """Save the index next to the archive (see `get_path`)"""
+        index_path = self.get_path(self.archive_file_path)
+
+        with open(index_path + '.tmp', 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(IndexEntry._fields)
+
+            for entry in self.entries.values():
+                writer.writerow(entry[:-1] + ('' if entry.crc is None else entry.crc,))
+
+        os.replace(index_path + '.tmp', index_path)
+
+    def read(self, name: str) -> bytes:
+        """Read the content of a single member (decompressing and checking the CRC of zip members)
+
+        :param name: The path of the member inside of the archive
+        :return: The member's content
+        """
+        entry = self.entries[name]
+
+        if entry.compression not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):  # pragma: no cover
+            with zipfile.ZipFile(self.archive_file_path) as zf:
+                return zf.read(name)
+
+        if self._file is None:
+            self._file = open(self.archive_file_path, 'rb')
+
+        if hasattr(os, 'pread'):
+            # Read at the member's position without moving a shared file position (safe to use from many threads)
+            data = os.pread(self._file.fileno(), entry.compress_size, entry.offset)
+        else:  # pragma: no cover
+            self._file.seek(entry.offset)
+            data = self._file.read(entry.compress_size)
+
+        return decode_member(entry, data, archive_label=str(self.archive_file_path))
+
+    def view(self, name: str) -> memoryview:
+        """Get a zero-copy view of the content of a single uncompressed member (every tar member, and zip members that
+        were stored without compression). The view must be released before the index is closed.
+
+        :param name: The path of the member inside of the archive
+        :return: A read-only view of the member's content in the memory-mapped archive
+        """
+        entry = self.entries[name]
+
+        if entry.compression != zipfile.ZIP_STORED:
+            raise ValueError('Member ' + name + ' is compressed, so it can only be read (see `read`)')
+
+        if self._mmap is None:
+            if self._file is None:
+                self._file = open(self.archive_file_path, 'rb')
+
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return memoryview(self._mmap)[entry.offset:entry.offset + entry.size]
+
+    def close(self) -> None:
+        """Close the archive file (and unmap it)"""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
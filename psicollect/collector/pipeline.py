@@ -0,0 +1,380 @@
+import csv
+import fnmatch
+import hashlib
+import multiprocessing
+import os
+import re
+import tarfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from tarfile import TarFile
+from typing import BinaryIO, List, NamedTuple, Pattern, Tuple, Union
+from zipfile import ZipFile, ZipInfo
+
+from psicollect.collector.member_index import IndexEntry, MemberIndex, get_tar_entry, get_zip_entry
+from psicollect.common import h, s
+
+# Extract links and directories of tar archives with the filter that rejects links pointing outside of the extract
+# directory (only in Python versions that have extraction filters)
+TAR_EXTRACT_OPTIONS = {'filter': 'data'} if hasattr(tarfile, 'data_filter') else dict()
+
+
+class ManifestEntry(NamedTuple):
+    """What was found out about a member of an archive while it was read"""
+
+    name: str  # The path of the member inside of the archive
+    size: int  # The size of the member in bytes
+    md5: str  # The MD5 hash of the member's content (hex)
+    written: bool  # Whether (True) or not (False) the member was written out (False if it already existed)
+
+
+class MemberFilter:
+    """Picks which members of an archive to extract, so members that are not needed (e.g. TIFs) never touch the disk.
+    A member is picked if it matches any of the globs, the regular expression, and any of the extensions (criteria
+    left out always match)."""
+
+    include: List[str]  # Globs that member paths are matched against (e.g. '20180915a_jpgs/jpgs/*')
+    include_re: Pattern or None  # A regular expression searched for in member paths
+    extensions: List[str]  # The file extensions to pick, lower-case and without the dot (e.g. 'jpg', 'geom')
+
+    def __init__(self, include: List[str] = None, include_re: str = None, extensions: List[str] = None):
+        """Create a filter (every member is picked if no criteria are given)
+
+        :param include: Globs that member paths are matched against ('*' also matches '/')
+        :param include_re: A regular expression searched for in member paths
+        :param extensions: The file extensions to pick, with or without the dot (case-insensitive)
+        """
+        self.include = list(include) if include else list()
+        self.include_re = re.compile(include_re) if include_re else None
+        self.extensions = [extension.lower().lstrip('.') for extension in extensions] if extensions else list()
+
+    def matches(self, name: str) -> bool:
+        """Get whether (True) or not (False) a member should be extracted
+
+        :param name: The path of the member inside of the archive
+        """
+        if self.include and not any(fnmatch.fnmatchcase(name, pattern) for pattern in self.include):
+            return False
+
+        if self.include_re is not None and self.include_re.search(name) is None:
+            return False
+
+        if self.extensions and os.path.splitext(name)[1].lower().lstrip('.') not in self.extensions:
+            return False
+
+        return True
+
+    def is_empty(self) -> bool:
+        """Get whether (True) or not (False) the filter picks every member"""
+        return not self.include and self.include_re is None and not self.extensions
+
+
+class UnsafeMemberException(ValueError):
+    """Raised for a member of an archive that would be extracted outside of the extract directory. The archive is not
+    corrupted, so downloading it again would not help."""
+
+    def __init__(self, name: str, extract_dir: Union[bytes, str]):
+        ValueError.__init__(self, 'Member ' + str(name) + ' would be extracted outside of ' + str(extract_dir) + '!')
+
+
+def get_member_path(extract_dir: Union[bytes, str], name: str) -> Union[bytes, str]:
+    """Get the path to extract a member of an archive to. Absolute parts (a leading '/' or a drive) of the member's
+    name are dropped and '..' parts are resolved, and a member that would still end up outside of the extract directory
+    (e.g. '../escaped.txt', or through a link extracted before it) is rejected.
+
+    :param extract_dir: The directory to extract the members to
+    :param name: The path of the member inside of the archive
+    :return: The path to extract the member to (inside of the extract directory)
+    :raises UnsafeMemberException: If the member would be extracted outside of the extract directory
+    """
+    # Make the member's name relative (like `ZipFile.extract` does), members are named with '/' on every system
+    relative = os.path.splitdrive(name.replace(os.sep, '/'))[1].lstrip('/')
+    target_path = os.path.join(extract_dir, os.path.normpath(relative))
+
+    root = os.path.realpath(extract_dir)
+    real_path = os.path.realpath(target_path)
+
+    if real_path != root and os.path.commonpath([root, real_path]) != root:
+        raise UnsafeMemberException(name=name, extract_dir=extract_dir)
+
+    return target_path
+
+
+def copy_member(source: BinaryIO, target_path: Union[bytes, str], size: int,
+                chunk_size: int = 1024 * 1024) -> Tuple[str, bool]:
+    """Read a member of an archive once, hashing it and writing it out at the same time. A member that already exists
+    with the right size is only read and hashed, not written again.
+
+    :param source: The member's content (reading it to the end checks the CRC of zip members)
+    :param target_path: The path to write the member to
+    :param size: The size of the member in bytes
+    :param chunk_size: The number of bytes to read at a time
+    :return: The MD5 hash of the member's content (hex) and whether (True) or not (False) it was written
+    """
+    md5 = hashlib.md5()
+    write = not (os.path.isfile(target_path) and os.path.getsize(target_path) == size)
+
+    if write:
+        # Other workers may be creating the same directory at the same time
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+
+    target = open(target_path, 'wb') if write else None
+
+    try:
+        while True:
+            data = source.read(chunk_size)
+            if not data:
+                break
+
+            md5.update(data)
+
+            if target is not None:
+                target.write(data)
+    finally:
+        if target is not None:
+            target.close()
+
+    return md5.hexdigest(), write
+
+
+def process_tar(tar: TarFile, extract_dir: Union[bytes, str], member_filter: MemberFilter = None,
+                index: List[IndexEntry] = None) -> List[ManifestEntry]:
+    """Verify, extract, and hash every member of a tar archive, reading the archive from start to end only once (works
+    with tar archives opened as a stream, mode 'r|')
+
+    :param tar: The opened tar archive
+    :param extract_dir: The directory to extract the members to
+    :param member_filter: Picks which members to extract (None for every member). The data of members that are not
+    picked is skipped over without being checked or written.
+    :param index: Where each file of the archive is inside of it gets added to this list (see `MemberIndex`), picked
+    or not (None to not keep track)
+    :return: What was found out about each file extracted
+    """
+    entries: List[ManifestEntry] = list()
+
+    for member in tar:
+        if index is not None and member.isfile():
+            # The headers are read anyway, so the index costs no extra read of the archive
+            index.append(get_tar_entry(member))
+
+        if member_filter is not None and not member_filter.matches(member.name):
+            # Directories are created as needed for the members that are picked
+            continue
+
+        if member.isfile():
+            # Reading a tar member raises an error if the archive is cut off before the member's end
+            target_path = get_member_path(extract_dir, member.name)
+            md5, written = copy_member(tar.extractfile(member), target_path, size=member.size)
+
+            if written:
+                # Keep the time the member was last modified (like `TarFile.extract`)
+                os.utime(target_path, (member.mtime, member.mtime))
+
+            entries.append(ManifestEntry(member.name, member.size, md5, written))
+
+        elif member.name != '.':
+            # Directories and links have no content to check (links may not point outside of the extract directory
+            # either, where Python can check them)
+            get_member_path(extract_dir, member.name)
+            tar.extract(member, extract_dir, **TAR_EXTRACT_OPTIONS)
+
+    return entries
+
+
+def process_zip(zf: ZipFile, extract_dir: Union[bytes, str], infos: List[ZipInfo] = None,
+                member_filter: MemberFilter = None, index: List[IndexEntry] = None) -> List[ManifestEntry]:
+    """Verify (CRC), extract, and hash every member of a zip archive, reading each member only once
+
+    :param zf: The opened zip archive
+    :param extract_dir: The directory to extract the members to
+    :param infos: The members to process (None for every member)
+    :param member_filter: Picks which members to extract (None for every member). Members that are not picked are never
+    read.
+    :param index: Where each file of the members processed is inside of the archive gets added to this list (see
+    `MemberIndex`), picked or not (None to not keep track)
+    :return: What was found out about each file extracted
+    """
+    entries: List[ManifestEntry] = list()
+
+    for info in (zf.infolist() if infos is None else infos):
+        if index is not None and not info.filename.endswith('/'):
+            # Only the member's local header is read for this (right next to the data that is read after it)
+            index.append(get_zip_entry(zf.fp, info))
+
+        if member_filter is not None and not member_filter.matches(info.filename):
+            continue
+
+        target_path = get_member_path(extract_dir, info.filename)
+
+        if info.filename.endswith('/'):
+            os.makedirs(target_path, exist_ok=True)
+            continue
+
+        # Reading a zip member to its end raises an error if its CRC does not match
+        with zf.open(info) as source:
+            md5, written = copy_member(source, target_path, size=info.file_size)
+
+        entries.append(ManifestEntry(info.filename, info.file_size, md5, written))
+
+    return entries
+
+
+def _process_zip_share(archive_file_path: Union[bytes, str], extract_dir: Union[bytes, str],
+                       names: List[str]) -> Tuple[List[ManifestEntry], List[IndexEntry]]:
+    """Verify (CRC), extract, and hash a share of the members of a zip archive (runs in a worker process, with its own
+    handle to the archive)
+
+    :param archive_file_path: The path to the zip archive
+    :param extract_dir: The directory to extract the members to
+    :param names: The names of the members to process
+    :return: What was found out about each of the members, and where each of them is inside of the archive
+    """
+    index: List[IndexEntry] = list()
+
+    with zipfile.ZipFile(archive_file_path) as zf:
+        entries = process_zip(zf, extract_dir, infos=[zf.getinfo(name) for name in names], index=index)
+
+    return entries, index
+
+
+def process_zip_parallel(archive_file_path: Union[bytes, str], extract_dir: Union[bytes, str], workers: int,
+                         member_filter: MemberFilter = None, index: List[IndexEntry] = None) -> List[ManifestEntry]:
+    """Verify (CRC), extract, and hash every member of a zip archive using several processes. Zip members can be read
+    independently, so the central directory (list of members) is split into shares that are each handled by a worker
+    process with its own handle to the archive.
+
+    :param archive_file_path: The path to the zip archive
+    :param extract_dir: The directory to extract the members to
+    :param workers: The number of processes to use
+    :param member_filter: Picks which members to extract (None for every member)
+    :param index: Where each file of the archive is inside of it gets added to this list (see `MemberIndex`), picked
+    or not (None to not keep track)
+    :return: What was found out about each file extracted (in the order of the archive)
+    """
+    with zipfile.ZipFile(archive_file_path) as zf:
+        all_infos = zf.infolist()
+        infos = [info for info in all_infos if member_filter is None or member_filter.matches(info.filename)]
+
+        if index is not None and len(infos) < len(all_infos):
+            # The workers find where the members they read are, only the members that are not picked are left
+            picked = set(info.filename for info in infos)
+            index.extend(get_zip_entry(zf.fp, info) for info in all_infos
+                         if info.filename not in picked and not info.filename.endswith('/'))
+
+    if len(infos) == 0:
+        return list()
+
+    # Deal out the members from largest to smallest so every share has about the same number of bytes, using a few
+    # shares per worker so a worker that finishes early can take another one
+    share_count = min(len(infos), workers * 4)
+    shares: List[List[str]] = [list() for _ in range(share_count)]
+
+    for i, info in enumerate(sorted(infos, key=lambda zip_info: zip_info.compress_size, reverse=True)):
+        shares[i % share_count].append(info.filename)
+
+    # Start the processes fresh instead of forking, since this runs on a thread of the downloader while other threads
+    # may be holding locks (e.g. of the connection pool or the progress bar) that a forked process would never see
+    # released
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = [executor.submit(_process_zip_share, archive_file_path, extract_dir, share) for share in shares]
+        results = [future.result() for future in futures]
+
+    entries = {entry.name: entry for share_entries, share_index in results for entry in share_entries}
+
+    if index is not None:
+        index.extend(entry for share_entries, share_index in results for entry in share_index)
+
+    return [entries[info.filename] for info in infos if info.filename in entries]
+
+
+def write_manifest(manifest_path: Union[bytes, str], entries: List[ManifestEntry]) -> None:
+    """Save what was found out about each member of an archive to a CSV file (name, size, and MD5 hash)
+
+    :param manifest_path: The path to save the manifest to
+    :param entries: What was found out about each member
+    """
+    with open(manifest_path + '.tmp', 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(s.MANIFEST_FIELDS)
+
+        for entry in entries:
+            writer.writerow((entry.name, entry.size, entry.md5))
+
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+
+def get_manifest_path(archive_file_path: Union[bytes, str]) -> Union[bytes, str]:
+    """Get the path of the manifest of an archive (stored next to the archive)
+
+    :param archive_file_path: The path to the archive file
+    :return: The path to the archive's manifest
+    """
+    return archive_file_path + s.MANIFEST_SUFFIX
+
+
+def process_archive(archive_file_path: Union[bytes, str], extract_dir: Union[bytes, str] = None,
+                    log=print, workers: int = s.DEFAULT_EXTRACT_WORKERS, member_filter: MemberFilter = None) -> bool:
+    """Verify, extract, and hash every member of an archive in a single read of the archive, then save a manifest of
+    the members and an index of where they are next to the archive (see `get_manifest_path` and `MemberIndex`).
+    Replaces calling `Archive.verify_integrity` and then `Archive.extract_archive`, which read the archive two more
+    times.
+
+    :param archive_file_path: The path to the archive file (including the file extension)
+    :param extract_dir: The directory to extract the members to (defaults to a directory of the same name as the
+    archive, but without the file extension)
+    :param log: The function used to print messages
+    :param workers: The number of processes to extract zip archives with (tar archives can only be read in order, so
+    they always use one)
+    :param member_filter: Picks which members to extract (None for every member). Only the members picked are checked
+    and listed in the manifest.
+    :return: True if every member was read without an error, False if the archive seems to be corrupted
+    :raises UnsafeMemberException: If a member would be extracted outside of the extract directory (the archive is not
+    corrupted, so it is not handled like it is)
+    """
+
+    if extract_dir is None:
+        extract_dir = os.path.splitext(archive_file_path)[0]
+
+    if not os.path.exists(extract_dir):
+        os.makedirs(extract_dir)
+
+    log('Checking and extracting files...')
+
+    # Where each file is inside of the archive, found while the archive is read
+    index: List[IndexEntry] = list()
+
+    try:
+        if tarfile.is_tarfile(archive_file_path):
+            # Read the tar archive as a stream, since seeking back for the list of members would read it twice
+            with tarfile.open(archive_file_path, mode='r|') as tar:
+                entries = process_tar(tar, extract_dir, member_filter=member_filter, index=index)
+
+        elif zipfile.is_zipfile(archive_file_path):
+            with zipfile.ZipFile(archive_file_path) as zf:
+                member_count = len(zf.infolist())
+
+            # Starting processes only pays off for archives with many members
+            if workers > 1 and member_count >= s.PARALLEL_EXTRACT_MIN_MEMBERS:
+                entries = process_zip_parallel(archive_file_path, extract_dir, workers=workers,
+                                               member_filter=member_filter, index=index)
+            else:
+                with zipfile.ZipFile(archive_file_path) as zf:
+                    entries = process_zip(zf, extract_dir, member_filter=member_filter, index=index)
+
+        else:  # pragma: no cover
+            raise IOError('File is not of a supported archive type!')
+
+    except (IOError, EOFError, tarfile.TarError, zipfile.BadZipFile) as e:
+        h.print_error('There was an error in reading ' + archive_file_path + ' file. It might be corrupted!')
+        h.print_error('It is recommended to delete the archive and restart the download.')
+        h.print_error('Error: ' + str(e))
+
+        return False
+
+    write_manifest(get_manifest_path(archive_file_path), entries)
+    MemberIndex(archive_file_path, index).save()
+
+    log('Extracted ' + str(sum(entry.written for entry in entries)) + ' of ' + str(len(entries)) +
+        ' files (the rest already existed)')
+
+    return True
@@ -0,0 +1,216 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Tuple
+from zipfile import ZipFile, ZipInfo
+
+import requests
+
+from psicollect.collector.member_index import IndexEntry, ZIP_LOCAL_HEADER, ZIP_LOCAL_HEADER_SIGNATURE, decode_member
+from psicollect.collector.pipeline import get_member_path
+from psicollect.collector.response_getter import get_full_content_length
+from psicollect.collector.session import get_session
+from psicollect.common import s
+
+
+class HttpRangeFile(io.RawIOBase):
+    """A read-only file backed by HTTP range requests, so that `zipfile` can read the central directory of an archive
+    on a website. Every range fetched is kept, so reading it again costs no more requests."""
+
+    remote: 'RemoteZip'  # The remote archive to fetch ranges of
+    position: int  # The current position in the file in bytes
+
+    def __init__(self, remote: 'RemoteZip'):
+        """Create a file for a remote archive, starting at the beginning
+
+        :param remote: The remote archive to fetch ranges of
+        """
+        io.RawIOBase.__init__(self)
+
+        self.remote = remote
+        self.position = 0
+        self._spans: List[Tuple[int, bytes]] = list()  # The ranges fetched so far (start, content)
+
+    def prefetch(self, start: int, end: int) -> None:
+        """Fetch a range of the file ahead of time, so reads within it need no more requests
+
+        :param start: The position of the first byte to fetch
+        :param end: The position after the last byte to fetch
+        """
+        self._spans.append((start, self.remote.fetch(start, end)))
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.remote.size
+
+        self.position = max(0, offset)
+        return self.position
+
+    def read(self, size: int = -1) -> bytes:
+        end = self.remote.size if size is None or size < 0 else min(self.remote.size, self.position + size)
+
+        if end <= self.position:
+            return b''
+
+        for span_start, content in self._spans:
+            if span_start <= self.position and end <= span_start + len(content):
+                data = content[self.position - span_start:end - span_start]
+                break
+        else:
+            data = self.remote.fetch(self.position, end)
+            self._spans.append((self.position, data))
+
+        self.position += len(data)
+        return data
+
+
+class RemoteZip:
+    """A zip archive on a website whose members can be listed and read without downloading the archive. Only the end
+    of the archive (its central directory) is fetched when it is opened, and each member read costs one range request
+    for just that member's bytes."""
+
+    url: str  # The url of the archive
+    size: int  # The size of the archive in bytes
+    infos: Dict[str, ZipInfo]  # The members of the archive (from the central directory) by their path
+
+    bytes_fetched: int  # The number of bytes fetched from the website so far
+    request_count: int  # The number of range requests sent so far
+
+    def __init__(self, url: str, size: int = None):
+        """Open a remote zip archive by fetching its central directory
+
+        :param url: The url of the archive (the website must answer range requests)
+        :param size: The size of the archive in bytes (asked for if not given)
+        """
+        self.url = url
+        self.size = get_full_content_length(url) if size is None else size
+        self.bytes_fetched = 0
+        self.request_count = 0
+        self._lock = threading.Lock()
+
+        if self.size == 0:
+            raise IOError('Could not get the size of ' + url)
+
+        fp = HttpRangeFile(self)
+
+        # The end of central directory record is at the very end, and the central directory usually right before it
+        fp.prefetch(max(0, self.size - s.REMOTE_ZIP_TAIL_SIZE), self.size)
+
+        with ZipFile(fp) as zf:
+            self.infos = {info.filename: info for info in zf.infolist()}
+
+    def fetch(self, start: int, end: int) -> bytes:
+        """Fetch a range of bytes of the archive
+
+        :param start: The position of the first byte to fetch
+        :param end: The position after the last byte to fetch
+        :return: The bytes of the range
+        """
+        response = get_session().get(self.url, headers={'Range': 'bytes=' + str(start) + '-' + str(end - 1)})
+
+        try:
+            if response.status_code != requests.codes.partial_content and not (start == 0 and end >= self.size):
+                raise IOError('The website does not support range requests for ' + self.url + ' (status ' +
+                              str(response.status_code) + ')')
+
+            data = response.content
+        finally:
+            response.close()
+
+        if len(data) != end - start:
+            raise IOError('Expected ' + str(end - start) + ' bytes of ' + self.url + ', but got ' + str(len(data)))
+
+        with self._lock:
+            self.bytes_fetched += len(data)
+            self.request_count += 1
+
+        return data
+
+    def infolist(self) -> List[ZipInfo]:
+        """Get the members of the archive (in the order of the central directory)"""
+        return list(self.infos.values())
+
+    def read(self, name: str) -> bytes:
+        """Read a single member of the archive with one range request (safe to call from many threads)
+
+        :param name: The path of the member inside of the archive
+        :return: The member's content
+        """
+        info = self.infos[name]
+
+        # The local header's name and extra field are usually the same length as in the central directory, so fetch
+        # the header and the data together (with some room for a longer extra field)
+        header_size = ZIP_LOCAL_HEADER.size + len(info.filename.encode('utf-8')) + len(info.extra)
+        end = min(self.size, info.header_offset + header_size + s.REMOTE_ZIP_HEADER_SLACK + info.compress_size)
+        data = self.fetch(info.header_offset, end)
+
+        header = ZIP_LOCAL_HEADER.unpack(data[:ZIP_LOCAL_HEADER.size])
+
+        if header[0] != ZIP_LOCAL_HEADER_SIGNATURE:
+            raise IOError('Bad local header for member ' + name + ' of ' + self.url)
+
+        data_start = ZIP_LOCAL_HEADER.size + header[9] + header[10]
+
+        if data_start + info.compress_size > len(data):  # pragma: no cover
+            # The local extra field was longer than expected, so fetch the rest of the data
+            data += self.fetch(info.header_offset + len(data), info.header_offset + data_start + info.compress_size)
+
+        entry = IndexEntry(name, info.header_offset + data_start, info.file_size, info.compress_size,
+                           info.compress_type, info.CRC)
+
+        return decode_member(entry, data[data_start:data_start + info.compress_size], archive_label=self.url)
+
+    def read_members(self, names: Iterable[str], workers: int = s.DEFAULT_REMOTE_WORKERS) \
+            -> Iterator[Tuple[str, bytes]]:
+        """Read several members of the archive, fetching a few at the same time
+
+        :param names: The paths of the members inside of the archive
+        :param workers: The number of members to fetch at the same time
+        :return: The path and content of each member (in the order given)
+        """
+        names = list(names)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            yield from zip(names, executor.map(self.read, names))
+
+    def extract_members(self, names: Iterable[str], extract_dir: str,
+                        workers: int = s.DEFAULT_REMOTE_WORKERS) -> List[str]:
+        """Download single members of the archive, several at a time, to where they would be if the whole archive was
+        downloaded and extracted. Members that already exist with the right size are not fetched again.
+
+        :param names: The paths of the members inside of the archive
+        :param extract_dir: The directory to write the members to
+        :param workers: The number of members to fetch at the same time
+        :return: The paths of the members written
+        :raises UnsafeMemberException: If a member would be written outside of the extract directory
+        """
+        # The names come from the website, so members that would be written outside of the extract directory are
+        # rejected before anything is fetched
+        target_paths = {name: get_member_path(extract_dir, name) for name in names}
+
+        names = [name for name, target_path in target_paths.items()
+                 if not (os.path.isfile(target_path) and os.path.getsize(target_path) == self.infos[name].file_size)]
+
+        for name, content in self.read_members(names, workers=workers):
+            target_path = target_paths[name]
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+
+            # Write to a temporary file first, so a member that was cut off is never mistaken for a complete one
+            with open(target_path + s.PART_SUFFIX, 'wb') as f:
+                f.write(content)
+
+            os.replace(target_path + s.PART_SUFFIX, target_path)
+
+        return names
@@ -1,20 +1,32 @@
+from typing import Dict, Iterable, Iterator, Pattern, Tuple
+
 import requests
 from requests import Response
-from requests_html import HTMLSession
 
+from psicollect.collector.http_cache import HttpCache, get_cache, is_success
+from psicollect.collector.retry import RetryPolicy
+from psicollect.collector.session import get_session
+from psicollect.common import h, s
+
+# Asking for the size of an archive is retried a few times quickly (the download itself is retried for much longer)
+PROBE_RETRY_POLICY = RetryPolicy(attempts=s.PROBE_ATTEMPTS, base_delay=s.PROBE_RETRY_DELAY,
+                                 max_delay=4 * s.PROBE_RETRY_DELAY)
 
-def get_http_response(url: str) -> Response:
+
+def get_http_response(url: str, render: bool = False) -> Response:
     """Attempts to connect to the website via an HTTP request
 
     :param url: The full url to connect to
+    :param render: Whether (True) or not (False) to run the page's JavaScript in a headless browser (slow, and downloads
+    Chromium on first use). Only needed for pages known to build their content with JavaScript.
     :returns: The response received from the url
     """
 
     try:
-        session = HTMLSession()
-        r = session.get(url)
-        r.html.render()
+        r = get_session().get(url)
         if r.status_code == requests.codes.ok:
+            if render:
+                r.html.render()
             return r
         else:
             raise ConnectionError('Connection refused! Returned code: ' + str(r.status_code))
@@ -23,23 +35,184 @@ def get_http_response(url: str) -> Response:
         raise ConnectionError('Error occurred while trying to connect to %s (%s)' % (url, e))
 
 
-def get_full_content_length(url: str) -> int:
+def extract_links(chunks: Iterable[str], pattern: Pattern, overlap: int = s.LINK_MAX_LENGTH) -> Iterator[Tuple]:
+    """Search pieces of a page for a pattern as they arrive, without waiting for (or holding onto) the whole page. The
+    last `overlap` characters of each piece are kept until the next piece arrives, so matches split between two pieces
+    are still found.
+
+    :param chunks: The pieces of the page's text, in order
+    :param pattern: The compiled regular expression to search for (with groups, like `re.findall`)
+    :param overlap: The longest a match can be in characters
+    :returns: The groups of each match, in order
+    """
+    buffer: str = ''
+
+    for chunk in chunks:
+        buffer += chunk
+
+        # Matches starting before this point are complete, any later ones may continue in the next piece
+        safe_end = len(buffer) - overlap
+        last_end = 0
+
+        for match in pattern.finditer(buffer):
+            if match.start() >= safe_end:
+                break
+
+            yield match.groups()
+            last_end = match.end()
+
+        buffer = buffer[max(last_end, safe_end, 0):]
+
+    for match in pattern.finditer(buffer):
+        yield match.groups()
+
+
+def _get_cached_page(cache: HttpCache or None, url: str) -> Tuple[Dict or None, str or None]:
+    """Get the cached entry and text of a page
+
+    :param cache: The HTTP cache (None if caching is turned off)
+    :param url: The full url of the page
+    :returns: The entry and the text of the page, or (None, None) if the page's text is not cached
+    """
+    if cache is None:
+        return None, None
+
+    entry = cache.get(url)
+    body = cache.get_body(url) if entry is not None and entry['has_body'] else None
+
+    return (entry, body) if body is not None else (None, None)
+
+
+def get_http_text(url: str) -> str:
+    """Get the text of a page over plain HTTP (no rendering). If the HTTP cache is turned on, a fresh cached copy is
+    used without connecting, a stale one is revalidated (the page is only sent again if it changed), and a stale one is
+    still used if the website cannot be reached.
+
+    :param url: The full url of the page
+    :returns: The text of the page
+    """
+    cache = get_cache()
+    entry, body = _get_cached_page(cache, url)
+
+    if body is not None and cache.is_fresh(entry):
+        return body
 
     try:
-        # Ask the server for head
-        head = requests.head(url, stream=True, allow_redirects=True)
+        r = get_session().get(url, headers=HttpCache.get_validators(entry))
+
+    except requests.exceptions.RequestException as e:
+        if body is not None:
+            # The website cannot be reached, so make do with the old copy
+            return body
+
+        raise ConnectionError('Error occurred while trying to connect to %s (%s)' % (url, e))
 
-        if head.headers.get('Content-Length') is None:  # pragma: no cover
-            raise ConnectionError('Content-Length is 0! The website returned back response code ' + str(
-                head.status_code) + ' for ' + url)
+    if r.status_code == requests.codes.not_modified and body is not None:
+        cache.revalidate(url, entry)
+        return body
 
-        # Ask the server how big its' package is
-        full_length = int(head.headers.get('Content-Length'))
+    if r.status_code != requests.codes.ok:
+        raise ConnectionError('Connection refused! Returned code: ' + str(r.status_code))
 
-        # Stop talking to the server about this
-        head.close()
+    if cache is not None:
+        cache.put(url, status=r.status_code, headers=r.headers, body=r.text)
 
-        return full_length
+    return r.text
 
-    except (OSError, ConnectionError):  # pragma: no cover
+
+def get_http_links(url: str, pattern: Pattern, chunk_size: int = 64 * 1024) -> Iterator[Tuple]:
+    """Stream a page over plain HTTP (no rendering) and search it for a pattern as it downloads. The HTTP cache (if
+    turned on) is used the same way as in `get_http_text`.
+
+    :param url: The full url of the page
+    :param pattern: The compiled regular expression to search for (with groups, like `re.findall`)
+    :param chunk_size: The number of bytes to read at a time
+    :returns: The groups of each match, in order
+    """
+    cache = get_cache()
+    entry, body = _get_cached_page(cache, url)
+
+    if body is not None and cache.is_fresh(entry):
+        yield from extract_links([body], pattern)
+        return
+
+    found: int = 0  # The number of matches already given back (the old copy can only be used if there are none)
+
+    try:
+        with get_session().get(url, stream=True, headers=HttpCache.get_validators(entry)) as r:
+
+            if r.status_code == requests.codes.not_modified and body is not None:
+                cache.revalidate(url, entry)
+                yield from extract_links([body], pattern)
+                return
+
+            if r.status_code != requests.codes.ok:
+                raise ConnectionError('Connection refused! Returned code: ' + str(r.status_code))
+
+            chunks = list()
+
+            def read_chunks() -> Iterator[str]:
+                for chunk in r.iter_content(chunk_size=chunk_size, decode_unicode=True):
+                    # Keep the whole page only if it is going to be cached
+                    if cache is not None:
+                        chunks.append(chunk)
+                    yield chunk
+
+            for links in extract_links(read_chunks(), pattern):
+                found += 1
+                yield links
+
+            if cache is not None:
+                cache.put(url, status=r.status_code, headers=r.headers, body=''.join(chunks))
+
+    except requests.exceptions.RequestException as e:
+        if body is not None and found == 0:
+            # The website cannot be reached, so make do with the old copy
+            yield from extract_links([body], pattern)
+            return
+
+        raise ConnectionError('Error occurred while trying to connect to %s (%s)' % (url, e))
+
+
+def get_full_content_length(url: str, timeout: float = None, retry_policy: RetryPolicy = None) -> int:
+    """Ask the website for the size of a file. If the HTTP cache is turned on, a fresh cached size is used without
+    connecting, a stale one is revalidated, and a stale one is still used if the website cannot be reached.
+
+    :param url: The full url of the file
+    :param timeout: The amount of seconds to wait for the website to answer (None to use the session's default)
+    :param retry_policy: How many times to ask and how long to wait in between (defaults to `PROBE_RETRY_POLICY`)
+    :returns: The size of the file in bytes (0 if the size could not be found)
+    """
+    cache = get_cache()
+    entry = cache.get(url) if cache is not None else None
+
+    if cache is not None and cache.is_fresh(entry):
+        return entry['content_length'] or 0
+
+    retry_policy = PROBE_RETRY_POLICY if retry_policy is None else retry_policy
+
+    try:
+        # Ask the server for head (not streamed, so the connection goes right back into the pool to be reused)
+        head = retry_policy.call(get_session().head, url, allow_redirects=True,
+                                 headers=HttpCache.get_validators(entry), timeout=timeout)
+
+    except OSError as e:
+        # The website cannot be reached, so make do with the old size (if there is one)
+        h.print_error('Could not get the size of ' + url + ' (' + str(e) + ')')
+        return (entry['content_length'] or 0) if entry is not None else 0
+
+    if head.status_code == requests.codes.not_modified and entry is not None:
+        cache.revalidate(url, entry)
+        return entry['content_length'] or 0
+
+    if cache is not None:
+        cache.put(url, status=head.status_code, headers=head.headers)
+
+    # The length of an error page (e.g. 404 or 500) is not the size of the file
+    if not is_success(head.status_code):
         return 0
+
+    # Ask the server how big its' package is (0 if the website did not say)
+    full_length = head.headers.get('Content-Length')
+
+    return int(full_length) if full_length is not None else 0
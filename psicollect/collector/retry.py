@@ -0,0 +1,187 @@
+import random
+import threading
+import time
+from typing import Callable, Dict, Tuple, Type
+from urllib.parse import urlparse
+
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from urllib3.util.retry import Retry
+
+from psicollect.common import s
+
+
+class CircuitOpenError(RequestsConnectionError):
+    """Raised instead of sending a request to a host that failed too many times in a row (see `CircuitBreaker`)"""
+
+    host: str  # The host that requests are not sent to
+    wait: float  # The amount of seconds until requests are sent to the host again
+
+    def __init__(self, host: str, wait: float):
+        RequestsConnectionError.__init__(self, 'Too many requests to ' + host + ' failed in a row, not trying again '
+                                               'for ' + str(round(wait)) + ' seconds')
+        self.host = host
+        self.wait = wait
+
+
+class CircuitBreaker:
+    """Stops sending requests to a host for a while once enough requests to it failed in a row (could not connect,
+    timed out, or got a server error), so that a host that is down is not hammered and every request to it fails right
+    away instead of each one waiting out its timeouts. Once the cool down is over requests are sent again, and the
+    first one that succeeds closes the circuit (the first one that fails opens it again)."""
+
+    threshold: int  # The number of failures in a row that opens the circuit of a host
+    cooldown: float  # The amount of seconds that the circuit of a host stays open
+
+    def __init__(self, threshold: int = s.CIRCUIT_BREAKER_FAILURES, cooldown: float = s.CIRCUIT_BREAKER_COOLDOWN):
+        """Create a circuit breaker with every circuit closed
+
+        :param threshold: The number of failures in a row that opens the circuit of a host
+        :param cooldown: The amount of seconds that the circuit of a host stays open
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+
+        self._failures: Dict[str, int] = dict()  # The number of failures in a row by host
+        self._opened: Dict[str, float] = dict()  # When the circuit of each host was last opened (`time.monotonic`)
+        self._lock = threading.Lock()
+
+    def get_wait(self, host: str) -> float:
+        """Get the amount of seconds until requests are sent to a host again (0 if its circuit is closed)"""
+        with self._lock:
+            opened = self._opened.get(host)
+
+        if opened is None:
+            return 0
+
+        return max(0.0, opened + self.cooldown - time.monotonic())
+
+    def check(self, host: str) -> None:
+        """Make sure that requests can be sent to a host
+
+        :param host: The host (e.g. 'storms.ngs.noaa.gov')
+        :raises CircuitOpenError: If the circuit of the host is open
+        """
+        wait = self.get_wait(host)
+
+        if wait > 0:
+            raise CircuitOpenError(host=host, wait=wait)
+
+    def record_success(self, host: str) -> None:
+        """Close the circuit of a host after a request to it succeeded"""
+        with self._lock:
+            self._failures.pop(host, None)
+            self._opened.pop(host, None)
+
+    def record_failure(self, host: str) -> None:
+        """Count a failed request to a host, opening its circuit if too many failed in a row"""
+        with self._lock:
+            self._failures[host] = self._failures.get(host, 0) + 1
+
+            if self._failures[host] >= self.threshold:
+                self._opened[host] = time.monotonic()
+
+
+class RetryPolicy:
+    """How many times to try something that can fail because of the network (e.g. downloading an archive), and how long
+    to wait in between: the wait doubles after every failed attempt (up to a limit), and a random part of it is taken
+    off (jitter) so that many downloads that failed at the same time do not all try again at the same time."""
+
+    attempts: int  # The most times to try before giving up
+    base_delay: float  # The amount of seconds to wait after the first failed attempt
+    max_delay: float  # The most seconds to wait between attempts
+    jitter: float  # The largest part of each wait (0 to 1) that is randomly taken off
+
+    def __init__(self, attempts: int = s.DEFAULT_DOWNLOAD_ATTEMPTS, base_delay: float = s.DOWNLOAD_RETRY_DELAY,
+                 max_delay: float = s.DOWNLOAD_RETRY_MAX_DELAY, jitter: float = s.RETRY_JITTER):
+        """Create a retry policy
+
+        :param attempts: The most times to try before giving up
+        :param base_delay: The amount of seconds to wait after the first failed attempt
+        :param max_delay: The most seconds to wait between attempts
+        :param jitter: The largest part of each wait (0 to 1) that is randomly taken off
+        """
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = min(1.0, max(0.0, jitter))
+
+    def get_delay(self, attempt: int) -> float:
+        """Get the amount of seconds to wait after an attempt failed
+
+        :param attempt: The number of the attempt that failed (0 for the first)
+        :return: The amount of seconds to wait before the next attempt
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+
+        return delay * (1 - self.jitter * random.random())
+
+    def call(self, func: Callable, *args, retry_on: Tuple[Type[BaseException], ...] = (OSError,), **kwargs):
+        """Call a function until it does not raise an error, waiting longer after each failed attempt. Requests to a
+        host whose circuit is open (see `CircuitBreaker`) are not tried again.
+
+        :param func: The function to call
+        :param retry_on: The errors that are worth trying again for
+        :return: What the function returned
+        :raises: The error of the last attempt if every attempt failed
+        """
+        for attempt in range(self.attempts):
+            try:
+                return func(*args, **kwargs)
+
+            except CircuitOpenError:
+                raise
+
+            except retry_on:
+                if attempt + 1 >= self.attempts:
+                    raise
+
+                time.sleep(self.get_delay(attempt))
+
+
+class JitteredRetry(Retry):
+    """The retries of the HTTP session's connection pools, waiting like `RetryPolicy` does (with jitter) between
+    attempts instead of all retrying failed connections at the same time"""
+
+    jitter: float = s.RETRY_JITTER  # The largest part of each wait (0 to 1) that is randomly taken off
+
+    def get_backoff_time(self) -> float:
+        return Retry.get_backoff_time(self) * (1 - self.jitter * random.random())
+
+
+def get_host(url: str) -> str:
+    """Get the host of a url (e.g. 'storms.ngs.noaa.gov'), which circuits are kept for"""
+    return urlparse(url).netloc
+
+
+_retry_policy = RetryPolicy()  # The retry policy of archive downloads shared by the whole process
+_circuit_breaker = CircuitBreaker()  # The circuits of every host shared by the whole process
+
+
+def get_retry_policy() -> RetryPolicy:
+    """Get the retry policy of archive downloads shared by the whole process (see `configure_retry`)"""
+    return _retry_policy
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """Get the circuit breaker shared by every request of the process"""
+    return _circuit_breaker
+
+
+def configure_retry(attempts: int = None, base_delay: float = None, max_delay: float = None,
+                    jitter: float = None) -> RetryPolicy:
+    """Change the retry policy of archive downloads shared by the whole process. Settings left as None are not changed.
+
+    :param attempts: The most times to try downloading an archive before giving up
+    :param base_delay: The amount of seconds to wait after the first failed attempt
+    :param max_delay: The most seconds to wait between attempts
+    :param jitter: The largest part of each wait (0 to 1) that is randomly taken off
+    :return: The new retry policy
+    """
+    global _retry_policy
+
+    _retry_policy = RetryPolicy(attempts=_retry_policy.attempts if attempts is None else attempts,
+                                base_delay=_retry_policy.base_delay if base_delay is None else base_delay,
+                                max_delay=_retry_policy.max_delay if max_delay is None else max_delay,
+                                jitter=_retry_policy.jitter if jitter is None else jitter)
+
+    return _retry_policy
@@ -0,0 +1,250 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple, Union
+from urllib.parse import urlparse
+
+from requests.exceptions import RequestException
+from tqdm import tqdm
+
+from psicollect.collector.archive import Archive
+from psicollect.collector.pipeline import MemberFilter, UnsafeMemberException
+from psicollect.collector.locking import get_lock_info, is_locked_by_another_user
+from psicollect.collector.retry import RetryPolicy, get_circuit_breaker, get_host, get_retry_policy
+from psicollect.common import h, s
+
+
+def get_skip_reason(archive_file_path: Union[bytes, str], user: str, overwrite: bool = False) -> str or None:
+    """Check the lock files of an archive to see if another user has already downloaded it or is in the process of
+    downloading it, in which case the archive should be skipped.
+
+    :param archive_file_path: The path of the archive file including the file suffix (not including .part or .lock)
+    :param user: The user that wants to download the archive (locking mechanism)
+    :param overwrite: Whether or not the archive will be overwritten (ignores other users' locks)
+    :return: A message explaining why the archive should be skipped or None if it should be downloaded
+    """
+    archive_file_name = os.path.split(archive_file_path)[1]
+
+    if overwrite:
+        return None
+
+    if is_locked_by_another_user(base_file=archive_file_path, this_user=user):
+        return 'Another user has fully downloaded ' + archive_file_name + '!  ... Skipping'
+
+    lock_user = get_lock_info(base_file=archive_file_path + s.PART_SUFFIX)['user']
+
+    if lock_user is not None and lock_user != user:
+        return 'Another user is in the process of downloading ' + archive_file_name + '!  ... Skipping'
+
+    return None
+
+
+class AggregateProgress:
+    """A single progress bar shared by every archive being downloaded at the same time. Each download reports the
+    bytes it receives here so that the user sees the combined throughput instead of one bar per archive."""
+
+    bar: tqdm  # The progress bar displayed in the console
+    lock: threading.Lock  # Keeps updates from multiple download threads from overlapping
+
+    # The number of bytes of each archive (by path) that are already accounted for, either received or discounted
+    accounted: Dict[str, int]
+
+    def __init__(self, total_size_byte: int):
+        """Create the progress bar with the total number of bytes that all scheduled archives add up to
+
+        :param total_size_byte: The sum of the sizes of all archives that may be downloaded
+        """
+        self.lock = threading.Lock()
+        self.accounted = dict()
+        self.bar = tqdm(total=total_size_byte, desc='Downloading archives', unit='B',
+                        unit_scale=True, unit_divisor=1024, miniters=1)
+
+    def update(self, byte_count: int, key: str = None) -> None:
+        """Add newly received bytes to the progress bar
+
+        :param byte_count: The number of bytes received since the last update
+        :param key: The archive (usually its path) that the bytes belong to
+        """
+        with self.lock:
+            self.accounted[key] = self.accounted.get(key, 0) + byte_count
+            self.bar.update(byte_count)
+
+    def resume(self, key: str, byte_count: int) -> None:
+        """Remove bytes that will not be transferred during this run (e.g. the archive was skipped or part of it was
+        already downloaded) so the progress and throughput only reflect what is actually being downloaded. Bytes of the
+        archive that were already received or discounted during this run (e.g. before a retry) are not removed again.
+
+        :param key: The archive (usually its path) that the bytes belong to
+        :param byte_count: The number of bytes of the archive that are already present locally
+        """
+        with self.lock:
+            extra = byte_count - self.accounted.get(key, 0)
+
+            if extra > 0:
+                self.accounted[key] = byte_count
+                self.bar.total = max(self.bar.total - extra, self.bar.n)
+                self.bar.refresh()
+
+    def write(self, message: str) -> None:
+        """Print a message above the progress bar without breaking it apart
+
+        :param message: The message to print
+        """
+        with self.lock:
+            self.bar.write(message)
+
+    def close(self) -> None:
+        """Stop displaying the progress bar"""
+        with self.lock:
+            self.bar.close()
+
+
+class DownloadScheduler:
+    """Downloads several archives at the same time using a pool of worker threads. The number of workers talking to
+    any single host is capped so that a host is not overloaded even if many archives come from it."""
+
+    user: str  # The user to download as (locking mechanism)
+    jobs: int  # The maximum number of archives to download at the same time
+    jobs_per_host: int  # The maximum number of archives to download from any single host at the same time
+    overwrite: bool  # Whether or not to overwrite existing archive files with the same name
+    retry_policy: RetryPolicy  # How many times to try each download and how long to wait in between
+    segments: int  # The number of byte ranges to split each archive into and download at the same time
+    stream_extract: bool  # Whether (True) or not (False) to extract tar archives while they download
+    extract_workers: int  # The number of processes to extract each zip archive with once it is downloaded
+    member_filter: MemberFilter or None  # Picks which members of each archive to extract (None for every member)
+
+    queue: List[Tuple[Archive, Union[bytes, str]]]  # The archives to download and the directory to save each to
+    failed: List[Archive]  # The archives that could not be downloaded in any of the attempts allowed
+
+    def __init__(self, user: str, jobs: int = s.DEFAULT_DOWNLOAD_JOBS,
+                 jobs_per_host: int = s.DEFAULT_DOWNLOAD_JOBS_PER_HOST,
+                 overwrite: bool = False, retry_policy: RetryPolicy = None,
+                 segments: int = s.DEFAULT_DOWNLOAD_SEGMENTS, stream_extract: bool = s.DEFAULT_STREAM_EXTRACT,
+                 extract_workers: int = s.DEFAULT_EXTRACT_WORKERS, member_filter: MemberFilter = None):
+        """Initializes the scheduler with an empty queue of archives
+
+        :param user: The user to download as (locking mechanism)
+        :param jobs: The maximum number of archives to download at the same time
+        :param jobs_per_host: The maximum number of archives to download from any single host at the same time
+        :param overwrite: Whether or not to overwrite existing archive files with the same name
+        :param retry_policy: How many times to try each download and how long to wait in between (defaults to the
+        policy shared by the whole process, see `retry.configure_retry`)
+        :param segments: The number of byte ranges to split each archive into and download at the same time (each
+        archive still only counts once towards `jobs` and `jobs_per_host`)
+        :param stream_extract: Whether (True) or not (False) to extract tar archives while they download
+        :param extract_workers: The number of processes to extract each zip archive with once it is downloaded
+        :param member_filter: Picks which members of each archive to extract (None for every member)
+        """
+        self.user = user
+        self.jobs = max(1, jobs)
+        self.jobs_per_host = max(1, jobs_per_host)
+        self.overwrite = overwrite
+        self.retry_policy = get_retry_policy() if retry_policy is None else retry_policy
+        self.segments = max(1, segments)
+        self.stream_extract = stream_extract
+        self.extract_workers = max(1, extract_workers)
+        self.member_filter = member_filter
+
+        self.queue = list()
+        self.failed = list()
+        self._host_limits: Dict[str, threading.BoundedSemaphore] = dict()
+        self._host_limits_lock = threading.Lock()
+
+    def add(self, archive: Archive, output_dir: Union[bytes, str]) -> None:
+        """Add an archive to the queue of archives to download
+
+        :param archive: The archive to download
+        :param output_dir: The location to save the downloaded archive file to (a path on the local machine)
+        """
+        self.queue.append((archive, output_dir))
+
+    def run(self) -> None:
+        """Download every archive in the queue, blocking until all of them are either downloaded or skipped"""
+
+        if len(self.queue) == 0:
+            return
+
+        progress = AggregateProgress(total_size_byte=sum(archive.get_file_size_origin() for archive, _ in self.queue))
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+                futures = [executor.submit(self._download, archive, output_dir, progress)
+                           for archive, output_dir in self.queue]
+
+                for future in futures:
+                    # Surface any unexpected errors from the worker threads
+                    future.result()
+        finally:
+            progress.close()
+
+    def _get_host_limit(self, url: str) -> threading.BoundedSemaphore:
+        """Get the semaphore that limits how many downloads may run at the same time from the host of the url
+
+        :param url: The url of the archive to download
+        :return: The semaphore shared by all downloads from the same host
+        """
+        host = urlparse(url).netloc
+
+        with self._host_limits_lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.jobs_per_host)
+
+            return self._host_limits[host]
+
+    def _download(self, archive: Archive, output_dir: Union[bytes, str], progress: AggregateProgress) -> None:
+        """Repeatedly try to download the archive until it completes successfully, is skipped because another
+        user is downloading (or has downloaded) it, or runs out of attempts (see `retry_policy`)
+
+        :param archive: The archive to download
+        :param output_dir: The location to save the downloaded archive file to
+        :param progress: The shared progress bar to report received bytes to
+        """
+        archive_file_path = os.path.join(output_dir, str(archive.name) + archive.get_ext())
+
+        for attempt in range(self.retry_policy.attempts):
+            try:
+                skip_reason = get_skip_reason(archive_file_path=archive_file_path, user=self.user,
+                                              overwrite=self.overwrite)
+
+                if skip_reason is not None:
+                    progress.write(skip_reason)
+                    progress.resume(archive_file_path, archive.get_file_size_origin())
+
+                else:
+                    with self._get_host_limit(archive.url):
+                        archive.download_url(output_dir=output_dir, user=self.user, overwrite=self.overwrite,
+                                             progress=progress, segments=self.segments,
+                                             stream_extract=self.stream_extract,
+                                             extract_workers=self.extract_workers,
+                                             member_filter=self.member_filter)
+
+                return
+
+            except UnsafeMemberException as e:
+                # The archive is not corrupted, so downloading it again would run into the same member
+                h.print_error('Not extracting ' + archive.name + archive.get_ext() + ': ' + str(e))
+
+                with self._host_limits_lock:
+                    self.failed.append(archive)
+
+                return
+
+            except ConnectionError as e:
+                h.print_error('The download ran into a connection error: ' + str(e))
+            except RequestException as e:
+                h.print_error('Something went wrong with reading the data transmitted. Error: ' + str(e))
+
+            if attempt + 1 < self.retry_policy.attempts:
+                # Wait longer after every failed attempt, and at least until the host is tried again
+                delay = max(self.retry_policy.get_delay(attempt), get_circuit_breaker().get_wait(get_host(archive.url)))
+
+                h.print_error('Will retry download of ' + archive.name + archive.get_ext() + ' in ' +
+                              str(round(delay)) + ' seconds...')
+                time.sleep(delay)
+
+        h.print_error('Giving up on ' + archive.name + archive.get_ext() + ' after ' +
+                      str(self.retry_policy.attempts) + ' attempts')
+
+        with self._host_limits_lock:
+            self.failed.append(archive)
@@ -0,0 +1,296 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from math import ceil
+from typing import List, Union
+
+import requests
+from tqdm import tqdm
+
+from psicollect.collector.io_engine import LockHeartbeat, preallocate, write_response
+from psicollect.collector.session import get_session
+from psicollect.common import s
+
+
+class Segment:
+    """A range of bytes of a file that is downloaded on its own"""
+
+    start: int  # The position of the first byte of the segment in the file
+    end: int  # The position of the last byte of the segment in the file (inclusive, like the 'Range' header)
+    done: int  # The number of bytes (from the start) of the segment that are already downloaded
+
+    def __init__(self, start: int, end: int, done: int = 0):
+        self.start = start
+        self.end = end
+        self.done = done
+
+    def __len__(self) -> int:
+        return self.end - self.start + 1
+
+    def is_complete(self) -> bool:
+        """Get whether (True) or not (False) every byte of the segment is downloaded"""
+        return self.done >= len(self)
+
+
+class SegmentJournal:
+    """Keeps track of how far each segment of a segmented download has gotten, stored in a small text file next to the
+    .part file so that an interrupted download can resume each segment on its own. Each line of the journal is
+    written as `<start>-<end> = <done>`, similar to the lock file."""
+
+    path: Union[bytes, str]  # The path to the journal file
+    segments: List[Segment]  # The segments of the file being downloaded
+
+    # The least amount of seconds between saves of the journal to the disk
+    save_interval: float = 1
+
+    def __init__(self, path: Union[bytes, str], segments: List[Segment]):
+        self.path = path
+        self.segments = segments
+
+        self._lock = threading.Lock()
+        self._last_save = 0
+
+    @staticmethod
+    def get_path(part_file: Union[bytes, str]) -> Union[bytes, str]:
+        """Get the path of the journal belonging to a .part file
+
+        :param part_file: The path to the .part file being downloaded
+        :return: The path to the journal file
+        """
+        return part_file + s.SEGMENT_JOURNAL_SUFFIX
+
+    @staticmethod
+    def create(part_file: Union[bytes, str], total_size_byte: int, segment_count: int,
+               done_byte: int = 0) -> 'SegmentJournal':
+        """Split the remaining bytes of a file into segments of about the same size
+
+        :param part_file: The path to the .part file being downloaded
+        :param total_size_byte: The total size of the file being downloaded in bytes
+        :param segment_count: The number of segments to split the remaining bytes into
+        :param done_byte: The number of bytes at the start of the file that are already downloaded
+        :return: The new journal (not yet saved to the disk)
+        """
+        segments: List[Segment] = list()
+
+        if done_byte > 0:
+            # Keep anything downloaded before the download was segmented as a completed segment
+            segments.append(Segment(start=0, end=done_byte - 1, done=done_byte))
+
+        remaining = total_size_byte - done_byte
+
+        if remaining > 0:
+            segment_count = max(1, min(segment_count, ceil(remaining / s.SEGMENT_MIN_SIZE)))
+            segment_size = ceil(remaining / segment_count)
+
+            for start in range(done_byte, total_size_byte, segment_size):
+                segments.append(Segment(start=start, end=min(start + segment_size, total_size_byte) - 1))
+
+        return SegmentJournal(path=SegmentJournal.get_path(part_file), segments=segments)
+
+    @staticmethod
+    def load(part_file: Union[bytes, str]) -> 'SegmentJournal' or None:
+        """Read the journal belonging to a .part file from the disk
+
+        :param part_file: The path to the .part file being downloaded
+        :return: The journal or None if there is no journal for the file
+        """
+        path = SegmentJournal.get_path(part_file)
+
+        if os.path.exists(path) is False:
+            return None
+
+        segments: List[Segment] = list()
+
+        with open(path, 'r') as f:
+            for line in f.readlines():
+                if len(line.strip()) == 0:
+                    continue
+
+                byte_range, done = line.split(' = ')
+                start, end = byte_range.split('-')
+                segments.append(Segment(start=int(start), end=int(end), done=int(done)))
+
+        return SegmentJournal(path=path, segments=segments)
+
+    def save(self, force: bool = True) -> None:
+        """Write the journal to the disk, replacing the old journal all at once so that it is never half-written
+
+        :param force: Whether (True) or not (False) to save even if the journal was saved less than `save_interval`
+        seconds ago
+        """
+        with self._lock:
+            if force is False and time.time() - self._last_save < self.save_interval:
+                return
+
+            with open(self.path + '.tmp', 'w') as f:
+                for segment in self.segments:
+                    f.write(str(segment.start) + '-' + str(segment.end) + ' = ' + str(segment.done) + '\n')
+
+            os.replace(self.path + '.tmp', self.path)
+            self._last_save = time.time()
+
+    def remove(self) -> None:
+        """Delete the journal from the disk"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def get_total_size(self) -> int:
+        """Get the size of the whole file being downloaded in bytes"""
+        return sum(len(segment) for segment in self.segments)
+
+    def get_done_size(self) -> int:
+        """Get the number of bytes of the file that are already downloaded"""
+        return sum(min(segment.done, len(segment)) for segment in self.segments)
+
+    def is_complete(self) -> bool:
+        """Get whether (True) or not (False) every segment is completely downloaded"""
+        return all(segment.is_complete() for segment in self.segments)
+
+
+def get_segmented_progress(part_file: Union[bytes, str]) -> int or None:
+    """Get the number of bytes actually downloaded for a segmented download. The size of the .part file cannot be used
+    for this, because the .part file of a segmented download is created at the full size of the archive.
+
+    :param part_file: The path to the .part file being downloaded
+    :return: The number of bytes downloaded or None if the download is not segmented
+    """
+    journal = SegmentJournal.load(part_file)
+
+    if journal is None:
+        return None
+
+    return journal.get_done_size()
+
+
+def supports_range(url: str) -> bool:
+    """Ask the server for a single byte of the file to see if it is able to send back parts of the file
+
+    :param url: The url of the file to check
+    :return: Whether (True) or not (False) the server responded with only the byte asked for
+    """
+    with get_session().get(url, headers={'Range': 'bytes=0-0'}, stream=True) as r:
+        return r.status_code == requests.codes.partial_content
+
+
+def download_segmented(url: str, part_file: Union[bytes, str], total_size_byte: int, segment_count: int,
+                       user: str, progress=None, desc: str = None) -> bool:
+    """Download a file by splitting it into several ranges of bytes that are each downloaded at the same time into their
+    place in a .part file created at the full size of the file. A journal is kept next to the .part file so that if the
+    download is interrupted, each segment resumes from where it left off.
+
+    :param url: The url of the file to download
+    :param part_file: The path to the .part file to download to
+    :param total_size_byte: The total size of the file being downloaded in bytes
+    :param segment_count: The number of segments to split the file into (only used when starting a new download)
+    :param user: The user to download as (locking mechanism)
+    :param progress: A shared progress display (see `scheduler.AggregateProgress`) to report to instead of showing a
+    progress bar for only this file
+    :param desc: The description shown next to the progress bar
+    :return: True if the file is completely downloaded or False if the server does not support range requests or the
+    file is empty (in which case the file should be downloaded as a single stream instead)
+    """
+
+    if total_size_byte == 0:
+        # There is nothing to split into segments
+        return False
+
+    if supports_range(url) is False:
+
+        if os.path.exists(SegmentJournal.get_path(part_file)):
+            # The .part file was created at full size for segments, so it cannot be resumed as a single stream
+            SegmentJournal.load(part_file).remove()
+            os.remove(part_file)
+
+        return False
+
+    journal = SegmentJournal.load(part_file)
+
+    if journal is not None and journal.get_total_size() != total_size_byte:
+
+        # The file changed on the server since the download was started, so start over
+        journal.remove()
+        os.remove(part_file)
+        journal = None
+
+    if journal is None:
+
+        # Anything already in the .part file was downloaded as a single stream, so keep it as the first segment
+        done_byte = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+        journal = SegmentJournal.create(part_file=part_file, total_size_byte=total_size_byte,
+                                        segment_count=segment_count, done_byte=min(done_byte, total_size_byte))
+
+    if journal.get_done_size() >= total_size_byte:
+        # Every byte is already in the .part file (the download stopped before it was finished)
+        journal.remove()
+        return True
+
+    # Save the segments before the .part file grows to full size, so a full size .part file without them is always a
+    # complete download (see `Archive.download_url`)
+    journal.save()
+
+    # Create the .part file at the full size of the file (reserving the disk space) so each segment can be written in
+    # its place
+    with open(part_file, 'ab') as f:
+        preallocate(f, total_size_byte)
+
+    bar: tqdm or None = None
+    key = part_file[:-len(s.PART_SUFFIX)] if part_file.endswith(s.PART_SUFFIX) else part_file
+
+    if progress is None:
+        bar = tqdm(total=total_size_byte, initial=journal.get_done_size(), desc=desc, unit='B',
+                   unit_scale=True, unit_divisor=1024, miniters=1)
+    else:
+        # The part of the file already downloaded does not count towards the shared progress
+        progress.resume(key, journal.get_done_size())
+
+    def download_segment(segment: Segment) -> None:
+
+        if segment.is_complete():
+            return
+
+        headers = {'Range': 'bytes=' + str(segment.start + segment.done) + '-' + str(segment.end)}
+
+        with get_session().get(url, headers=headers, stream=True) as r, open(part_file, 'r+b') as f:
+
+            if r.status_code != requests.codes.partial_content:
+                raise ConnectionError('The server stopped sending parts of ' + url + ' (returned code ' +
+                                      str(r.status_code) + ')')
+
+            f.seek(segment.start + segment.done)
+
+            def on_data(data: memoryview) -> None:
+                segment.done += len(data)
+
+                if bar is not None:
+                    bar.update(len(data))
+                else:
+                    progress.update(len(data), key=key)
+
+                journal.save(force=False)
+
+            # Receive into reused buffers and write a few MiB at a time
+            write_response(r, f, on_data=on_data)
+
+        if segment.is_complete() is False:
+            raise ConnectionError('Segment ' + str(segment.start) + '-' + str(segment.end) + ' of ' + url +
+                                  ' was not fully downloaded. Retry download!')
+
+    # Update the lock file every so often (on a separate thread) so others know it is being downloaded
+    heartbeat = LockHeartbeat(part_file=part_file, user=user, total_size_byte=total_size_byte,
+                              get_done=journal.get_done_size)
+
+    try:
+        with heartbeat, ThreadPoolExecutor(max_workers=len(journal.segments)) as executor:
+            for future in [executor.submit(download_segment, segment) for segment in journal.segments]:
+                future.result()
+    finally:
+        # Remember how far each segment got, even if the download was interrupted
+        journal.save()
+
+        if bar is not None:
+            bar.close()
+
+    journal.remove()
+
+    return True
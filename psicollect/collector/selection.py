@@ -0,0 +1,125 @@
+import math
+import os
+from typing import Iterable, List, NamedTuple, Set
+
+from psicollect.cataloging.geom import parse_geom, to_value
+from psicollect.collector.pipeline import MemberFilter
+from psicollect.collector.remote_zip import RemoteZip
+from psicollect.common import s
+
+
+class BoundingBox(NamedTuple):
+    """An area on the map in degrees of longitude and latitude"""
+
+    min_lon: float
+    min_lat: float
+    max_lon: float
+    max_lat: float
+
+    @classmethod
+    def parse(cls, text: str) -> 'BoundingBox':
+        """Read a bounding box written as 'min_lon,min_lat,max_lon,max_lat' (e.g. '-75.7,35.7,-75.5,35.9')
+
+        :param text: The bounding box as text
+        :return: The bounding box
+        """
+        values = [float(value) for value in text.split(',')]
+
+        if len(values) != 4 or values[0] > values[2] or values[1] > values[3]:
+            raise ValueError('A bounding box must be given as "min_lon,min_lat,max_lon,max_lat", not "' + text + '"')
+
+        return cls(*values)
+
+    def intersects(self, other: 'BoundingBox') -> bool:
+        """Get whether (True) or not (False) two bounding boxes overlap (touching counts)"""
+        return self.min_lon <= other.max_lon and other.min_lon <= self.max_lon \
+            and self.min_lat <= other.max_lat and other.min_lat <= self.max_lat
+
+
+def get_footprint(geom_content: bytes) -> BoundingBox or None:
+    """Get the area an image covers from the corners listed in its .geom file
+
+    :param geom_content: The content of the .geom file
+    :return: The bounding box of the image's four corners, or None if any corner is missing
+    """
+    values = parse_geom(geom_content)
+
+    lons = [to_value(corner + '_lon', values.get(corner + '_lon', '')) for corner in ('ll', 'lr', 'ul', 'ur')]
+    lats = [to_value(corner + '_lat', values.get(corner + '_lat', '')) for corner in ('ll', 'lr', 'ul', 'ur')]
+
+    if any(math.isnan(value) for value in lons + lats):
+        return None
+
+    return BoundingBox(min(lons), min(lats), max(lons), max(lats))
+
+
+def get_image_id(name: str) -> str:
+    """Get the id of the image a member belongs to, its file name without the extension (e.g. 'C25870213' for both
+    'jpgs/C25870213.jpg' and 'jpgs/C25870213.geom')
+
+    :param name: The path of the member inside of the archive
+    """
+    return os.path.splitext(name.rsplit('/', 1)[-1])[0]
+
+
+def select_members(remote: RemoteZip, member_filter: MemberFilter = None, image_ids: Iterable[str] = None,
+                   bbox: BoundingBox = None, workers: int = s.DEFAULT_REMOTE_WORKERS) -> List[str]:
+    """Pick the members of a remote zip archive to fetch. A member is picked if it passes the filter, belongs to one of
+    the images listed, and belongs to an image whose footprint (from its .geom file) overlaps the bounding box (criteria
+    left out always match).
+
+    :param remote: The remote archive
+    :param member_filter: Picks members by their path (None for every member)
+    :param image_ids: The ids of the images to pick (e.g. 'C25870213'), picking every file of each image
+    :param bbox: The area that the images must overlap (only the .geom files are fetched to find out)
+    :param workers: The number of .geom files to fetch at the same time
+    :return: The paths of the members picked (in the order of the archive)
+    """
+    image_ids: Set[str] or None = set(image_ids) if image_ids is not None else None
+
+    names = [info.filename for info in remote.infolist() if not info.filename.endswith('/')
+             and (member_filter is None or member_filter.matches(info.filename))
+             and (image_ids is None or get_image_id(info.filename) in image_ids)]
+
+    if bbox is not None:
+        # Only the small .geom files are fetched to find out which images are inside of the area
+        geom_names = [info.filename for info in remote.infolist() if info.filename.endswith('.geom')
+                      and (image_ids is None or get_image_id(info.filename) in image_ids)]
+
+        inside: Set[str] = set()
+
+        for geom_name, content in remote.read_members(geom_names, workers=workers):
+            footprint = get_footprint(content)
+
+            if footprint is not None and bbox.intersects(footprint):
+                inside.add(geom_name.rsplit('.', 1)[0])
+
+        names = [name for name in names if name.rsplit('.', 1)[0] in inside]
+
+    return names
+
+
+def fetch_selected(remote: RemoteZip, extract_dir: str, member_filter: MemberFilter = None,
+                   image_ids: Iterable[str] = None, bbox: BoundingBox = None,
+                   workers: int = s.DEFAULT_REMOTE_WORKERS, log=print) -> List[str]:
+    """Download only the members of a remote zip archive that are needed (see `select_members`), several at a time,
+    writing them where they would be if the whole archive was downloaded and extracted
+
+    :param remote: The remote archive
+    :param extract_dir: The directory to write the members to
+    :param member_filter: Picks members by their path (None for every member)
+    :param image_ids: The ids of the images to fetch (e.g. 'C25870213')
+    :param bbox: The area that the images must overlap
+    :param workers: The number of members to fetch at the same time
+    :param log: The function used to print messages
+    :return: The paths of the members written (members that already existed are not fetched again)
+    """
+    names = select_members(remote, member_filter=member_filter, image_ids=image_ids, bbox=bbox, workers=workers)
+
+    log('Selected ' + str(len(names)) + ' of ' + str(len(remote.infos)) + ' files in ' + remote.url)
+
+    written = remote.extract_members(names, extract_dir, workers=workers)
+
+    log('Fetched ' + str(len(written)) + ' files (the rest already existed)')
+
+    return written
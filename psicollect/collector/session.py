@@ -0,0 +1,115 @@
+import threading
+from typing import Tuple
+
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout
+from requests_html import HTMLSession
+
+from psicollect.collector.retry import JitteredRetry, get_circuit_breaker, get_host
+from psicollect.common import s
+
+# The statuses of temporary server errors (retried, and counted as failures by the circuit breaker)
+SERVER_ERROR_STATUSES = (500, 502, 503, 504)
+
+
+class PooledSession(HTMLSession):
+    """An HTTP session that keeps connections to each host open (keep-alive) between requests so that TLS handshakes
+    are only done once per connection, and that gives every request a default timeout so one hung socket cannot stall
+    a whole run. Every request goes through the circuit breaker (see `retry.CircuitBreaker`), so requests to a host that
+    keeps failing fail right away for a while. It is an `HTMLSession`, so pages fetched through it can still be rendered
+    if needed."""
+
+    timeout: Tuple[float, float]  # The default (connect, read) timeout in seconds for every request
+
+    def __init__(self, pool_size: int = s.DEFAULT_POOL_SIZE,
+                 connect_timeout: float = s.DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = s.DEFAULT_READ_TIMEOUT,
+                 retries: int = s.DEFAULT_REQUEST_RETRIES):
+        """Create the session and mount connection pools that retry failed connections
+
+        :param pool_size: The maximum number of connections to keep open to each host
+        :param connect_timeout: The amount of seconds to wait for a connection to a host
+        :param read_timeout: The amount of seconds to wait for more data from a host
+        :param retries: The number of times to retry a request that could not connect or got a server error
+        """
+        HTMLSession.__init__(self)
+
+        self.timeout = (connect_timeout, read_timeout)
+
+        # Retry connection errors and temporary server errors, waiting a little longer (with jitter) after each attempt
+        retry = JitteredRetry(total=retries, backoff_factor=0.5, status_forcelist=SERVER_ERROR_STATUSES,
+                              raise_on_status=False)
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+
+    def request(self, method, url, *args, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+
+        host = get_host(url)
+        breaker = get_circuit_breaker()
+
+        # Fail right away if too many requests to the host failed in a row
+        breaker.check(host)
+
+        try:
+            response = HTMLSession.request(self, method, url, *args, **kwargs)
+        except (RequestsConnectionError, Timeout):
+            breaker.record_failure(host)
+            raise
+
+        if response.status_code in SERVER_ERROR_STATUSES:
+            breaker.record_failure(host)
+        else:
+            breaker.record_success(host)
+
+        return response
+
+
+_session: PooledSession or None = None  # The session shared by the whole process (created on first use)
+_session_lock = threading.Lock()
+_session_settings: dict = dict()  # The settings to create the shared session with (see `configure_session`)
+
+
+def get_session() -> PooledSession:
+    """Get the HTTP session shared by the whole process, creating it if it does not exist yet
+
+    :return: The shared session
+    """
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            _session = PooledSession(**_session_settings)
+
+        return _session
+
+
+def configure_session(pool_size: int = None, connect_timeout: float = None, read_timeout: float = None,
+                      retries: int = None) -> None:
+    """Change the settings of the session shared by the whole process. The current session (if any) is closed and a new
+    one is created with the new settings on next use. Settings left as None are not changed.
+
+    :param pool_size: The maximum number of connections to keep open to each host
+    :param connect_timeout: The amount of seconds to wait for a connection to a host
+    :param read_timeout: The amount of seconds to wait for more data from a host
+    :param retries: The number of times to retry a request that could not connect or got a server error
+    """
+    for key, value in {'pool_size': pool_size, 'connect_timeout': connect_timeout,
+                       'read_timeout': read_timeout, 'retries': retries}.items():
+        if value is not None:
+            _session_settings[key] = value
+
+    close_session()
+
+
+def close_session() -> None:
+    """Close all connections of the session shared by the whole process (a new one is created on next use)"""
+    global _session
+
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -1,13 +1,15 @@
 import re
 from os import path
-from typing import List, Tuple
+from functools import partial
+from typing import Iterator, List, Set, Tuple
 
 import concurrent.futures
 
 from psicollect.collector.archive import Archive
-from psicollect.collector.connection_handler import get_http_response
+from psicollect.collector.response_getter import get_full_content_length, get_http_links, get_http_response
+from psicollect.common import s
+
 # Matches archive files for most (if not all) formats
-from psicollect.collector.response_getter import get_full_content_length
 
 URL_STORMS_REGEX_PATTERN_ARCHIVE_GENERAL = re.compile("[\"\'=]\\s*(https?[^\"\'=]+\\.(tar|zip))\\s*[\"\'>]",
                                                       re.IGNORECASE)
@@ -27,6 +29,12 @@ class Storm:
     storm_title: str  # The full name of the storm as listed on the NOAA page
     storm_year: int  # The year that the storm occurred
 
+    # Whether (True) or not (False) the storm's page has to be rendered (run its JavaScript) to find its archives
+    render: bool = False
+
+    probe_concurrency: int = s.DEFAULT_PROBE_CONCURRENCY  # The number of archive sizes to ask for at the same time
+    probe_timeout: float = s.DEFAULT_PROBE_TIMEOUT  # The amount of seconds to wait for the size of each archive
+
     archive_list: List[Archive] = list()  # A list of all archives associated with the storm (from the index.html)
     archive_list_last_pattern: str = None  # The last regular expression used to create the list of archive files
 
@@ -42,15 +50,18 @@ class Storm:
         self.storm_id = storm_id
         self.storm_title = storm_title
         self.storm_year = int(storm_year)
+        self.render = storm_id in s.STORMS_REQUIRE_RENDER
 
     def __str__(self):
         """Prints out the storm title and year in a human readable format"""
         return self.storm_title + '(' + str(self.storm_year) + ')'
 
-    def generate_archive_list(self, search_re: str = '.*'):
+    def generate_archive_list(self, search_re: str = '.*', probe_executor: concurrent.futures.Executor = None):
         """Generates a list of archive files from the given storm
 
         :param search_re: A regular expression to search all archive files for
+        :param probe_executor: The pool of threads to ask for the archive sizes on, shared with other storms (None to
+        use a pool of `probe_concurrency` threads for only this storm)
         """
 
         # Clear all existing archive files
@@ -68,62 +79,70 @@ class Storm:
             # Define where the program should look in order to find archives #
             ##################################################################
 
-            r_text: str  # The text in which to search for links to archives
+            links: List[Tuple[str, str]]  # The links to archives (and their types) found on the storm's page
             if self.storm_id == 'apr11_tornado':
                 # Specific case for Tuscaloosa, AL Tornado (2011), obtaining info requires querying ArcGIS
                 # Just give the permanent archive link
-                r_text = '"http://geodesy.noaa.gov/storm_archive/storms/apr11_tornado/jgw_met/all_world.zip"'
+                links = re.findall(URL_STORMS_REGEX_PATTERN_ARCHIVE_RELATIVE,
+                                   '"http://geodesy.noaa.gov/storm_archive/storms/apr11_tornado/jgw_met/all_world.zip"')
             else:
                 # Load the storm's index.html
-                r_text = get_http_response(self.storm_url).html.html
+                links = self._get_archive_links(self.storm_url)
 
                 # Older storms have a link to the AddedInfo.HTM with archives listed there
-                if len(re.findall(URL_STORMS_REGEX_PATTERN_ARCHIVE_GENERAL, r_text)) == 0 and self.storm_year < 2010:
-                    r_text = get_http_response(path.split(self.storm_url)[0] + '/AddedInfo.HTM').text
+                if not any(archive_url.startswith('http') for archive_url, _ in links) and self.storm_year < 2010:
+                    links = self._get_archive_links(path.split(self.storm_url)[0] + '/AddedInfo.HTM')
+
+            # Links that are full urls are trusted to exist, even if the website does not say how big they are
+            absolute_urls: Set[str] = {archive_url for archive_url, _ in links if archive_url.startswith('http')}
 
             #########################################
             # Assemble a list of archives available #
             #########################################
 
-            url_list: List[Tuple[str, str]] = list()
+            # Resolve relative links and keep each matching url once (in the order found), before asking for any sizes
+            url_list: List[str] = list()
+            seen: Set[str] = set()
 
-            for archive_url, archive_type in re.findall(URL_STORMS_REGEX_PATTERN_ARCHIVE_RELATIVE, r_text):
-                if archive_url.startswith('http'):
-                    url_list.append((archive_url, archive_type))
-                else:
-                    new_url = path.split(self.storm_url)[0] + '/' + archive_url
-                    if get_full_content_length(new_url) != 0:
-                        url_list.append((new_url, archive_type))
+            for archive_url, _ in links:
+                if not archive_url.startswith('http'):
+                    archive_url = path.split(self.storm_url)[0] + '/' + archive_url
 
-            # Get file sizes concurrently (faster performance!) and add to the url list
-            with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-                file_sizes = executor.map(get_full_content_length,
-                                          [x[0] for x in url_list])
+                if archive_url not in seen and re.search(search_re, archive_url) is not None:
+                    seen.add(archive_url)
+                    url_list.append(archive_url)
 
-            url_size_list: List[Tuple[str, str, int]] = list()
-            url_size_list = [(x[0], x[1], size) for x, size in zip(url_list, file_sizes)]
+            # Get every file size at the same time (one request per url), which also tells if relative links exist
+            probe = partial(get_full_content_length, timeout=self.probe_timeout)
 
-            # Find all storm data by regex parsing of URLs
-            for archive_url, archive_type, file_size in url_size_list:
+            if probe_executor is None:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, self.probe_concurrency)) as executor:
+                    file_sizes = list(executor.map(probe, url_list))
+            else:
+                file_sizes = list(probe_executor.map(probe, url_list))
 
-                if re.search(search_re, archive_url) is not None:
+            for archive_url, file_size in zip(url_list, file_sizes):
 
-                    # Flag will be toggled to True if the current url matches an already accounted for archive
-                    flag_exists = False
+                # Relative links are guessed at, so only keep them if the website has the file
+                if file_size != 0 or archive_url in absolute_urls:
+                    self.archive_list.append(Archive(archive_url=archive_url, file_size_origin=file_size))
 
-                    for archive in self.archive_list:
-                        if archive.url == archive_url:
-                            # If the archive already appears in the list
+        except ConnectionError:  # pragma: no cover
+            self.archive_list = list()
 
-                            flag_exists = True
-                            break
+    def _get_archive_links(self, url: str) -> List[Tuple[str, str]]:
+        """Find all links to archives on a page. The page is read over plain HTTP and searched as it downloads, unless
+        the storm is known to need its page rendered (run in a headless browser) for the links to show up.
 
-                    if flag_exists is False:
-                        self.archive_list.append(Archive(archive_url=archive_url,
-                                                         file_size_origin=file_size))
+        :param url: The url of the page to search
+        :returns: The url (possibly relative) and type of each archive linked to on the page
+        """
 
-        except ConnectionError:  # pragma: no cover
-            self.archive_list = list()
+        if self.render:
+            return re.findall(URL_STORMS_REGEX_PATTERN_ARCHIVE_RELATIVE,
+                              get_http_response(url, render=True).html.html)
+
+        return list(get_http_links(url, URL_STORMS_REGEX_PATTERN_ARCHIVE_RELATIVE))
 
     """ DISABLED: Does not cover JPEG files reliably
 
@@ -145,16 +164,44 @@ class Storm:
                 self.archive_list.append(Archive(url=url))
     """
 
-    def get_archive_list(self, search_re: str = '.*') -> List[Archive]:
+    def get_archive_list(self, search_re: str = '.*', probe_executor: concurrent.futures.Executor = None) \
+            -> List[Archive]:
         """Get a list of all archive objects with the associated regular expression
 
         :param search_re: The regular expression to search for. Applies to archive date, url, and label
+        :param probe_executor: The pool of threads to ask for the archive sizes on, shared with other storms (None to
+        use a pool for only this storm)
         :returns: A list of archive references (information about archives from the website)
         """
 
         # If the user has already asked for a list with the same search expression (answer is not already known)
         if search_re != self.archive_list_last_pattern:
             # Generate the list of archive files (clear old list if one exists)
-            self.generate_archive_list(search_re)
+            self.generate_archive_list(search_re, probe_executor=probe_executor)
 
         return self.archive_list
+
+
+def crawl_storms(storms: List[Storm], search_re: str = '.*', workers: int = s.DEFAULT_CRAWL_WORKERS) -> Iterator[Storm]:
+    """Find the archives of many storms at the same time (each storm's page is searched on a pool of threads). The
+    archives' sizes of every storm are asked for on a single pool of threads shared by all of them, so the requests open
+    at the same time (`workers` pages and the sizes) stay within the connections the session keeps open to the website
+    (see `session.PooledSession`) instead of multiplying with the number of storms.
+
+    :param storms: The storms to find the archives of
+    :param search_re: A regular expression to search all archive files for
+    :param workers: The number of storms to find the archives of at the same time
+    :returns: Each storm as soon as its list of archives is ready (in the order they finish, not the order given)
+    """
+
+    probe_concurrency = max([storm.probe_concurrency for storm in storms], default=1)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=max(1, probe_concurrency)) as probe_executor:
+        futures = {executor.submit(storm.get_archive_list, search_re, probe_executor): storm for storm in storms}
+
+        for future in concurrent.futures.as_completed(futures):
+            # Raise any unexpected error here instead of losing it on the thread
+            future.result()
+
+            yield futures[future]
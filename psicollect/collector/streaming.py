@@ -0,0 +1,173 @@
+import os
+import queue
+import tarfile
+import threading
+from typing import List, Union
+
+from psicollect.collector.member_index import IndexEntry, MemberIndex
+from psicollect.collector.pipeline import ManifestEntry, MemberFilter, process_tar, write_manifest
+
+
+class ChunkPipe:
+    """A file-like object that gives back the chunks of bytes put into it (from another thread), in order. Only a few
+    chunks are held at a time, so a slow reader makes the writer wait instead of filling up memory."""
+
+    def __init__(self, max_chunks: int = 16):
+        """Create an empty pipe
+
+        :param max_chunks: The most chunks to hold before the writer has to wait for the reader
+        """
+        self._queue = queue.Queue(maxsize=max_chunks)
+        self._chunk: bytes = b''  # The chunk currently being read
+        self._pos: int = 0  # How far into the current chunk has been read
+        self._eof: bool = False
+
+    def put(self, data: bytes or None) -> None:
+        """Add a chunk to the end of the pipe
+
+        :param data: The chunk of bytes, or None to mark the end of the data
+        """
+        self._queue.put(data)
+
+    def read(self, size: int = -1) -> bytes:
+        """Read the next bytes from the pipe, waiting for more chunks if needed
+
+        :param size: The number of bytes to read (-1 to read until the end of the data)
+        :return: The bytes read (fewer than asked for only at the end of the data)
+        """
+        parts = list()
+
+        while size != 0:
+
+            if self._pos >= len(self._chunk):
+                if self._eof:
+                    break
+
+                chunk = self._queue.get()
+
+                if chunk is None:
+                    self._eof = True
+                    break
+
+                self._chunk, self._pos = chunk, 0
+                continue
+
+            end = len(self._chunk) if size < 0 else min(len(self._chunk), self._pos + size)
+            parts.append(self._chunk[self._pos:end])
+
+            if size > 0:
+                size -= end - self._pos
+
+            self._pos = end
+
+        return b''.join(parts)
+
+
+class StreamingTarExtractor:
+    """Extracts a tar archive while it is being downloaded. The downloaded chunks are fed to a streaming tar reader on
+    a separate thread, which writes each member to the extract directory as soon as all of its bytes have arrived.
+    Members that already exist with the right size (extracted before the download was stopped and resumed) are not
+    written again. Every member is hashed on the way (see `pipeline.process_tar`), and where each member is inside of
+    the archive is kept track of (see `MemberIndex`)."""
+
+    extract_dir: Union[bytes, str]  # The directory to extract the members to
+    manifest_path: Union[bytes, str] or None  # The path to save the manifest of the members to (None to not save one)
+    archive_file_path: Union[bytes, str] or None  # The path the archive is saved at once downloaded (None if unknown)
+    member_filter: MemberFilter or None  # Picks which members to extract (None for every member)
+    entries: List[ManifestEntry]  # What was found out about each file of the archive (once extraction finishes)
+    index: List[IndexEntry]  # Where each file is inside of the archive (once extraction finishes)
+    member_count: int  # The number of members written (once extraction finishes)
+    error: Exception or None  # The error that stopped the extraction (None if there was none)
+
+    def __init__(self, extract_dir: Union[bytes, str], manifest_path: Union[bytes, str] = None,
+                 member_filter: MemberFilter = None, max_chunks: int = 16, archive_file_path: Union[bytes, str] = None):
+        """Start the extraction thread (it waits for chunks to be fed to it)
+
+        :param extract_dir: The directory to extract the members to
+        :param manifest_path: The path to save the manifest of the members to once every member is extracted (None to
+        not save one)
+        :param member_filter: Picks which members to extract (None for every member)
+        :param max_chunks: The most downloaded chunks to hold in memory before the download has to wait for extraction
+        :param archive_file_path: The path the archive is saved at once downloaded, to save the index of its members
+        next to once every member is extracted (None to not save one)
+        """
+        self.extract_dir = extract_dir
+        self.manifest_path = manifest_path
+        self.archive_file_path = archive_file_path
+        self.member_filter = member_filter
+        self.entries = list()
+        self.index = list()
+        self.member_count = 0
+        self.error = None
+
+        self._pipe = ChunkPipe(max_chunks=max_chunks)
+        self._thread = threading.Thread(target=self._extract, daemon=True)
+        self._thread.start()
+
+    def feed(self, data: bytes) -> None:
+        """Give the next downloaded bytes of the archive to the extractor
+
+        :param data: The next bytes of the archive, in order
+        """
+        self._pipe.put(data)
+
+    def feed_file(self, file_path: Union[bytes, str], size: int, chunk_size: int = 1024 * 1024) -> None:
+        """Give the extractor the start of the archive that was downloaded before (used when resuming a download)
+
+        :param file_path: The path of the partly downloaded archive (.part file)
+        :param size: The number of bytes at the start of the file to feed
+        :param chunk_size: The number of bytes to read at a time
+        """
+        with open(file_path, 'rb') as f:
+            while size > 0:
+                data = f.read(min(chunk_size, size))
+
+                if not data:
+                    break
+
+                self.feed(data)
+                size -= len(data)
+
+    def close(self) -> bool:
+        """Tell the extractor that the whole archive was fed and wait for it to finish writing members
+
+        :return: Whether (True) or not (False) every member was extracted without an error
+        """
+        self._pipe.put(None)
+        self._thread.join()
+
+        return self.error is None
+
+    def abort(self) -> None:
+        """Stop the extraction early (e.g. the download was interrupted). Members written so far are kept, and the last
+        one may be incomplete (it is written again when the download is resumed)."""
+        self._pipe.put(None)
+        self._thread.join()
+
+    def _extract(self) -> None:
+        """Read members from the pipe as they arrive and write them to the extract directory (runs on its own thread)"""
+
+        try:
+            if not os.path.exists(self.extract_dir):
+                os.makedirs(self.extract_dir)
+
+            with tarfile.open(fileobj=self._pipe, mode='r|') as tar:
+                self.entries = process_tar(tar, self.extract_dir, member_filter=self.member_filter, index=self.index)
+
+            self.member_count = sum(entry.written for entry in self.entries)
+
+            if self.manifest_path is not None:
+                write_manifest(self.manifest_path, self.entries)
+
+            if self.archive_file_path is not None:
+                MemberIndex(self.archive_file_path, self.index).save()
+
+        except Exception as e:
+            # Any error (not only a broken archive, e.g. a bad header or running out of memory) stops the extraction
+            self.error = e
+
+        finally:
+            # Keep taking chunks (e.g. the padding at the end of the archive, or everything after an error) so the
+            # download never waits on a finished or stopped extraction
+            while self._pipe.read(1024 * 1024):
+                pass
@@ -3,7 +3,9 @@ from __future__ import print_function
 import os
 import re
 import sys
-from typing import Union, Pattern, List
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Dict, List, Pattern, Tuple, Union
 
 from psicollect.common import s
 
@@ -55,91 +57,134 @@ def validate_and_expand_path(path: Union[bytes, str]) -> Union[bytes, str]:
     return new_path
 
 
-def all_files_recursively(root_path: Union[bytes, str],
-                          unix_sep: bool = False,
-                          require_geom: bool = False,
-                          file_extension: str = 'jpg',
-                          file_search_re: Pattern = '.*',
-                          debug: bool = s.DEFAULT_DEBUG,
-                          verbosity: int = s.DEFAULT_VERBOSITY) -> List[str]:
-    """A method to allow for recursively finding all files (including their absolute path on the local machine in
-    order. This method also accepts an optional regular expression to match file names to and/or a specific file
-    extension for the purpose of only getting specific file types.
+# Matches the ' (1).' that a copy of a file gets in its name when it is downloaded or synced twice
+# (e.g. 'C25870213 (1).jpg')
+DUPLICATE_NAME_RE = re.compile(' \\(\\d\\)\\.')
+
+
+def _get_size(entry: os.DirEntry) -> int or None:
+    """Get the size of a file from its directory entry (None if it cannot be read, e.g. a link to a removed file)"""
+    try:
+        return entry.stat().st_size
+    except OSError:  # pragma: no cover
+        return None
+
+
+def _find_images_in_directory(dir_path: str, require_geom: bool, file_extension: str, file_search_re: Pattern) \
+        -> Tuple[List[Tuple[str, int]], List[str], List[Tuple[str, str]]]:
+    """Read a single directory once (with `os.scandir`) and pick the images out of it. The .geom file and the
+    original of a duplicate are looked up in the same listing, and sizes come from the directory entries, so no file
+    is checked on its own.
+
+    :param dir_path: The directory to read
+    :param require_geom: Whether or not to return only files with a .geom file associated with them
+    :param file_extension: The file extension required to be included in the returned list
+    :param file_search_re: The file name (including the extension) to be searched for as a compiled regular expression
+    :return: The path and size of each image picked, the sub-directories to read next, and the path and outcome
+    (e.g. 'matches pattern!') of each file with the extension (for debug output)
+    """
+    entries: Dict[str, os.DirEntry] = dict()
+    sub_dirs: List[str] = list()
+
+    try:
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                try:
+                    # Follow links to directories (like `os.walk(followlinks=True)`)
+                    if entry.is_dir(follow_symlinks=True):
+                        sub_dirs.append(entry.path)
+                    else:
+                        entries[entry.name] = entry
+                except OSError:  # pragma: no cover
+                    continue
+
+    except OSError:  # pragma: no cover
+        # A directory that cannot be read is skipped (like `os.walk`)
+        return list(), list(), list()
+
+    images: List[Tuple[str, int]] = list()
+    outcomes: List[Tuple[str, str]] = list()
+
+    for name, entry in entries.items():
+
+        # Check file extensions only if the file_extension parameter is defined
+        if not name.endswith('.' + file_extension):
+            continue
+
+        # Find if the file name ends with a '(#)' meaning that it is a duplicated file and compare to original
+        # file's size to see if there are truly duplicates (same size and original is not removed)
+        original = entries.get(DUPLICATE_NAME_RE.sub('.', name)) if DUPLICATE_NAME_RE.search(name) else None
+
+        if original is not None and _get_size(original) == _get_size(entry):
+            outcomes.append((entry.path, 'duplicate file!'))
+
+        # If the .geom file is required, make sure it exists
+        elif require_geom and os.path.splitext(name)[0] + '.geom' not in entries:
+            outcomes.append((entry.path, 'does not have required .geom file!'))
+
+        # If the file's path matches the regular expression pattern
+        elif file_search_re.search(name):
+            size = _get_size(entry)
+
+            if size is None:  # pragma: no cover
+                outcomes.append((entry.path, 'could not be read!'))
+            else:
+                outcomes.append((entry.path, 'matches pattern!'))
+                images.append((entry.path, size))
+
+        # The file just doesn't match the pattern
+        else:
+            outcomes.append((entry.path, 'does not match pattern!'))
+
+    return images, sub_dirs, outcomes
+
+
+def find_images(root_path: Union[bytes, str],
+                require_geom: bool = False,
+                file_extension: str = 'jpg',
+                file_search_re: Pattern = '.*',
+                workers: int = s.DEFAULT_SCAN_WORKERS,
+                debug: bool = s.DEFAULT_DEBUG,
+                verbosity: int = s.DEFAULT_VERBOSITY) -> List[Tuple[str, int]]:
+    """Find every image under a directory along with its size, reading each directory once. Sibling directories are
+    read at the same time on a pool of threads (most of the time spent listing a network drive is waiting).
 
     :param root_path: The path to begin searching recursively for matching files in
-    :param unix_sep: Whether to replace all '\' with a '/' in the file paths on Windows
     :param require_geom: Whether or not to return only files with a .geom file associated with them
     :param file_extension: The file extension required to be included in the returned list
     :param file_search_re: The file name (including the extension) to be searched for as a regular expression
+    :param workers: The number of directories to read at the same time
     :param debug: Whether (True) or not (False) to override default debug flag and output additional statements
     :param verbosity: The frequency of debug statement output (1 = LOW, 2 = MEDIUM, 3 = HIGH)
-    :return: A list of files with their relative path
+    :return: The absolute path and size in bytes of each image (sorted by path)
     """
 
     # Make search pattern case-insensitive
     file_search_re = re.compile(file_search_re, re.IGNORECASE)
 
-    files = list()
-
     if debug and verbosity >= 1:
         print('\nSearching through ' + root_path + ' for the pattern "' + str(file_search_re.pattern) + '" ...')
 
-    for (dir_path, dir_names, file_names) in os.walk(top=root_path, followlinks=True, topdown=False):
-        for f in file_names:
-            abs_file_path = os.path.join(dir_path, f)
-
-            # Check file extensions only if the file_extension parameter is defined
-            if f.endswith('.' + file_extension):
-                if debug and verbosity >= 1:
-                    print('\r' + abs_file_path + ' ... ', end='')
-
-                # Find the path for the related .geom file
-                geom_path = validate_and_expand_path(
-                    re.sub(pattern='\\.[^.]*$', repl='.geom', string=str(abs_file_path)))
-
-                # Find if the file name ends with a '(#)' meaning that it is a duplicated file and compare to original
-                # file's size to see if there are truly duplicates (same size and original is not removed)
-                if re.search(' \\(\\d\\)\\.', f) \
-                        and os.path.exists(os.path.join(dir_path, re.sub(' \\(\\d\\)\\.', '.', f))) \
-                        and os.path.getsize(os.path.join(dir_path, re.sub(' \\(\\d\\)\\.', '.', f))) is not \
-                        os.path.getsize(abs_file_path):
-                    if debug and verbosity >= 1:
-                        # In-line progress (no spam when verbosity is 1)
-                        print('duplicate file!', end='')
-
-                        if verbosity >= 2:
-                            # Multi-line output of progress (may be quite verbose)
-                            print()
-
-                # If the .geom file is required, make sure it exists
-                elif require_geom and not os.path.exists(geom_path):
-                    if debug and verbosity >= 1:
-                        # In-line progress (no spam when verbosity is 1)
-                        print('does not have required .geom file!', end='')
-
-                        if verbosity >= 2:
-                            # Multi-line output of progress (may be quite verbose)
-                            print()
-
-                # If the file's path matches the regular expression pattern
-                elif re.search(file_search_re, f):
-                    if debug and verbosity >= 1:
-                        # In-line progress (no spam when verbosity is 1)
-                        print('matches pattern!', end='')
-
-                        if verbosity >= 2:
-                            # Multi-line output of progress (may be quite verbose)
-                            print()
-                    if unix_sep:
-                        files.append(str(os.path.relpath(path=abs_file_path,
-                                                         start=root_path)).replace('\\', '/'))
-                    else:
-                        files.append(str(os.path.relpath(path=abs_file_path, start=root_path)))
+    images: List[Tuple[str, int]] = list()
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+
+        def read(dir_path: str) -> Future:
+            return executor.submit(_find_images_in_directory, dir_path, require_geom, file_extension, file_search_re)
+
+        # Every sub-directory found is read right away, while the directories found before it are still being read
+        pending: Deque[Future] = deque([read(root_path)])
+
+        while pending:
+            dir_images, sub_dirs, outcomes = pending.popleft().result()
+
+            images.extend(dir_images)
+            pending.extend(read(sub_dir) for sub_dir in sub_dirs)
 
-                # The file just doesn't match the pattern, so output so if in debug
-                elif debug and verbosity >= 1:
+            if debug and verbosity >= 1:
+                for file_path, outcome in outcomes:
                     # In-line progress (no spam when verbosity is 1)
-                    print('does not match pattern!', end='')
+                    print('\r' + file_path + ' ... ' + outcome, end='')
 
                     if verbosity >= 2:
                         # Multi-line output of progress (may be quite verbose)
@@ -149,4 +194,39 @@ def all_files_recursively(root_path: Union[bytes, str],
         # Clear pattern matching output on current line
         print('\r', end='')
 
+    return sorted(images)
+
+
+def all_files_recursively(root_path: Union[bytes, str],
+                          unix_sep: bool = False,
+                          require_geom: bool = False,
+                          file_extension: str = 'jpg',
+                          file_search_re: Pattern = '.*',
+                          workers: int = s.DEFAULT_SCAN_WORKERS,
+                          debug: bool = s.DEFAULT_DEBUG,
+                          verbosity: int = s.DEFAULT_VERBOSITY) -> List[str]:
+    """A method to allow for recursively finding all files (including their absolute path on the local machine in
+    order. This method also accepts an optional regular expression to match file names to and/or a specific file
+    extension for the purpose of only getting specific file types. See `find_images`.
+
+    :param root_path: The path to begin searching recursively for matching files in
+    :param unix_sep: Whether to replace all '\' with a '/' in the file paths on Windows
+    :param require_geom: Whether or not to return only files with a .geom file associated with them
+    :param file_extension: The file extension required to be included in the returned list
+    :param file_search_re: The file name (including the extension) to be searched for as a regular expression
+    :param workers: The number of directories to read at the same time
+    :param debug: Whether (True) or not (False) to override default debug flag and output additional statements
+    :param verbosity: The frequency of debug statement output (1 = LOW, 2 = MEDIUM, 3 = HIGH)
+    :return: A list of files with their relative path
+    """
+    files = list()
+
+    for file_path, _ in find_images(root_path, require_geom=require_geom, file_extension=file_extension,
+                                    file_search_re=file_search_re, workers=workers, debug=debug,
+                                    verbosity=verbosity):
+        if unix_sep:
+            files.append(str(os.path.relpath(path=file_path, start=root_path)).replace('\\', '/'))
+        else:
+            files.append(str(os.path.relpath(path=file_path, start=root_path)))
+
     return files
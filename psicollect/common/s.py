@@ -11,14 +11,125 @@ PROJECT_DIR = join(join(expanduser('~'), 'psi'), 'collect')
 DATA_PATH = join(PROJECT_DIR, 'data')
 ARCHIVE_CACHE_PATH = join(DATA_PATH, 'archives')
 
+# The directory to cache pages and archive sizes from the website in, the amount of seconds a cached response is used
+# without asking the website if it changed, and the most bytes the cache may take up on the disk (64 MiB)
+HTTP_CACHE_PATH = join(DATA_PATH, 'http_cache')
+HTTP_CACHE_TTL: float = 12 * 60 * 60
+HTTP_CACHE_MAX_SIZE: int = 64 * 1024 * 1024
+
 LOCK_TOTAL_SIZE_BYTES_FIELD = 'total_size_bytes'
 LOCK_PART_SIZE_BYTES_FIELD = 'size_bytes'
 LOCK_SUFFIX = '.lock'
 
+# The amount of seconds between updates of the lock file of a download (done on a separate thread, off of the loop that
+# receives the download)
+LOCK_UPDATE_INTERVAL: float = 180
+
 PART_SUFFIX = '.part'
+
+# The number of archives to download at the same time and the most allowed at once from any single host
+DEFAULT_DOWNLOAD_JOBS: int = 4
+DEFAULT_DOWNLOAD_JOBS_PER_HOST: int = 2
+
+# The number of byte ranges to split each archive into when downloading (1 = download as a single stream)
+DEFAULT_DOWNLOAD_SEGMENTS: int = 1
+
+# The size in bytes of the buffers that downloads are received into (reused for every chunk), and the block size that
+# writes to the disk are aligned to
+DOWNLOAD_BUFFER_SIZE: int = 4 * 1024 * 1024
+DOWNLOAD_WRITE_ALIGNMENT: int = 64 * 1024
+
+# The smallest size in bytes a segment of an archive may be when the archive is split into byte ranges (16 MiB)
+SEGMENT_MIN_SIZE: int = 16 * 1024 * 1024
+
+# Whether (True) or not (False) to extract tar archives while they download (only for archives downloaded as a single
+# stream, segmented downloads arrive out of order)
+DEFAULT_STREAM_EXTRACT: bool = False
+
+# The list of members of an extracted archive (name, size and MD5 hash), stored next to the archive file
+# (e.g. 'archive.tar.manifest.csv')
+MANIFEST_SUFFIX = '.manifest.csv'
+MANIFEST_FIELDS = ('name', 'size', 'md5')
+
+# Where each member's data is inside of an archive (name, offset, size and CRC), stored next to the archive file
+# (e.g. 'archive.tar.index.csv') so members can be read without extracting or scanning the archive
+INDEX_SUFFIX = '.index.csv'
+
+# How many bytes to fetch from the end of a remote zip archive when opening it (holds the end of central directory
+# record, and the whole central directory of most archives), and how many more bytes than the central directory lists
+# to fetch for a member's local header (its extra field can be longer than the one in the central directory)
+REMOTE_ZIP_TAIL_SIZE: int = 1024 * 1024
+REMOTE_ZIP_HEADER_SLACK: int = 1024
+
+# The number of members of a remote zip archive to fetch at the same time
+DEFAULT_REMOTE_WORKERS: int = 8
+
+# The number of processes to extract (and check the CRCs of) zip archives with, and the fewest members a zip archive
+# must have to be worth splitting between processes
+DEFAULT_EXTRACT_WORKERS: int = 1
+PARALLEL_EXTRACT_MIN_MEMBERS: int = 64
+
+# The journal of a segmented download, stored next to the .part file (e.g. 'archive.tar.part.segments')
+SEGMENT_JOURNAL_SUFFIX = '.segments'
+
+# The checksums of each chunk of a download streamed to a .part file, stored next to the .part file (e.g.
+# 'archive.tar.part.chunks'), the size of each chunk in bytes, and how many chunks at the end of the .part file to check
+# before resuming the download (the chunks written last are the ones a dropped connection or a sync can damage)
+CHUNK_JOURNAL_SUFFIX = '.chunks'
+CHUNK_JOURNAL_CHUNK_SIZE: int = 16 * 1024 * 1024
+RESUME_VERIFY_CHUNKS: int = 4
+
+# How many times to try downloading an archive before giving up on it, the amount of seconds to wait after the first
+# failed attempt (doubled after every attempt that fails) and the most seconds to wait between attempts
+DEFAULT_DOWNLOAD_ATTEMPTS: int = 8
+DOWNLOAD_RETRY_DELAY: int = 10
+DOWNLOAD_RETRY_MAX_DELAY: int = 600
+
+# How many times to ask for the size of an archive before giving up, and the amount of seconds to wait after the first
+# failed attempt
+PROBE_ATTEMPTS: int = 3
+PROBE_RETRY_DELAY: float = 1
+
+# The largest part (0 to 1) of each wait between attempts that is randomly taken off, so that requests that failed at
+# the same time do not all try again at the same time
+RETRY_JITTER: float = 0.5
+
+# The number of requests to a host that have to fail in a row (could not connect, timed out, or got a server error)
+# before no more requests are sent to it, and the amount of seconds until requests are sent to it again
+CIRCUIT_BREAKER_FAILURES: int = 5
+CIRCUIT_BREAKER_COOLDOWN: float = 60
+
+# The engines that can be used to download archives: a pool of threads using `requests` or a single asyncio event loop
+DOWNLOAD_BACKEND_THREADS = 'threads'
+DOWNLOAD_BACKEND_ASYNCIO = 'asyncio'
+DOWNLOAD_BACKENDS = (DOWNLOAD_BACKEND_THREADS, DOWNLOAD_BACKEND_ASYNCIO)
+DEFAULT_DOWNLOAD_BACKEND = DOWNLOAD_BACKEND_THREADS
+
+# The number of requests asking for the size of archives (HEAD requests) to have open at the same time, and the amount
+# of seconds to wait for each one to be answered
+DEFAULT_PROBE_CONCURRENCY: int = 16
+DEFAULT_PROBE_TIMEOUT: float = 15
+
+# The number of storm pages to search for archives (and probe the sizes of) at the same time
+DEFAULT_CRAWL_WORKERS: int = 8
+
+# Settings for the HTTP session shared by the whole process: the most connections kept open to each host, the seconds to
+# wait for a connection and for more data, and how many times to retry a failed connection or server error
+DEFAULT_POOL_SIZE: int = 32
+DEFAULT_CONNECT_TIMEOUT: float = 15
+DEFAULT_READ_TIMEOUT: float = 60
+DEFAULT_REQUEST_RETRIES: int = 3
+
 URL_BASE = 'https://storms.ngs.noaa.gov/'
 URL_STORMS = URL_BASE + 'storms/'
 
+# The longest a link on a page can be in characters (used when searching pages piece by piece as they download)
+LINK_MAX_LENGTH: int = 2048
+
+# The ids of storms whose pages are known to list their archives with JavaScript, so the pages have to be rendered in a
+# headless browser (slow) instead of being read over plain HTTP
+STORMS_REQUIRE_RENDER = set()
+
 # Matches reference link to each storm (HTML)
 # Groups: <storm_url>, <storm_id>, <storm_title>, <storm_year>
 URL_STORMS_REGEX_PATTERN_INDEX = '<a href=\"(.+/storms/([^/]+)/.*?index\\.html)\">([^\\(]+)\\(([^\\)]+)\\)</a>'
@@ -43,3 +154,13 @@ DEFAULT_FIELDS = {'file', 'storm_id', 'archive', 'image',
                   'date', 'size', 'geom_checksum',
                   'll_lat', 'll_lon', 'lr_lat', 'lr_lon',
                   'ul_lat', 'ul_lon', 'ur_lat', 'ur_lon'}
+
+# The number of directories to read at the same time when searching for images (listing a directory on a network drive
+# is slow, and most of that time is spent waiting)
+DEFAULT_SCAN_WORKERS: int = 8
+
+# The number of processes to read and parse .geom files with when assembling a catalog (1 to do it all in this process)
+DEFAULT_CATALOG_WORKERS: int = 1
+
+# The number of images whose .geom files are handed to a process at a time when cataloging with several processes
+CATALOG_BATCH_SIZE: int = 256
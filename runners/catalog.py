@@ -5,6 +5,9 @@ from os import getcwd
 from typing import Set
 
 from psicollect.cataloging.make_catalog import Cataloging, CatalogNoEntriesException, PathParsingException
+from psicollect.cataloging.sources import ArchiveSource
+from psicollect.collector.connection_handler import ConnectionHandler
+from psicollect.collector.storm import crawl_storms
 from psicollect.common import s, h
 
 ################################################
@@ -25,6 +28,23 @@ parser.add_argument('--fields', '-f', type=Set, default=s.DEFAULT_FIELDS.copy(),
                          'optional fields "size" and "date" for the size of the image and the date taken respectively '
                          '(Default: %(default)s).')
 
+parser.add_argument('--archives', action='store_true', default=False,
+                    help='If included, the images inside of the downloaded archives (.tar and .zip) are cataloged '
+                         'without extracting them (Default: %(default)s).')
+
+parser.add_argument('--remote', metavar='STORM',
+                    help='Catalog the zip archives of every storm matching this term or regular expression straight '
+                         'from the website, without downloading them (only the .geom files are fetched). Images are '
+                         'listed with the paths they will have once downloaded to ' + s.ARCHIVE_CACHE_PATH + '.')
+
+parser.add_argument('--remote_workers', type=int, default=s.DEFAULT_REMOTE_WORKERS,
+                    help='The number of .geom files to fetch from the website at the same time with --remote '
+                         '(Default: %(default)s).')
+
+parser.add_argument('--workers', type=int, default=s.DEFAULT_CATALOG_WORKERS,
+                    help='The number of processes to read the .geom files with, handing each one batches of '
+                         'images (Default: %(default)s).')
+
 parser.add_argument('--debug', '-d', action='store_true', default=s.DEFAULT_DEBUG,
                     help='If included, the program will print info throughout the process (Default: %(default)s).')
 
@@ -40,20 +60,44 @@ parser.add_argument('--verbosity', '-v', type=int, default=s.DEFAULT_VERBOSITY,
 # Add custom OPTIONS to the script when running command-line
 OPTIONS: argparse.Namespace = parser.parse_args()
 
-try:
-    Cataloging.generate_index_from_scope(scope_path=OPTIONS.path,
-                                         file_extension=OPTIONS.extension,
-                                         fields_needed=OPTIONS.fields,
-                                         debug=OPTIONS.debug,
-                                         verbosity=OPTIONS.verbosity)
+# A process of a pool started with 'spawn' (see `Cataloging._read_geom_fields_parallel`) imports this script again
+# under the name '__mp_main__', and must not start cataloging again itself
+if __name__ != '__mp_main__':
+
+    try:
+        if OPTIONS.remote is not None:
+            storms = ConnectionHandler().get_storm_list(OPTIONS.remote)
+
+            if len(storms) == 0:
+                h.print_error('No storms matched the expression provided for --remote: "' + OPTIONS.remote + '"')
+                exit(1)
+
+            for storm in crawl_storms(storms):
+                Cataloging.generate_index_from_website(storm=storm,
+                                                       workers=OPTIONS.remote_workers,
+                                                       file_extension=OPTIONS.extension,
+                                                       fields_needed=OPTIONS.fields,
+                                                       geom_workers=OPTIONS.workers,
+                                                       debug=OPTIONS.debug,
+                                                       verbosity=OPTIONS.verbosity)
+
+        else:
+            Cataloging.generate_index_from_scope(scope_path=OPTIONS.path,
+                                                 file_extension=OPTIONS.extension,
+                                                 fields_needed=OPTIONS.fields,
+                                                 source=(ArchiveSource(scope_path=OPTIONS.path) if OPTIONS.archives
+                                                         else None),
+                                                 geom_workers=OPTIONS.workers,
+                                                 debug=OPTIONS.debug,
+                                                 verbosity=OPTIONS.verbosity)
 
-    # Return that cataloging was successful
-    exit(0)
+        # Return that cataloging was successful
+        exit(0)
 
-except (CatalogNoEntriesException, PathParsingException) as e:
-    h.print_error('\n' + str(e))
-except KeyboardInterrupt:
-    h.print_error('\nCataloging was prematurely ended.')
+    except (CatalogNoEntriesException, PathParsingException) as e:
+        h.print_error('\n' + str(e))
+    except KeyboardInterrupt:
+        h.print_error('\nCataloging was prematurely ended.')
 
-# If there was an exception return code 1 (error)
-exit(1)
+    # If there was an exception return code 1 (error)
+    exit(1)
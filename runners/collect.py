@@ -3,17 +3,22 @@
 import argparse
 import getpass
 import os
-import time
 from datetime import datetime
 from math import floor
-from typing import List, Union
-
-from requests.exceptions import RequestException
+from typing import Iterable, List, Tuple, Union
 
+from psicollect.cataloging.make_catalog import Cataloging
 from psicollect.collector.archive import Archive
 from psicollect.collector.connection_handler import ConnectionHandler
-from psicollect.collector.locking import get_lock_info, is_locked_by_another_user
-from psicollect.collector.storm import Storm
+from psicollect.collector.locking import get_lock_info
+from psicollect.collector.downloader import AsyncDownloader, Downloader, ThreadedDownloader
+from psicollect.collector.http_cache import configure_cache
+from psicollect.collector.pipeline import MemberFilter
+from psicollect.collector.retry import configure_retry
+from psicollect.collector.segmented import get_segmented_progress
+from psicollect.collector.selection import BoundingBox, fetch_selected
+from psicollect.collector.session import configure_session
+from psicollect.collector.storm import Storm, crawl_storms
 from psicollect.common import h, s
 
 DATA_PATH: Union[bytes, str] = os.path.abspath(s.DATA_PATH)
@@ -42,9 +47,111 @@ parser.add_argument('--user', '-u', default=getpass.getuser(),
                     help='The current user downloading the file (Default: %(default)s).')
 
 parser.add_argument('--download', '-d', action='store_true',
-                    help='If included, the program will automatically download all files found, sequentially '
+                    help='If included, the program will automatically download all files found, several at a time '
+                         '(see --jobs) (Default: %(default)s).')
+
+parser.add_argument('--render', '-r', action='store_true',
+                    help='If included, each storm\'s page is rendered in a headless browser (runs its JavaScript) '
+                         'before searching it for archive files. Much slower, only needed if a page builds its list of '
+                         'archives with JavaScript (Default: %(default)s).')
+
+parser.add_argument('--jobs', '-j', type=int, default=s.DEFAULT_DOWNLOAD_JOBS,
+                    help='The number of archive files to download at the same time (Default: %(default)s).')
+
+parser.add_argument('--jobs_per_host', type=int, default=s.DEFAULT_DOWNLOAD_JOBS_PER_HOST,
+                    help='The most archive files to download at the same time from any single website '
+                         '(Default: %(default)s).')
+
+parser.add_argument('--backend', '-b', choices=s.DOWNLOAD_BACKENDS, default=s.DEFAULT_DOWNLOAD_BACKEND,
+                    help='The engine used to download archive files: a pool of threads or a single asyncio event loop '
+                         '(requires aiohttp, uses less memory on small machines) (Default: %(default)s).')
+
+parser.add_argument('--segments', type=int, default=s.DEFAULT_DOWNLOAD_SEGMENTS,
+                    help='The number of byte ranges to split each archive file into and download at the same time. '
+                         'Useful for very large archives. Only used by the threads backend (Default: %(default)s).')
+
+parser.add_argument('--stream_extract', action='store_true',
+                    help='If included, tar archive files are extracted while they download instead of afterwards, so '
+                         'the first images are ready sooner and the archive is not read again. Only used by the threads '
+                         'backend without --segments (Default: %(default)s).')
+
+parser.add_argument('--extract_workers', type=int, default=s.DEFAULT_EXTRACT_WORKERS,
+                    help='The number of processes to extract (and check) each zip archive file with once it is '
+                         'downloaded, e.g. the number of cores (Default: %(default)s).')
+
+parser.add_argument('--include', action='append',
+                    help='Only extract the files inside of each archive whose path matches this glob (e.g. '
+                         '"20180915a_jpgs/jpgs/*"). Can be given more than once (Default: all files).')
+
+parser.add_argument('--include_re',
+                    help='Only extract the files inside of each archive whose path matches this regular expression '
+                         '(Default: all files).')
+
+parser.add_argument('--extensions',
+                    help='Only extract the files inside of each archive with one of these comma-separated file '
+                         'extensions (e.g. "jpg,geom") (Default: all files).')
+
+parser.add_argument('--probe_concurrency', type=int, default=s.DEFAULT_PROBE_CONCURRENCY,
+                    help='The number of archive file sizes to ask the website for at the same time '
+                         '(Default: %(default)s).')
+
+parser.add_argument('--crawl_workers', type=int, default=s.DEFAULT_CRAWL_WORKERS,
+                    help='The number of storm pages to search for archive files at the same time '
+                         '(Default: %(default)s).')
+
+parser.add_argument('--attempts', type=int, default=s.DEFAULT_DOWNLOAD_ATTEMPTS,
+                    help='The number of times to try downloading each archive file before giving up on it '
+                         '(Default: %(default)s).')
+
+parser.add_argument('--retry_delay', type=float, default=s.DOWNLOAD_RETRY_DELAY,
+                    help='The number of seconds to wait after a download fails the first time, doubled after every '
+                         'attempt that fails (up to ' + str(s.DOWNLOAD_RETRY_MAX_DELAY) + ' seconds) '
+                         '(Default: %(default)s).')
+
+parser.add_argument('--connect_timeout', type=float, default=s.DEFAULT_CONNECT_TIMEOUT,
+                    help='The number of seconds to wait for a connection to the website (Default: %(default)s).')
+
+parser.add_argument('--read_timeout', type=float, default=s.DEFAULT_READ_TIMEOUT,
+                    help='The number of seconds to wait for more data from the website before trying again '
+                         '(Default: %(default)s).')
+
+parser.add_argument('--ordered', action='store_true',
+                    help='If included, the status report waits until the archive files of every storm are found and '
+                         'then prints the storms in order, instead of printing each storm as soon as it is ready '
+                         '(Default: %(default)s).')
+
+parser.add_argument('--refresh', action='store_true',
+                    help='If included, every cached page and archive file size is checked with the website again '
+                         '(only changed ones are downloaded again) (Default: %(default)s).')
+
+parser.add_argument('--no_cache', action='store_true',
+                    help='If included, pages and archive file sizes are neither read from nor saved to the cache in '
+                         + s.HTTP_CACHE_PATH + ' (Default: %(default)s).')
+
+parser.add_argument('--catalog', action='store_true',
+                    help='If included, the zip archive files found are cataloged straight from the website without '
+                         'downloading them (only the .geom file of each image is fetched). The catalog lists the paths '
+                         'the images will have once downloaded to --path (Default: %(default)s).')
+
+parser.add_argument('--fetch', action='store_true',
+                    help='If included, only the files inside of zip archive files on the website that are picked by '
+                         '--include, --include_re, --extensions, --images and --bbox are downloaded (to where they '
+                         'would be if the whole archive was downloaded and extracted), instead of whole archive files '
                          '(Default: %(default)s).')
 
+parser.add_argument('--images',
+                    help='With --fetch, only download these comma-separated images (e.g. "C25870213,C25870216"), along '
+                         'with their .geom files (Default: all images).')
+
+parser.add_argument('--bbox',
+                    help='With --fetch, only download the images whose footprint overlaps this area, given as '
+                         '"min_lon,min_lat,max_lon,max_lat" (e.g. "-75.7,35.7,-75.5,35.9"). Only the .geom files are '
+                         'fetched to find out (Default: everywhere).')
+
+parser.add_argument('--remote_workers', type=int, default=s.DEFAULT_REMOTE_WORKERS,
+                    help='The number of files to fetch from inside of zip archive files on the website at the same '
+                         'time (Default: %(default)s).')
+
 parser.add_argument('--no_status', '-n', action='store_true',
                     help='If included, the program will generate no status report (useful for downloading files '
                          'immediately, without waiting on a report to print) (Default: %(default)s).')
@@ -59,199 +166,274 @@ OPTIONS: argparse.Namespace = parser.parse_args()
 # Clean up path input and validate it
 DOWNLOAD_PATH = h.validate_and_expand_path(OPTIONS.path)
 
-c = ConnectionHandler()
 
-storms: List[Storm] = c.get_storm_list(OPTIONS.storm)
+def print_storm_report(storm_number: int, storm: Storm) -> Tuple[int, int]:
+    """Print the status of every archive of a storm (its archive list must already be found to print right away)
 
-if len(storms) == 0:  # pragma: no cover
-    h.print_error('No storms matched the expression provided for --storm / -s: "' + OPTIONS.storm + '"')
-    exit(1)
+    :param storm_number: The number to show next to the storm (its place in the list of storms)
+    :param storm: The storm to report on
+    :returns: The number of bytes downloaded and the total number of bytes of all of the storm's archives
+    """
+    stat_storm_archive_size: int = 0  # Running total of bytes downloaded (by storm)
+    stat_storm_archive_downloaded: int = 0  # Running total of bytes downloaded (by storm)
+    archive_list: List[Archive] = storm.get_archive_list(OPTIONS.archive)  # All archives for each storm
 
-# Only display status report if user requests it, otherwise just start downloads
-if OPTIONS.no_status is False:
+    # Output storm number, name, and year
+    print(str(storm_number) + '.  \t' + str(storm))
 
-    storm_number: int = 1  # Displayed number associates with storm list
-    stat_total_archive_size: int = 0  # Running total of bytes on website
-    stat_total_archive_downloaded: int = 0  # Running total of bytes downloaded (all local archive files)
+    # Display archive file statistics if any archives are found
+    if len(archive_list) > 0:
+        for archive in archive_list:
 
-    ############################################
-    # Print out a report of what is downloaded #
-    ############################################
+            # The path of the archive file including the file suffix
+            archive_file_path = os.path.join(os.path.join(DOWNLOAD_PATH, storm.storm_id.title()),
+                                             str(archive.name) + archive.get_ext())
 
-    print('Download Status Report (' + datetime.now().strftime(s.FORMAT_TIME) + ') <-s ' + OPTIONS.storm +
-          ' -t ' + OPTIONS.archive + ' -p ' + OPTIONS.path + '>\n')
+            total_size: int or None = None  # Size of the archive file in bytes
 
-    for storm in storms:
-        stat_storm_archive_size: int = 0  # Running total of bytes downloaded (by storm)
-        stat_storm_archive_downloaded: int = 0  # Running total of bytes downloaded (by storm)
-        archive_list: List[Archive] = storm.get_archive_list(OPTIONS.archive)  # All archives for each storm
+            # Create an appending string to print statuses next to archive info
+            exists_str: str = ''
 
-        # Output storm number, name, and year
-        print(str(storm_number) + '.  \t' + str(storm))
+            ###############################################
+            # The fully downloaded file is being uploaded #
+            ###############################################
 
-        # Display archive file statistics if any archives are found
-        if len(archive_list) > 0:
-            for archive in archive_list:
+            if os.path.exists(archive_file_path + s.LOCK_SUFFIX):
 
-                # The path of the archive file including the file suffix
-                archive_file_path = os.path.join(os.path.join(DOWNLOAD_PATH, storm.storm_id.title()),
-                                                 str(archive.name) + archive.get_ext())
+                lock_info = get_lock_info(base_file=archive_file_path)
+                user: str = lock_info['user']
+                total_size = lock_info[s.LOCK_TOTAL_SIZE_BYTES_FIELD]
 
-                total_size: int or None = None  # Size of the archive file in bytes
+                # Resort to querying the website if the total size cannot be determined locally
+                if type(total_size) is not int:
+                    total_size = archive.get_file_size_origin()
 
-                # Create an appending string to print statuses next to archive info
-                exists_str: str = ''
+                if user == OPTIONS.user:
+                    exists_str += 'Fully downloaded: ' + h.to_readable_bytes(total_size)
+                else:
+                    exists_str += 'Fully downloaded (' + user + '): ' + h.to_readable_bytes(total_size)
 
-                ###############################################
-                # The fully downloaded file is being uploaded #
-                ###############################################
+                if type(total_size) is int:
+                    stat_storm_archive_downloaded += total_size
 
-                if os.path.exists(archive_file_path + s.LOCK_SUFFIX):
+            #########################################
+            # The fully downloaded file is uploaded #
+            #########################################
 
-                    lock_info = get_lock_info(base_file=archive_file_path)
-                    user: str = lock_info['user']
-                    total_size = lock_info[s.LOCK_TOTAL_SIZE_BYTES_FIELD]
+            elif os.path.exists(archive_file_path):
+                total_size = os.path.getsize(archive_file_path)
+                exists_str += 'Fully downloaded: ' + h.to_readable_bytes(total_size)
 
-                    # Resort to querying the website if the total size cannot be determined locally
-                    if type(total_size) is not int:
-                        total_size = archive.get_file_size_origin()
+                stat_storm_archive_downloaded += total_size
 
-                    if user == OPTIONS.user:
-                        exists_str += 'Fully downloaded: ' + h.to_readable_bytes(total_size)
-                    else:
-                        exists_str += 'Fully downloaded (' + user + '): ' + h.to_readable_bytes(total_size)
+            ####################################################################
+            # A download for the archive file has been started by another user #
+            ####################################################################
 
-                    if type(total_size) is int:
-                        stat_total_archive_downloaded += total_size
-                        stat_storm_archive_downloaded += total_size
+            elif os.path.exists(archive_file_path + s.PART_SUFFIX + s.LOCK_SUFFIX):
 
-                #########################################
-                # The fully downloaded file is uploaded #
-                #########################################
+                # Get the status of the file being downloaded elsewhere
+                lock_info = get_lock_info(base_file=archive_file_path + s.PART_SUFFIX)
 
-                elif os.path.exists(archive_file_path):
-                    total_size = os.path.getsize(archive_file_path)
-                    exists_str += 'Fully downloaded: ' + h.to_readable_bytes(total_size)
+                last_modified = os.path.getmtime(archive_file_path + s.PART_SUFFIX + s.LOCK_SUFFIX)
+                total_size = lock_info[s.LOCK_TOTAL_SIZE_BYTES_FIELD]  # The number of total bytes to download
+                partial_size: int = lock_info[s.LOCK_PART_SIZE_BYTES_FIELD]  # The # of bytes downloaded so far
+                user: str = lock_info['user']  # The account that started the download (created the lock)
 
-                    stat_total_archive_downloaded += total_size
-                    stat_storm_archive_downloaded += total_size
+                """Add information about who initiated the lock, how much is downloaded so far,
+                and when the lock information was last updated (does not update immediately)"""
 
-                ####################################################################
-                # A download for the archive file has been started by another user #
-                ####################################################################
+                exists_str += 'Partially downloaded (' + user + '): ' + h.to_readable_bytes(partial_size) + \
+                              '  ... Last Update: ' + datetime.fromtimestamp(last_modified).strftime(s.FORMAT_TIME)
 
-                elif os.path.exists(archive_file_path + s.PART_SUFFIX + s.LOCK_SUFFIX):
+                if type(partial_size) is int:
+                    stat_storm_archive_downloaded += partial_size
 
-                    # Get the status of the file being downloaded elsewhere
-                    lock_info = get_lock_info(base_file=archive_file_path + s.PART_SUFFIX)
+            #################################################
+            # Part file exists without any lock association #
+            #################################################
 
-                    last_modified = os.path.getmtime(archive_file_path + s.PART_SUFFIX + s.LOCK_SUFFIX)
-                    total_size = lock_info[s.LOCK_TOTAL_SIZE_BYTES_FIELD]  # The number of total bytes to download
-                    partial_size: int = lock_info[s.LOCK_PART_SIZE_BYTES_FIELD]  # The # of bytes downloaded so far
-                    user: str = lock_info['user']  # The account that started the download (created the lock)
+            elif os.path.exists(archive_file_path + s.PART_SUFFIX):
 
-                    """Add information about who initiated the lock, how much is downloaded so far,
-                    and when the lock information was last updated (does not update immediately)"""
+                # Segmented downloads create the .part file at full size, so read their progress from the journal
+                partial_size: int = get_segmented_progress(archive_file_path + s.PART_SUFFIX)
 
-                    exists_str += 'Partially downloaded (' + user + '): ' + h.to_readable_bytes(partial_size) + \
-                                  '  ... Last Update: ' + datetime.fromtimestamp(last_modified).strftime(s.FORMAT_TIME)
+                if partial_size is None:
+                    partial_size = os.path.getsize(archive_file_path + s.PART_SUFFIX)
 
-                    if type(partial_size) is int:
-                        stat_total_archive_downloaded += partial_size
-                        stat_storm_archive_downloaded += partial_size
+                exists_str += 'Partially downloaded: ' + h.to_readable_bytes(partial_size)
 
-                #################################################
-                # Part file exists without any lock association #
-                #################################################
+                stat_storm_archive_downloaded += partial_size
 
-                elif os.path.exists(archive_file_path + s.PART_SUFFIX):
-                    exists_str += 'Partially downloaded: ' + \
-                                  h.to_readable_bytes(os.path.getsize(archive_file_path + s.PART_SUFFIX))
+            ###################################################################
+            # No fully or partially downloaded file exists or has a lock file #
+            ###################################################################
 
-                    stat_total_archive_downloaded += os.path.getsize(archive_file_path + s.PART_SUFFIX)
-                    stat_storm_archive_downloaded += os.path.getsize(archive_file_path + s.PART_SUFFIX)
+            else:
+                exists_str += 'Not downloaded.'
 
-                ###################################################################
-                # No fully or partially downloaded file exists or has a lock file #
-                ###################################################################
+            print('\t-', archive, ' ...', h.to_readable_bytes(archive.get_file_size_origin()),
+                  ' ...', exists_str)
 
-                else:
-                    exists_str += 'Not downloaded.'
+            # Resort to querying the website if the total size cannot be determined locally
+            if type(total_size) is not int:
+                total_size = archive.get_file_size_origin()
 
-                print('\t-', archive, ' ...', h.to_readable_bytes(archive.get_file_size_origin()),
-                      ' ...', exists_str)
+            stat_storm_archive_size += total_size
 
-                # Resort to querying the website if the total size cannot be determined locally
-                if type(total_size) is not int:
-                    total_size = archive.get_file_size_origin()
+        print('\tTotal:', h.to_readable_bytes(stat_storm_archive_downloaded), '/',
+              h.to_readable_bytes(stat_storm_archive_size),
+              ' (' + str(floor((stat_storm_archive_downloaded / stat_storm_archive_size) * 100)) + '%)')
 
-                stat_total_archive_size += total_size
-                stat_storm_archive_size += total_size
+    else:
+        if storm.storm_id == 'redriver':
+            # North Dakota Flooding (2011) does not provide an archive, only listed with "Contact for download info"
+            print('\t' * 2 + '<No archive provided. Contact NOAA for questions>')
+        else:
+            print('\t' * 2 + '<No archive files detected>')
 
-            print('\tTotal:', h.to_readable_bytes(stat_storm_archive_downloaded), '/',
-                  h.to_readable_bytes(stat_storm_archive_size),
-                  ' (' + str(floor((stat_storm_archive_downloaded / stat_storm_archive_size) * 100)) + '%)')
+    print()
 
-        else:
-            if storm.storm_id == 'redriver':
-                # North Dakota Flooding (2011) does not provide an archive, only listed with "Contact for download info"
-                print('\t' * 2 + '<No archive provided. Contact NOAA for questions>')
-            else:
-                print('\t' * 2 + '<No archive files detected>')
+    return stat_storm_archive_downloaded, stat_storm_archive_size
 
-        print()
-        storm_number += 1
 
-    if stat_total_archive_size > 0:
-        print('Total:', h.to_readable_bytes(stat_total_archive_downloaded), '/',
-              h.to_readable_bytes(stat_total_archive_size),
-              ' (' + str(floor((stat_total_archive_downloaded / stat_total_archive_size) * 100)) + '%)')
+# A process of a pool started with 'spawn' (see `pipeline.process_zip_parallel`) imports this script again under the
+# name '__mp_main__', and must not start collecting again itself
+if __name__ != '__mp_main__':
 
-################################################
-# Start the actual collection of archive files #
-################################################
+    # Cache pages and archive sizes so that later runs (and runs without a connection) do not have to ask for them again
+    configure_cache(enabled=OPTIONS.no_cache is False, refresh=OPTIONS.refresh)
+
+    # Give every request the timeouts asked for, and every download the attempts asked for
+    configure_session(connect_timeout=OPTIONS.connect_timeout, read_timeout=OPTIONS.read_timeout)
+    configure_retry(attempts=OPTIONS.attempts, base_delay=OPTIONS.retry_delay)
+
+    c = ConnectionHandler()
+
+    storms: List[Storm] = c.get_storm_list(OPTIONS.storm)
+
+    if len(storms) == 0:  # pragma: no cover
+        h.print_error('No storms matched the expression provided for --storm / -s: "' + OPTIONS.storm + '"')
+        exit(1)
 
-if OPTIONS.download:
     for storm in storms:
-        for archive in storm.get_archive_list(OPTIONS.archive):
-            download_incomplete: bool = True  # Turns to 'False' when the file is downloaded successfully
+        storm.probe_concurrency = OPTIONS.probe_concurrency
+
+        if OPTIONS.render:
+            storm.render = True
+
+    # Only display status report if user requests it, otherwise just start downloads
+    if OPTIONS.no_status is False:
+
+        stat_total_archive_size: int = 0  # Running total of bytes on website
+        stat_total_archive_downloaded: int = 0  # Running total of bytes downloaded (all local archive files)
+
+        ############################################
+        # Print out a report of what is downloaded #
+        ############################################
+
+        print('Download Status Report (' + datetime.now().strftime(s.FORMAT_TIME) + ') <-s ' + OPTIONS.storm +
+              ' -t ' + OPTIONS.archive + ' -p ' + OPTIONS.path + '>\n')
+
+        # Find the archives of every storm at the same time, printing each storm as soon as its archives are found
+        # (or in order once all of them are found)
+        storm_numbers = {storm: number for number, storm in enumerate(storms, start=1)}
+        crawled_storms: Iterable[Storm] = crawl_storms(storms, search_re=OPTIONS.archive, workers=OPTIONS.crawl_workers)
+
+        if OPTIONS.ordered:
+            crawled_storms = sorted(crawled_storms, key=storm_numbers.get)
+
+        for storm in crawled_storms:
+            storm_archive_downloaded, storm_archive_size = print_storm_report(storm_numbers[storm], storm)
 
-            # Save the archive to a directory based on the storm's ID (normalize the path to avoid errors)
-            save_path: Union[bytes, str] = os.path.join(DOWNLOAD_PATH, storm.storm_id.title())
+            stat_total_archive_downloaded += storm_archive_downloaded
+            stat_total_archive_size += storm_archive_size
 
-            # Repeatedly try to download the archive until it completes successfully
-            while download_incomplete:
-                try:
-                    lock_info_part = get_lock_info(
-                        base_file=os.path.join(save_path, str(archive.name) + archive.get_ext() + s.PART_SUFFIX))
+        if stat_total_archive_size > 0:
+            print('Total:', h.to_readable_bytes(stat_total_archive_downloaded), '/',
+                  h.to_readable_bytes(stat_total_archive_size),
+                  ' (' + str(floor((stat_total_archive_downloaded / stat_total_archive_size) * 100)) + '%)')
 
-                    if OPTIONS.overwrite is False and is_locked_by_another_user(
-                            base_file=str(archive.name) + archive.get_ext(), this_user=OPTIONS.user):
+    # Only extract (or fetch) the files inside of each archive that are needed (if asked to)
+    member_filter: MemberFilter or None = MemberFilter(include=OPTIONS.include, include_re=OPTIONS.include_re,
+                                                       extensions=OPTIONS.extensions.split(',')
+                                                       if OPTIONS.extensions else None)
 
-                        print('Another user has fully downloaded ' + archive.name + archive.get_ext() +
-                              '!  ... Skipping')
-                        download_incomplete = False
+    if member_filter.is_empty():
+        member_filter = None
 
-                    elif OPTIONS.overwrite or lock_info_part['user'] is None or OPTIONS.user == lock_info_part['user']:
+    ###########################################################
+    # Catalog the archive files on the website (if asked to)  #
+    ###########################################################
 
-                        archive.download_url(output_dir=save_path, user=OPTIONS.user, overwrite=OPTIONS.overwrite)
-                        download_incomplete = False
+    if OPTIONS.catalog:
 
-                    else:
-                        print('Another user is in the process of downloading ' + archive.name + archive.get_ext() +
-                              '!  ... Skipping')
-                        download_incomplete = False
+        # Find the archives of every storm at the same time (already done if the status report was printed)
+        for storm in crawl_storms(storms, search_re=OPTIONS.archive, workers=OPTIONS.crawl_workers):
+            Cataloging.generate_index_from_website(storm=storm, download_path=DOWNLOAD_PATH, search_re=OPTIONS.archive,
+                                                   workers=OPTIONS.remote_workers)
 
-                except ConnectionError as e:
-                    h.print_error('The download ran into a connection error: ' + str(e))
-                except RequestException as e:
-                    h.print_error('Something went wrong with reading the data transmitted. Error: ' + str(e))
+    ##############################################################
+    # Fetch only the files needed from the website (if asked to) #
+    ##############################################################
 
-                if download_incomplete:
-                    h.print_error('Will retry download in 10 seconds...')
-                    time.sleep(10)
+    if OPTIONS.fetch:
+        bbox: BoundingBox or None = BoundingBox.parse(OPTIONS.bbox) if OPTIONS.bbox else None
+        image_ids: List[str] or None = OPTIONS.images.split(',') if OPTIONS.images else None
+
+        for storm in crawl_storms(storms, search_re=OPTIONS.archive, workers=OPTIONS.crawl_workers):
+            for archive in storm.get_archive_list(OPTIONS.archive):
+
+                if not archive.is_zip():
+                    h.print_error('Skipping ' + archive.name + archive.get_ext() + ', only the files of zip archives '
+                                  'can be fetched from the website (use --download for the whole archive)')
+                    continue
+
+                # Write the files where they would be if the whole archive was downloaded and extracted
+                fetch_selected(archive.open_remote(),
+                               extract_dir=os.path.join(DOWNLOAD_PATH, storm.storm_id.title(), archive.name),
+                               member_filter=member_filter, image_ids=image_ids, bbox=bbox,
+                               workers=OPTIONS.remote_workers)
+
+    ################################################
+    # Start the actual collection of archive files #
+    ################################################
+
+    if OPTIONS.download:
+        downloader: Downloader
+
+        if OPTIONS.backend == s.DOWNLOAD_BACKEND_ASYNCIO:
+            downloader = AsyncDownloader(user=OPTIONS.user, jobs=OPTIONS.jobs, jobs_per_host=OPTIONS.jobs_per_host,
+                                         overwrite=OPTIONS.overwrite, probe_concurrency=OPTIONS.probe_concurrency,
+                                         timeout=OPTIONS.read_timeout,
+                                         extract_workers=OPTIONS.extract_workers, member_filter=member_filter)
+        else:
+            downloader = ThreadedDownloader(user=OPTIONS.user, jobs=OPTIONS.jobs, jobs_per_host=OPTIONS.jobs_per_host,
+                                            overwrite=OPTIONS.overwrite, segments=OPTIONS.segments,
+                                            stream_extract=OPTIONS.stream_extract,
+                                            probe_concurrency=OPTIONS.probe_concurrency,
+                                            extract_workers=OPTIONS.extract_workers, member_filter=member_filter)
+
+        # Find the archives of every storm at the same time (already done if the status report was printed)
+        for _ in crawl_storms(storms, search_re=OPTIONS.archive, workers=OPTIONS.crawl_workers):
+            pass
+
+        # Save each archive to a directory based on the storm's ID (normalize the path to avoid errors)
+        download_queue = [(archive, os.path.join(DOWNLOAD_PATH, storm.storm_id.title()))
+                          for storm in storms for archive in storm.get_archive_list(OPTIONS.archive)]
+
+        # Download all archives, several at a time, retrying each until it completes successfully or runs out of
+        # attempts
+        downloader.download(download_queue)
+
+        if len(downloader.failed) > 0:
+            h.print_error('\nCould not download ' + str(len(downloader.failed)) + ' archive file(s) after ' +
+                          str(OPTIONS.attempts) + ' attempts each: ' +
+                          ', '.join(archive.name + archive.get_ext() for archive in downloader.failed) +
+                          '\nRun the command again later to resume them')
+        else:
+            print('\nDownloaded finished successfully!')
 
-    print('\nDownloaded finished successfully!')
-    print('\nIf you would like to catalog all the archives pertaining to a specific storm, '
-          'please navigate to the appropriate storm\'s directory or use the \'--path\' parameter '
-          'with the cataloging command. See \"' + s.ROOT_CMD + ' catalog -h\" for help!')
+        print('\nIf you would like to catalog all the archives pertaining to a specific storm, '
+              'please navigate to the appropriate storm\'s directory or use the \'--path\' parameter '
+              'with the cataloging command. See \"' + s.ROOT_CMD + ' catalog -h\" for help!')
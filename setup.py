@@ -35,6 +35,9 @@ setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     install_requires=['requests', 'tqdm', 'pandas', 'Pillow', 'imageio'],
+    extras_require={
+        'async': ['aiohttp'],  # The asyncio download backend (pstorm collect --backend asyncio)
+    },
     # package_data={'': ['*.csv']},
     include_package_data=True,
     packages=find_packages(exclude=["*.tests", "*.tests.*", "tests.*", "tests"]),
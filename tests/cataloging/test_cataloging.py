@@ -2,6 +2,7 @@ import os
 from unittest import TestCase
 from unittest.mock import patch
 
+import pandas as pd
 import pytest
 
 from psicollect.cataloging.make_catalog import Cataloging
@@ -54,8 +55,8 @@ class TestCataloging(TestCase):
         with self.subTest(msg='Calculated size of files'):
             assert 'Getting size of file 1 of 2' in str(out)
 
-        with self.subTest(msg='Calculated modify times of files'):
-            assert 'Getting date taken from file 1 of 2' in str(out)
+        with self.subTest(msg='Found the dates of files'):
+            assert 'Getting the dates the images were taken from their paths ... DONE' in str(out)
 
         with self.subTest(msg='Saved to disk'):
             assert 'Saved catalog to disk! Basic data is complete! Moving on to .geom specific data ... ' in str(out)
@@ -87,6 +88,22 @@ class TestCataloging(TestCase):
     def test__get_storm_from_path():
         assert Cataloging._get_storm_from_path(os.path.join(INPUT_PATH, '20180915a_jpgs')) == "Florence"
 
+    @staticmethod
+    def test__get_path_columns():
+        paths = pd.Series([os.path.join(INPUT_PATH, '20180915a_jpgs', 'jpgs', 'C25870213.jpg'),
+                           os.path.join(INPUT_PATH, '20180915a_jpgs', 'jpgs', 'C25870216.jpg'),
+                           os.path.join(INPUT_PATH, 'C0001.jpg')], dtype=object)
+
+        columns = Cataloging._get_path_columns(paths)
+
+        # Parsed once for each directory, the same as parsing the path of each image on its own
+        for i, file_path in enumerate(paths):
+            storm_id = Cataloging._get_storm_from_path(file_path).lower()
+
+            assert columns['storm_id'][i] == storm_id
+            assert columns['archive'][i] == Cataloging._get_archive_from_path(file_path, storm_id=storm_id).lower()
+            assert columns['image'][i] == Cataloging._get_image_from_path(file_path)
+
     # def test__get_best_date(self):
     #     self.fail()
     #
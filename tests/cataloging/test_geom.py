@@ -0,0 +1,35 @@
+import hashlib
+import math
+import os
+from unittest import TestCase
+
+from psicollect.cataloging.geom import parse_geom, read_geom_fields
+from psicollect.common import s
+
+SELF_PATH = os.path.dirname(os.path.abspath(__file__))
+GEOM_PATH = os.path.join(SELF_PATH, 'data', 'input', 'Florence', '20180915a_jpgs', 'jpgs', 'C25870213.geom')
+
+
+class TestGeom(TestCase):
+
+    def test_parse_geom(self):
+        values = parse_geom(b'bore_sight_tx:  21.185\r\nll_lat:  35.8\r\nimage_id:\r\nll_lat:  99\r\nno separator\n')
+
+        # Any line ending is accepted, and the first line of a key wins
+        self.assertEqual({'bore_sight_tx': '21.185', 'll_lat': '35.8', 'image_id': ''}, values)
+
+    def test_read_geom_fields(self):
+        with open(GEOM_PATH, 'rb') as f:
+            content = f.read()
+
+        result, missing = read_geom_fields(content, s.DEFAULT_FIELDS & {'geom_checksum', 'll_lat', 'ur_lon'})
+
+        self.assertEqual(set(), missing)
+        self.assertEqual(hashlib.md5(content).hexdigest(), result['geom_checksum'])
+        self.assertEqual(35.829193780614, result['ll_lat'])
+        self.assertEqual(-75.5937237514863, result['ur_lon'])
+
+        result, missing = read_geom_fields(b'll_lat:  north\n', ['ll_lat', 'll_lon'])
+
+        self.assertTrue(math.isnan(result['ll_lat']))
+        self.assertEqual({'ll_lon'}, missing)
@@ -0,0 +1,195 @@
+import os
+import shutil
+import tarfile
+import zipfile
+from unittest import TestCase
+from unittest.mock import patch
+
+import pandas as pd
+
+from psicollect.cataloging.make_catalog import Cataloging
+from psicollect.cataloging.sources import ArchiveSource, FileSystemSource, RemoteArchiveSource
+from psicollect.collector.archive import Archive
+from psicollect.common import s
+from tests.collector.local_server import LocalServer
+
+SELF_PATH = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(SELF_PATH, 'data')
+INPUT_PATH = os.path.join(DATA_PATH, 'input/Florence/20180915a_jpgs')
+OUTPUT_PATH = os.path.join(DATA_PATH, 'output_sources')
+
+# The same storm, once as extracted files and once as the downloaded archive
+EXTRACTED_PATH = os.path.join(OUTPUT_PATH, 'extracted', 'Florence')
+ARCHIVES_PATH = os.path.join(OUTPUT_PATH, 'archives', 'Florence')
+
+
+class TestSources(TestCase):
+
+    def setUp(self) -> None:
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
+
+        shutil.copytree(INPUT_PATH, os.path.join(EXTRACTED_PATH, '20180915a_jpgs'))
+        os.makedirs(ARCHIVES_PATH)
+
+        with tarfile.open(os.path.join(ARCHIVES_PATH, '20180915a_jpgs.tar'), 'w') as tar:
+            tar.add(os.path.join(INPUT_PATH, 'jpgs'), arcname='jpgs')
+
+    def test_list_files(self):
+        fs_source = FileSystemSource(EXTRACTED_PATH)
+        archive_source = ArchiveSource(ARCHIVES_PATH)
+
+        for require_geom in (False, True):
+            files = fs_source.list_files(require_geom=require_geom)
+
+            self.assertEqual(sorted(files), sorted(archive_source.list_files(require_geom=require_geom)))
+
+            for file in files:
+                self.assertEqual(fs_source.get_size(file), archive_source.get_size(file))
+                self.assertEqual(fs_source.read_geom(file), archive_source.read_geom(file))
+                self.assertEqual(fs_source.get_path(file).replace(EXTRACTED_PATH, ''),
+                                 archive_source.get_path(file).replace(ARCHIVES_PATH, ''))
+
+        archive_source.close()
+
+    def test_zip_source(self):
+        with zipfile.ZipFile(os.path.join(ARCHIVES_PATH, '20180916a_jpgs.zip'), 'w') as zf:
+            zf.writestr('jpgs/C0001.jpg', b'\xff\xd8' * 100)
+            zf.writestr('jpgs/C0001.geom', b'll_lat:  34.5\r\nll_lon:  -77.9\r\n')
+
+        source = ArchiveSource(ARCHIVES_PATH)
+
+        try:
+            self.assertIn('20180916a_jpgs/jpgs/C0001.jpg', source.list_files())
+            self.assertEqual(200, source.get_size('20180916a_jpgs/jpgs/C0001.jpg'))
+
+            # Windows line endings are read the same way as from a file opened in text mode
+            self.assertEqual('34.5', Cataloging._parse_geom_fields(
+                field_id_set='ll_lat', content=source.read_geom('20180916a_jpgs/jpgs/C0001.jpg'),
+                file_path=source.get_path('20180916a_jpgs/jpgs/C0001.jpg')))
+        finally:
+            source.close()
+
+    def test_same_catalog(self):
+        catalogs = dict()
+
+        for name, scope_path, source in (('extracted', EXTRACTED_PATH, None),
+                                         ('archives', ARCHIVES_PATH, ArchiveSource(ARCHIVES_PATH))):
+            catalog_path = os.path.join(OUTPUT_PATH, name + '.csv')
+
+            with patch.object(Cataloging, 'get_catalog_path', return_value=catalog_path):
+                Cataloging.generate_index_from_scope(scope_path=scope_path, fields_needed=s.DEFAULT_FIELDS.copy(),
+                                                     override_catalog_path=catalog_path, source=source)
+
+            catalogs[name] = pd.read_csv(catalog_path)
+
+        pd.testing.assert_frame_equal(catalogs['extracted'].sort_index(axis=1),
+                                      catalogs['archives'].sort_index(axis=1))
+
+    def test_rebuild_catalog_from_archives(self):
+        catalog_path = os.path.join(OUTPUT_PATH, 'archives.csv')
+
+        with patch.object(Cataloging, 'get_catalog_path', return_value=catalog_path):
+            Cataloging.generate_index_from_scope(scope_path=ARCHIVES_PATH, fields_needed=s.DEFAULT_FIELDS.copy(),
+                                                 override_catalog_path=catalog_path,
+                                                 source=ArchiveSource(ARCHIVES_PATH))
+            expected = pd.read_csv(catalog_path)
+
+            # A catalog with more entries than there are images is deleted and made again from the same source
+            pd.concat([expected, expected]).to_csv(catalog_path, index=False)
+
+            with self.assertRaises(SystemExit):
+                Cataloging.generate_index_from_scope(scope_path=ARCHIVES_PATH, fields_needed=s.DEFAULT_FIELDS.copy(),
+                                                     override_catalog_path=catalog_path,
+                                                     source=ArchiveSource(ARCHIVES_PATH))
+
+        pd.testing.assert_frame_equal(expected, pd.read_csv(catalog_path))
+
+    def test_rebuild_catalog_parallel(self):
+        catalog_path = os.path.join(OUTPUT_PATH, 'extracted.csv')
+
+        with patch.object(Cataloging, 'get_catalog_path', return_value=catalog_path):
+            Cataloging.generate_index_from_scope(scope_path=EXTRACTED_PATH, fields_needed=s.DEFAULT_FIELDS.copy(),
+                                                 override_catalog_path=catalog_path)
+            expected = pd.read_csv(catalog_path)
+            pd.concat([expected, expected]).to_csv(catalog_path, index=False)
+
+            # The catalog made again still reads the .geom files on a pool of processes
+            with patch.object(Cataloging, '_read_geom_fields_parallel',
+                              wraps=Cataloging._read_geom_fields_parallel) as read_parallel, \
+                    self.assertRaises(SystemExit):
+                Cataloging.generate_index_from_scope(scope_path=EXTRACTED_PATH, fields_needed=s.DEFAULT_FIELDS.copy(),
+                                                     override_catalog_path=catalog_path, geom_workers=2)
+
+        self.assertEqual(2, read_parallel.call_args.kwargs['workers'])
+        pd.testing.assert_frame_equal(expected, pd.read_csv(catalog_path))
+
+    def test_same_catalog_parallel(self):
+        catalogs = dict()
+
+        # Saving after every file read, to make sure the catalog can still be saved along the way
+        for name, scope_path, source, geom_workers in (('serial', EXTRACTED_PATH, None, 1),
+                                                       ('extracted', EXTRACTED_PATH, None, 2),
+                                                       ('archives', ARCHIVES_PATH, ArchiveSource(ARCHIVES_PATH), 2)):
+            catalog_path = os.path.join(OUTPUT_PATH, name + '.csv')
+
+            with patch.object(Cataloging, 'get_catalog_path', return_value=catalog_path):
+                Cataloging.generate_index_from_scope(scope_path=scope_path, fields_needed=s.DEFAULT_FIELDS.copy(),
+                                                     override_catalog_path=catalog_path, source=source,
+                                                     save_interval=1, geom_workers=geom_workers)
+
+            catalogs[name] = pd.read_csv(catalog_path)
+
+        for name in ('extracted', 'archives'):
+            pd.testing.assert_frame_equal(catalogs['serial'].sort_index(axis=1), catalogs[name].sort_index(axis=1))
+
+    def test_read_geom_fields_parallel(self):
+        for source in (FileSystemSource(EXTRACTED_PATH), ArchiveSource(ARCHIVES_PATH)):
+            tasks = [(i, file, {'ll_lat', 'geom_checksum'}) for i, file in enumerate(source.list_files())]
+
+            # A batch for every row, so that the rows come back from more batches than there are processes
+            results = list(Cataloging._read_geom_fields_parallel(tasks=tasks, source=source, workers=2, batch_size=1))
+
+            self.assertEqual([i for i, file, fields in tasks], [i for i, geom_data in results])
+
+            for (i, file, fields), (_, geom_data) in zip(tasks, results):
+                self.assertEqual(Cataloging._parse_geom_fields(field_id_set=fields, content=source.read_geom(file),
+                                                               file_path=source.get_path(file)), geom_data)
+
+            source.close()
+
+    def test_same_catalog_remote(self):
+        zip_path = os.path.join(OUTPUT_PATH, '20180915a_jpgs.zip')
+
+        with zipfile.ZipFile(zip_path, 'w') as zf:
+            for file_name in sorted(os.listdir(os.path.join(INPUT_PATH, 'jpgs'))):
+                zf.write(os.path.join(INPUT_PATH, 'jpgs', file_name), arcname='jpgs/' + file_name)
+
+        with open(zip_path, 'rb') as f:
+            files = {'/storm/20180915a_jpgs.zip': f.read()}
+
+        catalogs = dict()
+
+        with LocalServer(files) as server:
+            remote_source = RemoteArchiveSource(os.path.join(OUTPUT_PATH, 'remote', 'Florence'),
+                                                archives=[Archive(server.url('/storm/20180915a_jpgs.zip'))])
+
+            for name, scope_path, source in (('extracted', EXTRACTED_PATH, None),
+                                             ('remote', remote_source.scope_path, remote_source)):
+                catalog_path = os.path.join(OUTPUT_PATH, name + '.csv')
+
+                with patch.object(Cataloging, 'get_catalog_path', return_value=catalog_path):
+                    Cataloging.generate_index_from_scope(scope_path=scope_path,
+                                                         fields_needed=s.DEFAULT_FIELDS.copy(),
+                                                         override_catalog_path=catalog_path, source=source)
+
+                catalogs[name] = pd.read_csv(catalog_path)
+
+        pd.testing.assert_frame_equal(catalogs['extracted'].sort_index(axis=1),
+                                      catalogs['remote'].sort_index(axis=1))
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
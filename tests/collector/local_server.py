@@ -0,0 +1,122 @@
+import hashlib
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from typing import Dict
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class LocalServer:
+    """A small HTTP server run on a background thread that stands in for the NOAA website during tests. It serves
+    in-memory files, supports (single) byte range requests unless told to ignore them, and sends an ETag with every
+    file so conditional requests ('If-None-Match') get back '304 Not Modified' if the file did not change."""
+
+    files: Dict[str, bytes]  # The content of each file by url path (e.g. '/storm/archive.tar')
+    support_range: bool  # Whether (True) or not (False) to respond to 'Range' headers with partial content
+    requests: list  # The method, path, and headers of every request received (in order)
+    connections: set  # The client address of every connection made to the server
+    headers: Dict[str, str]  # Extra headers to send with every file (e.g. {'Content-Encoding': 'gzip'})
+    errors: Dict[str, int]  # The error status to answer with by url path, the file is sent as the error page
+
+    def __init__(self, files: Dict[str, bytes], support_range: bool = True, headers: Dict[str, str] = None,
+                 errors: Dict[str, int] = None):
+        self.files = files
+        self.support_range = support_range
+        self.headers = headers or dict()
+        self.errors = errors or dict()
+        self.requests = list()
+        self.connections = set()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            # Keep connections open between requests (every response has a Content-Length)
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                self._respond(send_body=False)
+
+            def do_GET(self):
+                self._respond(send_body=True)
+
+            def _respond(self, send_body: bool):
+                server.requests.append((self.command, self.path, dict(self.headers)))
+                server.connections.add(self.client_address)
+
+                if self.path not in server.files:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                body = server.files[self.path]
+
+                if self.path in server.errors:
+                    self.send_response(server.errors[self.path])
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+
+                    if send_body:
+                        self.wfile.write(body)
+                    return
+
+                etag = '"' + hashlib.md5(body).hexdigest() + '"'
+
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+
+                byte_range = re.match('bytes=(\\d+)-(\\d*)', self.headers.get('Range', ''))
+
+                if server.support_range and byte_range:
+                    start = int(byte_range.group(1))
+                    end = int(byte_range.group(2)) if byte_range.group(2) else len(body) - 1
+                    end = min(end, len(body) - 1)
+
+                    self.send_response(206)
+                    self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, end, len(body)))
+                    body = body[start:end + 1]
+                else:
+                    self.send_response(200)
+
+                if server.support_range:
+                    self.send_header('Accept-Ranges', 'bytes')
+
+                for key, value in server.headers.items():
+                    self.send_header(key, value)
+
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+
+                if send_body:
+                    self.wfile.write(body)
+
+        self.httpd = ThreadingServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def url(self, path: str) -> str:
+        """Get the full url to a file served by this server
+
+        :param path: The url path of the file (e.g. '/storm/archive.tar')
+        :return: The full url including the host and port
+        """
+        return 'http://127.0.0.1:%d%s' % (self.httpd.server_address[1], path)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,145 @@
+import os
+import shutil
+from unittest import TestCase
+
+from psicollect.collector.archive import Archive
+from psicollect.collector.chunk_journal import ChunkJournal, repair_part
+from psicollect.common import s
+from tests.collector.local_server import LocalServer
+from tests.collector.test_downloader import make_tar
+
+SELF_PATH = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(SELF_PATH, 'data')
+OUTPUT_PATH = os.path.join(DATA_PATH, 'output_chunk_journal')
+
+CHUNK_SIZE = 4096
+
+CONTENT = os.urandom(10 * CHUNK_SIZE)
+
+
+def make_part(part_file: str, content: bytes, size: int) -> ChunkJournal:
+    """Pretend that the start of a file was downloaded before, keeping a journal of its chunks"""
+    journal = ChunkJournal.create(part_file, chunk_size=CHUNK_SIZE)
+    journal.start(0)
+
+    with open(part_file, 'wb') as f:
+        f.write(content[:size])
+
+    journal.update(memoryview(content[:size]))
+
+    return journal
+
+
+def damage(part_file: str, position: int) -> None:
+    """Change a byte of a file, like a connection that dropped or a sync that went wrong"""
+    with open(part_file, 'r+b') as f:
+        f.seek(position)
+        byte = f.read(1)
+        f.seek(position)
+        f.write(bytes([byte[0] ^ 0xff]))
+
+
+class TestChunkJournal(TestCase):
+
+    def setUp(self) -> None:
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
+        os.makedirs(OUTPUT_PATH)
+
+    def test_journal(self):
+        part_file = os.path.join(OUTPUT_PATH, 'archive.tar' + s.PART_SUFFIX)
+        make_part(part_file, CONTENT, 5 * CHUNK_SIZE + 100)
+
+        # Only complete chunks have checksums
+        journal = ChunkJournal.load(part_file)
+        self.assertEqual(CHUNK_SIZE, journal.chunk_size)
+        self.assertEqual(5 * CHUNK_SIZE, journal.get_verified_size())
+        self.assertEqual([], journal.find_bad_chunks())
+
+        damage(part_file, 4 * CHUNK_SIZE + 10)
+        damage(part_file, 10)
+
+        # Only the last chunks are checked unless asked to check every chunk
+        self.assertEqual([4], journal.find_bad_chunks(tail_chunks=2))
+        self.assertEqual([0, 4], journal.find_bad_chunks(tail_chunks=None))
+
+        journal.forget(3)
+        self.assertEqual(3 * CHUNK_SIZE, ChunkJournal.load(part_file).get_verified_size())
+
+    def test_repair_part(self):
+        part_file = os.path.join(OUTPUT_PATH, 'archive.tar' + s.PART_SUFFIX)
+        journal = make_part(part_file, CONTENT, 6 * CHUNK_SIZE + 100)
+        damage(part_file, 4 * CHUNK_SIZE + 10)
+
+        with LocalServer({'/storm/archive.tar': CONTENT}) as server:
+            kept = repair_part(server.url('/storm/archive.tar'), journal, log=lambda message: None)
+
+            ranges = [headers.get('Range') for method, path, headers in server.requests]
+
+        # Only the damaged chunk was downloaded again, and the part after the last complete chunk was cut off
+        self.assertEqual(['bytes=' + str(4 * CHUNK_SIZE) + '-' + str(5 * CHUNK_SIZE - 1)], ranges)
+        self.assertEqual(6 * CHUNK_SIZE, kept)
+
+        with open(part_file, 'rb') as f:
+            self.assertEqual(CONTENT[:kept], f.read())
+
+    def test_repair_part_without_pread(self):
+        part_file = os.path.join(OUTPUT_PATH, 'archive.tar' + s.PART_SUFFIX)
+        journal = make_part(part_file, CONTENT, 6 * CHUNK_SIZE)
+        damage(part_file, 4 * CHUNK_SIZE + 10)
+
+        # Windows has no os.pread or os.pwrite
+        pread, pwrite = os.pread, os.pwrite
+        del os.pread, os.pwrite
+
+        try:
+            with LocalServer({'/storm/archive.tar': CONTENT}) as server:
+                kept = repair_part(server.url('/storm/archive.tar'), journal, log=lambda message: None)
+        finally:
+            os.pread, os.pwrite = pread, pwrite
+
+        self.assertEqual(6 * CHUNK_SIZE, kept)
+
+        with open(part_file, 'rb') as f:
+            self.assertEqual(CONTENT[:kept], f.read())
+
+    def test_repair_part_without_range(self):
+        part_file = os.path.join(OUTPUT_PATH, 'archive.tar' + s.PART_SUFFIX)
+        journal = make_part(part_file, CONTENT, 6 * CHUNK_SIZE)
+        damage(part_file, 4 * CHUNK_SIZE + 10)
+
+        with LocalServer({'/storm/archive.tar': CONTENT}, support_range=False) as server:
+            kept = repair_part(server.url('/storm/archive.tar'), journal, log=lambda message: None)
+
+        # Everything from the damaged chunk on is downloaded again with the rest of the file
+        self.assertEqual(4 * CHUNK_SIZE, kept)
+        self.assertEqual(4 * CHUNK_SIZE, os.path.getsize(part_file))
+        self.assertEqual(4 * CHUNK_SIZE, ChunkJournal.load(part_file).get_verified_size())
+
+    def test_download_resume(self):
+        content = make_tar({'jpgs/C0001.jpg': os.urandom(8 * CHUNK_SIZE), 'jpgs/C0001.geom': b'll_lat:  34.5\n'})
+        part_file = os.path.join(OUTPUT_PATH, 'test_archive.tar' + s.PART_SUFFIX)
+
+        make_part(part_file, content, 5 * CHUNK_SIZE + 100)
+        damage(part_file, 3 * CHUNK_SIZE + 10)
+
+        with LocalServer({'/storm/test_archive.tar': content}) as server:
+            archive = Archive(archive_url=server.url('/storm/test_archive.tar'))
+            archive.download_url(OUTPUT_PATH, user='test_dummy').close()
+
+            ranges = [headers.get('Range') for method, path, headers in server.requests if method == 'GET']
+
+        # The damaged chunk was downloaded again, then the rest from the end of the last complete chunk
+        self.assertEqual(['bytes=' + str(3 * CHUNK_SIZE) + '-' + str(4 * CHUNK_SIZE - 1),
+                          'bytes=' + str(5 * CHUNK_SIZE) + '-' + str(len(content))], ranges)
+
+        with open(os.path.join(OUTPUT_PATH, 'test_archive.tar'), 'rb') as f:
+            self.assertEqual(content, f.read())
+
+        self.assertFalse(os.path.exists(ChunkJournal.get_path(part_file)))
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
@@ -4,11 +4,13 @@ from unittest import TestCase
 
 from psicollect.collector.connection_handler import ConnectionHandler
 from psicollect.collector.storm import Storm
+from tests.collector.local_server import LocalServer
 
 SELF_PATH = os.path.dirname(os.path.abspath(__file__))
 DATA_PATH = os.path.join(SELF_PATH, 'data')
 INPUT_PATH = os.path.join(DATA_PATH, 'input')
 TEST_FILE_PATH = os.path.join(INPUT_PATH, 'Storms_List_Page.html')
+SNAPSHOT_PATH = os.path.join(DATA_PATH, 'Storms_List_Page_snapshot.html')
 
 
 class TestConnectionHandler(TestCase):
@@ -49,3 +51,24 @@ class TestConnectionHandler(TestCase):
         storms_all: List[Storm] = self.c.get_storm_list()
         storms_2019: List[Storm] = self.c.get_storm_list(search_re='2019')
         self.assertNotEqual(storms_all, storms_2019)
+
+    def test_storm_list_is_loaded_lazily(self):
+        with open(TEST_FILE_PATH, 'rb') as f:
+            page = f.read()
+
+        with LocalServer({'/': page}) as server:
+            c = ConnectionHandler(url=server.url('/'))
+
+            # Nothing is downloaded until the storm list is needed
+            self.assertEqual(len(server.requests), 0)
+            self.assertEqual(len(c.get_storm_list()), 34)
+            self.assertEqual(len(c.get_storm_list(search_re='2008')), 2)
+            self.assertEqual(len(server.requests), 1)
+
+    def test_snapshot(self):
+        self.c.save_snapshot(SNAPSHOT_PATH)
+
+        try:
+            self.assertEqual(len(ConnectionHandler.from_snapshot(SNAPSHOT_PATH).get_storm_list()), 34)
+        finally:
+            os.remove(SNAPSHOT_PATH)
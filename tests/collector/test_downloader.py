@@ -0,0 +1,118 @@
+import io
+import os
+import shutil
+import tarfile
+from unittest import TestCase, skipIf
+
+from psicollect.collector import downloader
+from psicollect.collector.archive import Archive
+from psicollect.collector.downloader import AsyncDownloader, ThreadedDownloader
+from psicollect.collector.retry import RetryPolicy
+from psicollect.common import s
+from tests.collector.local_server import LocalServer
+
+SELF_PATH = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(SELF_PATH, 'data')
+OUTPUT_PATH = os.path.join(DATA_PATH, 'output_downloader')
+
+
+def make_tar(files: dict) -> bytes:
+    """Create a tar archive in memory with the given file names and contents"""
+    buffer = io.BytesIO()
+
+    with tarfile.open(fileobj=buffer, mode='w') as tar:
+        for name, content in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+
+    return buffer.getvalue()
+
+
+TAR_CONTENT = make_tar({'jpgs/C0001.jpg': b'\xff\xd8' * 4096, 'jpgs/C0001.geom': b'll_lat:  34.5\n'})
+
+
+class TestDownloader(TestCase):
+
+    def setUp(self) -> None:
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
+        os.makedirs(OUTPUT_PATH)
+
+    def test_threaded_get_content_lengths(self):
+        with LocalServer({'/a.tar': b'a' * 10, '/b.tar': b'b' * 20}) as server:
+            sizes = ThreadedDownloader(user='test_dummy').get_content_lengths(
+                [server.url('/a.tar'), server.url('/b.tar')])
+
+        assert sizes == [10, 20]
+
+    @skipIf(downloader.aiohttp is None, 'aiohttp is not installed')
+    def test_async_get_content_lengths(self):
+        files = {'/' + str(i) + '.tar': b'x' * i for i in range(1, 101)}
+
+        error_page = {'/error.tar': b'<html>Not Found</html>'}
+
+        with LocalServer(dict(files, **error_page), errors={'/error.tar': 404}) as server:
+            sizes = AsyncDownloader(user='test_dummy', probe_concurrency=8).get_content_lengths(
+                [server.url(path) for path in files] + [server.url('/missing.tar'), server.url('/error.tar')])
+
+        # The length of an error page is not the size of the file
+        assert sizes == list(range(1, 101)) + [0, 0]
+
+    @skipIf(downloader.aiohttp is None, 'aiohttp is not installed')
+    def test_async_download_resume(self):
+
+        # Pretend that part of the archive was downloaded before
+        with open(os.path.join(OUTPUT_PATH, 'test_archive.tar' + s.PART_SUFFIX), 'wb') as f:
+            f.write(TAR_CONTENT[:1000])
+
+        with LocalServer({'/storm/test_archive.tar': TAR_CONTENT}) as server:
+            archive = Archive(archive_url=server.url('/storm/test_archive.tar'))
+            AsyncDownloader(user='test_dummy', jobs=2).download([(archive, OUTPUT_PATH)])
+
+            ranges = [headers.get('Range') for method, path, headers in server.requests if method == 'GET']
+
+        assert ranges == ['bytes=1000-' + str(len(TAR_CONTENT))]
+
+        with open(os.path.join(OUTPUT_PATH, 'test_archive.tar'), 'rb') as f:
+            assert f.read() == TAR_CONTENT
+
+        assert os.path.isfile(os.path.join(OUTPUT_PATH, 'test_archive', 'jpgs', 'C0001.geom'))
+
+    @skipIf(downloader.aiohttp is None, 'aiohttp is not installed')
+    def test_async_download_size_mismatch(self):
+        with LocalServer({'/storm/good.tar': TAR_CONTENT, '/storm/bad.tar': TAR_CONTENT}) as server:
+            good = Archive(archive_url=server.url('/storm/good.tar'))
+            bad = Archive(archive_url=server.url('/storm/bad.tar'))
+
+            # The website sends a different size than it said the archive has
+            bad.file_origin_size = len(TAR_CONTENT) + 100
+
+            async_downloader = AsyncDownloader(user='test_dummy', jobs=2,
+                                               retry_policy=RetryPolicy(attempts=2, base_delay=0))
+            async_downloader.download([(bad, OUTPUT_PATH), (good, OUTPUT_PATH)])
+
+        # Only the archive whose size did not match was given up on, the other one still downloaded
+        assert async_downloader.failed == [bad]
+
+        with open(os.path.join(OUTPUT_PATH, 'good.tar'), 'rb') as f:
+            assert f.read() == TAR_CONTENT
+
+    def test_async_download_unsafe_archive(self):
+        with LocalServer({'/storm/unsafe.tar': make_tar({'../escaped.txt': b'escaped'})}) as server:
+            unsafe = Archive(archive_url=server.url('/storm/unsafe.tar'))
+
+            async_downloader = AsyncDownloader(user='test_dummy', retry_policy=RetryPolicy(attempts=3, base_delay=0))
+            async_downloader.download([(unsafe, OUTPUT_PATH)])
+
+            gets = [path for method, path, headers in server.requests if method == 'GET']
+
+        # The archive was given up on without downloading it again
+        assert async_downloader.failed == [unsafe]
+        assert gets == ['/storm/unsafe.tar']
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
@@ -0,0 +1,107 @@
+import json
+import os
+import re
+import shutil
+import time
+from unittest import TestCase
+
+from psicollect.collector.http_cache import HttpCache, configure_cache
+from psicollect.collector.response_getter import get_full_content_length, get_http_links, get_http_text
+from tests.collector.local_server import LocalServer
+
+SELF_PATH = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(SELF_PATH, 'data')
+OUTPUT_PATH = os.path.join(DATA_PATH, 'output_http_cache')
+
+PAGE = '<a href="a.tar">a</a> <a href="b.tar">b</a>'
+
+
+class TestHttpCache(TestCase):
+
+    def setUp(self) -> None:
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
+
+        self.cache = configure_cache(path=OUTPUT_PATH)
+
+    def test_fresh_entries_are_used_without_connecting(self):
+        with LocalServer({'/index.html': PAGE.encode(), '/a.tar': b'a' * 10}) as server:
+            assert get_http_text(server.url('/index.html')) == PAGE
+            assert get_full_content_length(server.url('/a.tar')) == 10
+
+            assert get_http_text(server.url('/index.html')) == PAGE
+            assert get_full_content_length(server.url('/a.tar')) == 10
+
+            assert len(server.requests) == 2
+
+    def test_stale_entries_are_revalidated(self):
+        self.cache.ttl = 0
+
+        with LocalServer({'/index.html': PAGE.encode()}) as server:
+            links = list(get_http_links(server.url('/index.html'), re.compile('href="([^"]+)"')))
+            assert links == list(get_http_links(server.url('/index.html'), re.compile('href="([^"]+)"')))
+
+            headers = server.requests[1][2]
+
+        assert links == [('a.tar',), ('b.tar',)]
+        assert headers.get('If-None-Match') == self.cache.get(server.url('/index.html'))['etag']
+
+    def test_stale_entries_are_used_offline(self):
+        self.cache.ttl = 0
+
+        with LocalServer({'/index.html': PAGE.encode(), '/a.tar': b'a' * 10}) as server:
+            get_http_text(server.url('/index.html'))
+            get_full_content_length(server.url('/a.tar'))
+
+        # The server is gone now
+        assert get_http_text(server.url('/index.html')) == PAGE
+        assert get_full_content_length(server.url('/a.tar')) == 10
+
+    def test_error_responses_are_not_cached(self):
+        self.cache.ttl = 0
+        url = 'http://127.0.0.1/storm/missing.tar'
+
+        assert self.cache.put(url, status=404, headers={'Content-Length': '345'}) is None
+        assert self.cache.get(url) is None
+
+        # Entries of error responses stored before they were left out are not used either
+        self.cache.put(url, status=200, headers={'Content-Length': '345'})
+        entry = self.cache.get(url)
+        entry['status'] = 404
+        HttpCache._write(self.cache._get_entry_path(url), json.dumps(entry))
+        assert self.cache.get(url) is None
+
+        with LocalServer({'/a.tar': b'a' * 10}) as server:
+            assert get_full_content_length(server.url('/a.tar')) == 10
+
+            # The file is gone from the website, so its old size is not used anymore (not even offline)
+            del server.files['/a.tar']
+            assert get_full_content_length(server.url('/a.tar')) == 0
+
+        assert self.cache.get(server.url('/a.tar')) is None
+        assert get_full_content_length(server.url('/a.tar')) == 0
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = HttpCache(path=OUTPUT_PATH, max_size=6000)
+        headers = {'Content-Length': '10'}
+
+        cache.put('http://example.com/old', status=200, headers=headers, body='o' * 2000)
+        cache.put('http://example.com/used', status=200, headers=headers, body='u' * 2000)
+
+        # Make sure the two entries are used at different times, then use the second one
+        os.utime(cache._get_entry_path('http://example.com/old'), (time.time() - 60, time.time() - 60))
+        os.utime(cache._get_entry_path('http://example.com/used'), (time.time() - 30, time.time() - 30))
+        cache.get('http://example.com/used')
+
+        cache.put('http://example.com/new', status=200, headers=headers, body='n' * 2000)
+
+        assert cache.get('http://example.com/old') is None
+        assert cache.get_body('http://example.com/used') == 'u' * 2000
+        assert cache.get_body('http://example.com/new') == 'n' * 2000
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        configure_cache(enabled=False)
+
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
@@ -0,0 +1,138 @@
+import gzip
+import io
+import os
+import shutil
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from psicollect.collector.io_engine import BufferPool, LockHeartbeat, preallocate, write_response
+from psicollect.collector.locking import get_lock_info
+from psicollect.collector.session import get_session
+from psicollect.common import s
+from tests.collector.local_server import LocalServer
+
+SELF_PATH = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(SELF_PATH, 'data')
+OUTPUT_PATH = os.path.join(DATA_PATH, 'output_io_engine')
+
+CONTENT = os.urandom(1000000)
+
+
+class RecordingFile(io.BytesIO):
+    """A file in memory that remembers where and how much each write was"""
+
+    def __init__(self, *args):
+        io.BytesIO.__init__(self, *args)
+        self.writes = list()
+
+    def write(self, data) -> int:
+        self.writes.append((self.tell(), len(data)))
+        return io.BytesIO.write(self, data)
+
+
+class TestIoEngine(TestCase):
+
+    def setUp(self) -> None:
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
+        os.makedirs(OUTPUT_PATH)
+
+    def test_write_response(self):
+        pool = BufferPool(buffer_size=64 * 1024, max_free=1)
+
+        with LocalServer({'/storm/archive.tar': CONTENT}) as server:
+
+            # Resume part way into the file, at a position that is not on a boundary
+            f = RecordingFile(CONTENT[:1000])
+            f.seek(1000)
+
+            with get_session().get(server.url('/storm/archive.tar'), headers={'Range': 'bytes=1000-'},
+                                   stream=True) as r:
+                chunks = list()
+
+                # The body is received straight into the pooled buffers, not read into bytes objects by `urllib3`
+                with patch.object(r.raw, 'read', side_effect=AssertionError('Read through urllib3')):
+                    written = write_response(r, f, on_data=lambda data: chunks.append(bytes(data)), pool=pool,
+                                             alignment=4096)
+
+        self.assertEqual(len(CONTENT) - 1000, written)
+        self.assertEqual(CONTENT, f.getvalue())
+        self.assertEqual(CONTENT[1000:], b''.join(chunks))
+
+        # The first write stops at a boundary, and every write after it starts on one and fills a whole buffer
+        self.assertEqual((1000, 64 * 1024 - 1000), f.writes[0])
+        self.assertTrue(all(position % 4096 == 0 for position, size in f.writes[1:]))
+        self.assertTrue(all(size == 64 * 1024 for position, size in f.writes[1:-1]))
+
+        # The buffer was given back to be used again
+        self.assertEqual(1, len(pool._free))
+
+    def test_write_response_reuses_connection(self):
+        with LocalServer({'/storm/archive.tar': CONTENT}) as server:
+            session = get_session()
+
+            for i in range(2):
+                with session.get(server.url('/storm/archive.tar'), stream=True) as r:
+                    f = io.BytesIO()
+                    write_response(r, f)
+
+                self.assertEqual(CONTENT, f.getvalue())
+
+        # The connection went back to the pool once the body was read, so the second request was sent over it too
+        self.assertEqual(1, len(server.connections))
+
+    def test_write_response_encoded(self):
+        with LocalServer({'/storm/archive.tar': gzip.compress(CONTENT)}, support_range=False,
+                         headers={'Content-Encoding': 'gzip'}) as server:
+
+            with get_session().get(server.url('/storm/archive.tar'), stream=True) as r:
+                f = io.BytesIO()
+                written = write_response(r, f)
+
+        # The body is decoded before it is written
+        self.assertEqual(len(CONTENT), written)
+        self.assertEqual(CONTENT, f.getvalue())
+
+    def test_buffer_pool(self):
+        pool = BufferPool(buffer_size=1024, max_free=1)
+
+        buffer = pool.acquire()
+        pool.release(buffer)
+
+        self.assertIs(buffer, pool.acquire())
+        self.assertIsNot(buffer, pool.acquire())
+
+    def test_preallocate(self):
+        path = os.path.join(OUTPUT_PATH, 'archive.tar' + s.PART_SUFFIX)
+
+        with open(path, 'wb') as f:
+            f.write(b'abc')
+            preallocate(f, 100000)
+
+        self.assertEqual(100000, os.path.getsize(path))
+
+        with open(path, 'rb') as f:
+            self.assertEqual(b'abc', f.read(3))
+
+    def test_lock_heartbeat(self):
+        part_file = os.path.join(OUTPUT_PATH, 'archive.tar' + s.PART_SUFFIX)
+        done = [10]
+
+        with LockHeartbeat(part_file, user='test_dummy', total_size_byte=100, get_done=lambda: done[0],
+                           interval=0.05):
+
+            # The lock file is written as soon as the heartbeat starts
+            self.assertEqual(10, get_lock_info(part_file)[s.LOCK_PART_SIZE_BYTES_FIELD])
+
+            done[0] = 50
+            time.sleep(0.3)
+
+        self.assertEqual(50, get_lock_info(part_file)[s.LOCK_PART_SIZE_BYTES_FIELD])
+        self.assertEqual('test_dummy', get_lock_info(part_file)['user'])
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
@@ -0,0 +1,95 @@
+import os
+import shutil
+import zipfile
+from unittest import TestCase
+
+from psicollect.collector.archive import Archive
+from psicollect.collector.member_index import MemberIndex
+from psicollect.common import s
+from tests.collector.local_server import LocalServer
+from tests.collector.test_downloader import make_tar
+from tests.collector.test_pipeline import make_zip
+
+SELF_PATH = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(SELF_PATH, 'data')
+OUTPUT_PATH = os.path.join(DATA_PATH, 'output_member_index')
+
+FILES = {'jpgs/C0001.jpg': b'\xff\xd8' * 40000, 'jpgs/C0001.geom': b'll_lat:  34.5\n'}
+
+
+class TestMemberIndex(TestCase):
+
+    def setUp(self) -> None:
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
+        os.makedirs(OUTPUT_PATH)
+
+    def write_archive(self, name: str, content: bytes) -> str:
+        archive_file_path = os.path.join(OUTPUT_PATH, name)
+
+        with open(archive_file_path, 'wb') as f:
+            f.write(content)
+
+        return archive_file_path
+
+    def test_read_members(self):
+        for name, content in (('test_archive.tar', make_tar(FILES)), ('test_archive.zip', make_zip(FILES))):
+            index = MemberIndex.get(self.write_archive(name, content))
+
+            try:
+                self.assertEqual(set(FILES), set(index.entries))
+
+                for member_name, member_content in FILES.items():
+                    self.assertEqual(member_content, index.read(member_name))
+            finally:
+                index.close()
+
+    def test_view_members(self):
+        archive_file_path = self.write_archive('test_archive.tar', make_tar(FILES))
+        index = MemberIndex.get(archive_file_path)
+
+        view = index.view('jpgs/C0001.jpg')
+        self.assertEqual(FILES['jpgs/C0001.jpg'], bytes(view))
+        view.release()
+
+        index.close()
+
+    def test_view_compressed_member(self):
+        archive_file_path = os.path.join(OUTPUT_PATH, 'test_archive.zip')
+
+        with zipfile.ZipFile(archive_file_path, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('jpgs/C0001.geom', FILES['jpgs/C0001.geom'])
+
+        index = MemberIndex.get(archive_file_path)
+
+        self.assertEqual(FILES['jpgs/C0001.geom'], index.read('jpgs/C0001.geom'))
+        self.assertRaises(ValueError, index.view, 'jpgs/C0001.geom')
+
+        index.close()
+
+    def test_saved_index(self):
+        archive_file_path = self.write_archive('test_archive.zip', make_zip(FILES))
+        built = MemberIndex.get(archive_file_path)
+
+        self.assertTrue(os.path.isfile(archive_file_path + s.INDEX_SUFFIX))
+        self.assertEqual(built.entries, MemberIndex.load(archive_file_path).entries)
+
+        # An index older than its archive is not used
+        os.utime(archive_file_path + s.INDEX_SUFFIX, (0, 0))
+        self.assertIsNone(MemberIndex.load(archive_file_path))
+
+    def test_download_url_builds_index(self):
+        with LocalServer({'/storm/test_archive.tar': make_tar(FILES)}) as server:
+            archive = Archive(archive_url=server.url('/storm/test_archive.tar'))
+            archive.download_url(output_dir=OUTPUT_PATH, user='test_dummy').close()
+
+        self.assertTrue(os.path.isfile(os.path.join(OUTPUT_PATH, 'test_archive.tar' + s.INDEX_SUFFIX)))
+        self.assertEqual(FILES['jpgs/C0001.geom'], archive.read_member('jpgs/C0001.geom'))
+
+        archive.get_member_index().close()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
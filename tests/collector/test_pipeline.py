@@ -0,0 +1,202 @@
+import csv
+import hashlib
+import io
+import os
+import shutil
+import zipfile
+from unittest import TestCase
+
+from psicollect.collector.archive import Archive
+from psicollect.collector.member_index import MemberIndex
+from psicollect.collector.pipeline import MemberFilter, UnsafeMemberException, get_manifest_path, get_member_path, \
+    process_archive, process_zip_parallel
+from psicollect.common import s
+from tests.collector.local_server import LocalServer
+from tests.collector.test_downloader import make_tar
+
+SELF_PATH = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(SELF_PATH, 'data')
+OUTPUT_PATH = os.path.join(DATA_PATH, 'output_pipeline')
+
+FILES = {'jpgs/C0001.jpg': b'\xff\xd8' * 40000, 'jpgs/C0001.geom': b'll_lat:  34.5\n'}
+
+
+def make_zip(files: dict) -> bytes:
+    """Create a zip archive in memory with the given file names and contents"""
+    buffer = io.BytesIO()
+
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        for name, content in files.items():
+            zf.writestr(name, content)
+
+    return buffer.getvalue()
+
+
+class TestPipeline(TestCase):
+
+    def setUp(self) -> None:
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
+        os.makedirs(OUTPUT_PATH)
+
+    def write_archive(self, name: str, content: bytes) -> str:
+        archive_file_path = os.path.join(OUTPUT_PATH, name)
+
+        with open(archive_file_path, 'wb') as f:
+            f.write(content)
+
+        return archive_file_path
+
+    def assert_processed(self, archive_file_path: str):
+        extract_dir = os.path.splitext(archive_file_path)[0]
+
+        for name, content in FILES.items():
+            with open(os.path.join(extract_dir, name), 'rb') as f:
+                self.assertEqual(content, f.read())
+
+        with open(get_manifest_path(archive_file_path), newline='') as f:
+            rows = list(csv.reader(f))
+
+        self.assertEqual(list(s.MANIFEST_FIELDS), rows[0])
+        self.assertEqual(sorted([name, str(len(content)), hashlib.md5(content).hexdigest()]
+                                for name, content in FILES.items()), sorted(rows[1:]))
+
+    def test_process_tar(self):
+        archive_file_path = self.write_archive('test_archive.tar', make_tar(FILES))
+
+        self.assertTrue(process_archive(archive_file_path, log=lambda message: None))
+        self.assert_processed(archive_file_path)
+
+    def test_process_zip(self):
+        archive_file_path = self.write_archive('test_archive.zip', make_zip(FILES))
+
+        self.assertTrue(process_archive(archive_file_path, log=lambda message: None))
+        self.assert_processed(archive_file_path)
+
+    def test_process_existing_members(self):
+        archive_file_path = self.write_archive('test_archive.tar', make_tar(FILES))
+        messages = list()
+
+        process_archive(archive_file_path, log=lambda message: None)
+        process_archive(archive_file_path, log=messages.append)
+
+        # Members that were already extracted are still hashed, but not written again
+        self.assertIn('Extracted 0 of 2 files (the rest already existed)', messages)
+        self.assert_processed(archive_file_path)
+
+    def test_process_corrupted_zip(self):
+        content = bytearray(make_zip({'jpgs/C0001.jpg': b'\xff\xd8' * 40000}))
+
+        # Change a byte of the member's content so its CRC no longer matches
+        content[content.index(b'\xff\xd8') + 10] ^= 0xFF
+
+        archive_file_path = self.write_archive('test_archive.zip', bytes(content))
+
+        self.assertFalse(process_archive(archive_file_path, log=lambda message: None))
+        self.assertFalse(os.path.exists(get_manifest_path(archive_file_path)))
+
+    def test_process_unsafe_members(self):
+        for name in ('../escaped.txt', 'jpgs/../../escaped.txt'):
+            for archive_name, content in (('test_archive.zip', make_zip({name: b'escaped'})),
+                                          ('test_archive.tar', make_tar({name: b'escaped'}))):
+                archive_file_path = self.write_archive(archive_name, content)
+
+                with self.assertRaises(UnsafeMemberException, msg=(archive_name, name)):
+                    process_archive(archive_file_path, log=lambda message: None)
+
+                self.assertFalse(os.path.exists(os.path.join(OUTPUT_PATH, 'escaped.txt')))
+
+        # Absolute names are extracted inside of the extract directory instead (like `ZipFile.extract` does)
+        self.assertEqual(os.path.join('extract', 'tmp', 'escaped.txt'), get_member_path('extract', '/tmp/escaped.txt'))
+        self.assertEqual(os.path.join('extract', 'jpgs', 'C0001.jpg'), get_member_path('extract', 'jpgs//C0001.jpg'))
+
+    def test_download_unsafe_archive(self):
+        with LocalServer({'/storm/test_archive.tar': make_tar({'../escaped.txt': b'escaped'})}) as server:
+            archive = Archive(archive_url=server.url('/storm/test_archive.tar'))
+
+            with self.assertRaises(UnsafeMemberException):
+                archive.download_url(output_dir=OUTPUT_PATH, user='test_dummy')
+
+        # The archive is not corrupted, so it is kept instead of being deleted to be downloaded again
+        self.assertTrue(os.path.isfile(os.path.join(OUTPUT_PATH, 'test_archive.tar')))
+        self.assertFalse(os.path.exists(os.path.join(OUTPUT_PATH, 'escaped.txt')))
+
+    def test_process_zip_parallel(self):
+        files = {'jpgs/C%04d.jpg' % i: bytes([i % 256]) * (i * 100) for i in range(1, 101)}
+        archive_file_path = self.write_archive('test_archive.zip', make_zip(files))
+        extract_dir = os.path.join(OUTPUT_PATH, 'test_archive')
+
+        entries = process_zip_parallel(archive_file_path, extract_dir, workers=2)
+
+        # The entries are in the order of the archive, no matter which worker handled them
+        self.assertEqual(list(files), [entry.name for entry in entries])
+        self.assertEqual([hashlib.md5(content).hexdigest() for content in files.values()],
+                         [entry.md5 for entry in entries])
+
+        for name, content in files.items():
+            with open(os.path.join(extract_dir, name), 'rb') as f:
+                self.assertEqual(content, f.read())
+
+    def test_process_corrupted_zip_parallel(self):
+        files = {'jpgs/C%04d.jpg' % i: b'\xff\xd8' * 1000 for i in range(1, 101)}
+        content = bytearray(make_zip(files))
+        content[content.index(b'\xff\xd8') + 10] ^= 0xFF
+
+        archive_file_path = self.write_archive('test_archive.zip', bytes(content))
+
+        self.assertFalse(process_archive(archive_file_path, log=lambda message: None, workers=2))
+
+    def test_member_filter(self):
+        self.assertTrue(MemberFilter().matches('jpgs/C0001.tif'))
+        self.assertTrue(MemberFilter(extensions=['.JPG', 'geom']).matches('jpgs/C0001.jpg'))
+        self.assertFalse(MemberFilter(extensions=['jpg']).matches('jpgs/C0001.tif'))
+        self.assertTrue(MemberFilter(include=['20180915a_jpgs/jpgs/*']).matches('20180915a_jpgs/jpgs/C0001.jpg'))
+        self.assertFalse(MemberFilter(include=['20180915a_jpgs/jpgs/*']).matches('20180916a_jpgs/jpgs/C0001.jpg'))
+        self.assertTrue(MemberFilter(include_re='C000[12]').matches('jpgs/C0002.jpg'))
+        self.assertFalse(MemberFilter(include_re='C000[12]', extensions=['geom']).matches('jpgs/C0002.jpg'))
+
+    def test_process_filtered(self):
+        member_filter = MemberFilter(extensions=['geom'])
+
+        for name, content in (('test_archive.tar', make_tar(FILES)), ('test_archive.zip', make_zip(FILES))):
+            archive_file_path = self.write_archive(name, content)
+            extract_dir = os.path.splitext(archive_file_path)[0]
+
+            self.assertTrue(process_archive(archive_file_path, log=lambda message: None, member_filter=member_filter))
+
+            self.assertTrue(os.path.isfile(os.path.join(extract_dir, 'jpgs', 'C0001.geom')))
+            self.assertFalse(os.path.exists(os.path.join(extract_dir, 'jpgs', 'C0001.jpg')))
+
+            with open(get_manifest_path(archive_file_path), newline='') as f:
+                self.assertEqual(['jpgs/C0001.geom'], [row[0] for row in list(csv.reader(f))[1:]])
+
+            shutil.rmtree(extract_dir)
+
+    def test_process_saves_index(self):
+        files = dict(FILES, **{'jpgs/C%04d.geom' % i: b'll_lat:  %d\n' % i for i in range(2, 101)})
+        member_filter = MemberFilter(include=['jpgs/C000*'])
+
+        for name, content, workers in (('test_archive.tar', make_tar(files), 1),
+                                       ('test_archive.zip', make_zip(files), 1),
+                                       ('test_archive.zip', make_zip(files), 2)):
+            archive_file_path = self.write_archive(name, content)
+
+            self.assertTrue(process_archive(archive_file_path, log=lambda message: None, workers=workers,
+                                            member_filter=member_filter), (name, workers))
+
+            # The index lists every file (picked or not) where scanning the archive for it would find it
+            index = MemberIndex.load(archive_file_path)
+            self.assertIsNotNone(index)
+            self.assertEqual(MemberIndex.build(archive_file_path).entries, index.entries)
+
+            self.assertEqual(files['jpgs/C0050.geom'], index.read('jpgs/C0050.geom'))
+            index.close()
+
+            shutil.rmtree(os.path.splitext(archive_file_path)[0])
+            os.remove(MemberIndex.get_path(archive_file_path))
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
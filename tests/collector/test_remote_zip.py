@@ -0,0 +1,93 @@
+import io
+import os
+import shutil
+import zipfile
+from unittest import TestCase
+
+from psicollect.collector.archive import Archive
+from psicollect.collector.pipeline import UnsafeMemberException
+from psicollect.collector.remote_zip import RemoteZip
+from tests.collector.local_server import LocalServer
+
+SELF_PATH = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(SELF_PATH, 'data')
+OUTPUT_PATH = os.path.join(DATA_PATH, 'output_remote_zip')
+
+# Large images with small .geom files, like the archives on the NOAA website
+FILES = {}
+for i in range(1, 21):
+    FILES['20180915a_jpgs/jpgs/C%04d.geom' % i] = ('ll_lat:  34.%d\nll_lon:  -77.%d\n' % (i, i)).encode()
+    FILES['20180915a_jpgs/jpgs/C%04d.jpg' % i] = os.urandom(1000000)
+
+
+def make_zip(files: dict, compression: int = zipfile.ZIP_STORED) -> bytes:
+    """Create a zip archive in memory with the given file names and contents"""
+    buffer = io.BytesIO()
+
+    with zipfile.ZipFile(buffer, 'w', compression=compression) as zf:
+        for name, content in files.items():
+            zf.writestr(name, content)
+
+    return buffer.getvalue()
+
+
+class TestRemoteZip(TestCase):
+
+    def test_list_and_read(self):
+        for compression in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            content = make_zip(FILES, compression=compression)
+
+            with LocalServer({'/storm/20180915a_jpgs.zip': content}) as server:
+                remote = RemoteZip(server.url('/storm/20180915a_jpgs.zip'))
+
+                self.assertEqual(list(FILES), [info.filename for info in remote.infolist()])
+
+                geom_names = [name for name in FILES if name.endswith('.geom')]
+                self.assertEqual([(name, FILES[name]) for name in geom_names],
+                                 list(remote.read_members(geom_names, workers=4)))
+
+                # Only the end of the archive (with the central directory) and the .geom files were fetched
+                self.assertLess(remote.bytes_fetched, len(content) / 10)
+
+                self.assertEqual(FILES['20180915a_jpgs/jpgs/C0001.jpg'], remote.read('20180915a_jpgs/jpgs/C0001.jpg'))
+
+    def test_large_central_directory(self):
+        files = {'jpgs/C%05d.geom' % i: b'll_lat:  34.5\n' for i in range(20000)}
+
+        with LocalServer({'/storm/archive.zip': make_zip(files)}) as server:
+            remote = RemoteZip(server.url('/storm/archive.zip'))
+
+            # The central directory is larger than the end fetched first, so it takes one more request
+            self.assertEqual(len(files), len(remote.infolist()))
+            self.assertEqual(2, remote.request_count)
+
+    def test_no_range_support(self):
+        with LocalServer({'/storm/20180915a_jpgs.zip': make_zip(FILES)}, support_range=False) as server:
+            self.assertRaises(IOError, RemoteZip, server.url('/storm/20180915a_jpgs.zip'))
+
+    def test_open_remote(self):
+        with LocalServer({'/storm/20180915a_jpgs.zip': make_zip(FILES)}) as server:
+            archive = Archive(archive_url=server.url('/storm/20180915a_jpgs.zip'))
+            self.assertEqual(len(FILES), len(archive.open_remote().infolist()))
+
+        self.assertRaises(IOError, Archive(archive_url='http://127.0.0.1/storm/archive.tar').open_remote)
+
+    def test_extract_members_unsafe(self):
+        files = {'jpgs/C0001.geom': b'll_lat:  34.5\n', '../escaped.geom': b'll_lat:  34.5\n'}
+        extract_dir = os.path.join(OUTPUT_PATH, 'extract')
+
+        with LocalServer({'/storm/archive.zip': make_zip(files)}) as server:
+            remote = RemoteZip(server.url('/storm/archive.zip'))
+
+            self.assertEqual(['jpgs/C0001.geom'], remote.extract_members(['jpgs/C0001.geom'], extract_dir))
+
+            # Names from the website that would be written outside of the extract directory are rejected
+            self.assertRaises(UnsafeMemberException, remote.extract_members, list(files), extract_dir)
+
+        self.assertFalse(os.path.exists(os.path.join(OUTPUT_PATH, 'escaped.geom')))
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
@@ -1,8 +1,15 @@
+import re
 from unittest import TestCase
 
 import requests
 
-from psicollect.collector.response_getter import get_http_response, get_full_content_length
+from psicollect.collector.response_getter import get_http_response, get_full_content_length, extract_links, \
+    get_http_links
+from psicollect.collector.storm import URL_STORMS_REGEX_PATTERN_ARCHIVE_RELATIVE
+from tests.collector.local_server import LocalServer
+
+PAGE = ''.join('<li><a href="%s">Archive %d</a></li>\n' % (
+    ('https://example.com/' if i % 2 else '') + str(i) + '_jpgs.tar', i) for i in range(200))
 
 
 class TestResponseGetter(TestCase):
@@ -24,3 +31,34 @@ class TestResponseGetter(TestCase):
 
     def test_get_full_content_length_empty(self):
         self.assertEqual(0, get_full_content_length('https://httpbin.org/status/404'))
+
+    def test_get_full_content_length_error_page(self):
+        files = {'/missing.tar': b'<html>Not Found</html>', '/forbidden.tar': b'<html>Forbidden</html>'}
+
+        with LocalServer(files, errors={'/missing.tar': 404, '/forbidden.tar': 403}) as server:
+
+            # The length of the error page is not the size of the file
+            self.assertEqual(0, get_full_content_length(server.url('/missing.tar')))
+            self.assertEqual(0, get_full_content_length(server.url('/forbidden.tar')))
+
+    def test_extract_links_split_between_chunks(self):
+        expected = re.findall(URL_STORMS_REGEX_PATTERN_ARCHIVE_RELATIVE, PAGE)
+
+        for chunk_size in [1, 7, 100, len(PAGE)]:
+            chunks = [PAGE[i:i + chunk_size] for i in range(0, len(PAGE), chunk_size)]
+            self.assertEqual(expected, list(extract_links(chunks, URL_STORMS_REGEX_PATTERN_ARCHIVE_RELATIVE,
+                                                          overlap=64)))
+
+    def test_get_http_links(self):
+        with LocalServer({'/index.html': PAGE.encode()}) as server:
+            links = list(get_http_links(server.url('/index.html'), URL_STORMS_REGEX_PATTERN_ARCHIVE_RELATIVE,
+                                        chunk_size=100))
+
+        self.assertEqual(200, len(links))
+        self.assertEqual(('0_jpgs.tar', 'tar'), links[0])
+        self.assertEqual(('https://example.com/1_jpgs.tar', 'tar'), links[1])
+
+    def test_get_http_links_failed(self):
+        with LocalServer({}) as server:
+            with self.assertRaises(ConnectionError):
+                list(get_http_links(server.url('/index.html'), URL_STORMS_REGEX_PATTERN_ARCHIVE_RELATIVE))
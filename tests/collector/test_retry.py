@@ -0,0 +1,143 @@
+import os
+import shutil
+import socket
+import time
+from unittest import TestCase
+
+from psicollect.collector.pipeline import UnsafeMemberException
+from psicollect.collector.retry import CircuitBreaker, CircuitOpenError, RetryPolicy, get_circuit_breaker, get_host
+from psicollect.collector.scheduler import DownloadScheduler
+from psicollect.collector.session import configure_session, get_session
+from psicollect.common import s
+
+SELF_PATH = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(SELF_PATH, 'data')
+OUTPUT_PATH = os.path.join(DATA_PATH, 'output_retry')
+
+
+class FailingArchive:
+    """Stands in for an Archive whose downloads always run into an error (a connection error unless told otherwise)"""
+
+    def __init__(self, url: str, name: str, error: Exception = None):
+        self.url = url
+        self.name = name
+        self.error = ConnectionError('The connection dropped') if error is None else error
+        self.attempts = 0
+
+    def get_ext(self) -> str:
+        return '.tar'
+
+    def get_file_size_origin(self) -> int:
+        return 10
+
+    def download_url(self, output_dir: str, user: str, **kwargs):
+        self.attempts += 1
+        raise self.error
+
+
+def get_closed_port_url() -> str:
+    """Get a url on this machine that nothing is listening on (every request to it is refused)"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return 'http://127.0.0.1:%d/storm/archive.tar' % sock.getsockname()[1]
+
+
+class TestRetry(TestCase):
+
+    def setUp(self) -> None:
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
+        os.makedirs(OUTPUT_PATH)
+
+    def test_get_delay(self):
+        policy = RetryPolicy(attempts=10, base_delay=2, max_delay=30, jitter=0.5)
+
+        for attempt, full_delay in enumerate([2, 4, 8, 16, 30, 30]):
+            delay = policy.get_delay(attempt)
+            self.assertTrue(full_delay / 2 <= delay <= full_delay, (attempt, delay))
+
+        self.assertEqual(8, RetryPolicy(base_delay=2, jitter=0).get_delay(2))
+
+    def test_call(self):
+        calls = list()
+
+        def flaky():
+            calls.append(None)
+
+            if len(calls) < 3:
+                raise ConnectionError('The connection dropped')
+
+            return 'done'
+
+        self.assertEqual('done', RetryPolicy(attempts=3, base_delay=0).call(flaky))
+        self.assertEqual(3, len(calls))
+
+        calls.clear()
+        self.assertRaises(ConnectionError, RetryPolicy(attempts=2, base_delay=0).call, flaky)
+        self.assertEqual(2, len(calls))
+
+        # Errors that are not worth trying again for are raised right away
+        calls.clear()
+        self.assertRaises(ConnectionError, RetryPolicy(attempts=3, base_delay=0).call, flaky, retry_on=(ValueError,))
+        self.assertEqual(1, len(calls))
+
+    def test_circuit_breaker(self):
+        breaker = CircuitBreaker(threshold=2, cooldown=0.2)
+
+        breaker.record_failure('a.gov')
+        breaker.check('a.gov')
+
+        breaker.record_failure('a.gov')
+        self.assertRaises(CircuitOpenError, breaker.check, 'a.gov')
+        self.assertTrue(0 < breaker.get_wait('a.gov') <= 0.2)
+
+        # Other hosts are not affected
+        breaker.check('b.gov')
+
+        # Requests are sent again after the cool down, and the first one that succeeds closes the circuit
+        time.sleep(0.25)
+        breaker.check('a.gov')
+        breaker.record_success('a.gov')
+        breaker.record_failure('a.gov')
+        breaker.check('a.gov')
+
+    def test_session_circuit(self):
+        url = get_closed_port_url()
+        configure_session(retries=0)
+
+        for _ in range(s.CIRCUIT_BREAKER_FAILURES):
+            self.assertRaises(OSError, get_session().get, url)
+
+        # Once enough requests failed in a row, the next one fails right away without connecting
+        self.assertRaises(CircuitOpenError, get_session().get, url)
+
+        get_circuit_breaker().record_success(get_host(url))
+
+    def test_scheduler_gives_up(self):
+        archive = FailingArchive(url='http://a.gov/storm/archive.tar', name='archive')
+
+        scheduler = DownloadScheduler(user='test_dummy', retry_policy=RetryPolicy(attempts=3, base_delay=0))
+        scheduler.add(archive, OUTPUT_PATH)
+        scheduler.run()
+
+        self.assertEqual(3, archive.attempts)
+        self.assertEqual([archive], scheduler.failed)
+
+    def test_scheduler_does_not_retry_unsafe_archive(self):
+        archive = FailingArchive(url='http://a.gov/storm/archive.tar', name='archive',
+                                 error=UnsafeMemberException(name='../escaped.txt', extract_dir=OUTPUT_PATH))
+
+        scheduler = DownloadScheduler(user='test_dummy', retry_policy=RetryPolicy(attempts=3, base_delay=0))
+        scheduler.add(archive, OUTPUT_PATH)
+        scheduler.run()
+
+        # Downloading the archive again would not change its members
+        self.assertEqual(1, archive.attempts)
+        self.assertEqual([archive], scheduler.failed)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        configure_session(retries=s.DEFAULT_REQUEST_RETRIES)
+
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
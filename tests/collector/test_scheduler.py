@@ -0,0 +1,88 @@
+import os
+import shutil
+import threading
+import time
+from unittest import TestCase
+
+from psicollect.collector.locking import update_file_lock
+from psicollect.collector.scheduler import DownloadScheduler
+from psicollect.common import s
+
+SELF_PATH = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(SELF_PATH, 'data')
+OUTPUT_PATH = os.path.join(DATA_PATH, 'output_scheduler')
+
+
+class FakeArchive:
+    """Stands in for an Archive, recording how many downloads run at the same time instead of downloading"""
+
+    counter_lock = threading.Lock()
+    running = dict()
+    max_running = dict()
+
+    def __init__(self, url: str, name: str):
+        self.url = url
+        self.name = name
+        self.downloaded = False
+
+    def get_ext(self) -> str:
+        return '.tar'
+
+    def get_file_size_origin(self) -> int:
+        return 10
+
+    def download_url(self, output_dir: str, user: str, overwrite: bool = False, progress=None, **kwargs):
+        host = self.url.split('/')[2]
+
+        with FakeArchive.counter_lock:
+            FakeArchive.running[host] = FakeArchive.running.get(host, 0) + 1
+            FakeArchive.max_running[host] = max(FakeArchive.max_running.get(host, 0), FakeArchive.running[host])
+
+        time.sleep(0.05)
+        progress.update(self.get_file_size_origin(), key=self.name)
+
+        with FakeArchive.counter_lock:
+            FakeArchive.running[host] -= 1
+
+        self.downloaded = True
+
+
+class TestDownloadScheduler(TestCase):
+
+    def setUp(self) -> None:
+        FakeArchive.running = dict()
+        FakeArchive.max_running = dict()
+
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
+        os.makedirs(OUTPUT_PATH)
+
+    def test_run_caps_jobs_per_host(self):
+        archives = [FakeArchive('https://a.example/' + str(i) + '.tar', 'a' + str(i)) for i in range(6)] + \
+                   [FakeArchive('https://b.example/' + str(i) + '.tar', 'b' + str(i)) for i in range(6)]
+
+        scheduler = DownloadScheduler(user='test_dummy', jobs=6, jobs_per_host=2)
+        for archive in archives:
+            scheduler.add(archive, OUTPUT_PATH)
+        scheduler.run()
+
+        assert all(archive.downloaded for archive in archives)
+        assert FakeArchive.max_running['a.example'] <= 2
+        assert FakeArchive.max_running['b.example'] <= 2
+
+    def test_run_skips_archive_locked_by_another_user(self):
+        archive = FakeArchive('https://a.example/locked.tar', 'locked')
+        update_file_lock(base_file=os.path.join(OUTPUT_PATH, 'locked.tar' + s.PART_SUFFIX), user='someone_else',
+                         total_size_byte=10, part_size_byte=5)
+
+        scheduler = DownloadScheduler(user='test_dummy', jobs=2)
+        scheduler.add(archive, OUTPUT_PATH)
+        scheduler.run()
+
+        assert archive.downloaded is False
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
@@ -0,0 +1,142 @@
+import os
+import shutil
+from unittest import TestCase
+from unittest.mock import patch
+
+from psicollect.collector.archive import Archive
+from psicollect.collector.segmented import SegmentJournal, download_segmented, get_segmented_progress
+from psicollect.common import s
+from tests.collector.local_server import LocalServer
+from tests.collector.test_downloader import make_tar
+
+SELF_PATH = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(SELF_PATH, 'data')
+OUTPUT_PATH = os.path.join(DATA_PATH, 'output_segmented')
+PART_FILE_PATH = os.path.join(OUTPUT_PATH, 'test_archive.tar' + s.PART_SUFFIX)
+
+CONTENT = bytes(range(256)) * 64  # 16 KiB of data to download
+
+
+@patch.object(s, 'SEGMENT_MIN_SIZE', 1024)
+class TestSegmented(TestCase):
+
+    def setUp(self) -> None:
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
+        os.makedirs(OUTPUT_PATH)
+
+    def test_journal_create_save_load(self):
+        journal = SegmentJournal.create(part_file=PART_FILE_PATH, total_size_byte=len(CONTENT), segment_count=4,
+                                        done_byte=1000)
+        journal.save()
+
+        loaded = SegmentJournal.load(PART_FILE_PATH)
+
+        assert len(loaded.segments) == 5
+        assert loaded.segments[0].is_complete()
+        assert loaded.get_total_size() == len(CONTENT)
+        assert get_segmented_progress(PART_FILE_PATH) == 1000
+        assert get_segmented_progress(os.path.join(OUTPUT_PATH, 'not_a_file.part')) is None
+
+    def test_download_segmented(self):
+        with LocalServer({'/test_archive.tar': CONTENT}) as server:
+            assert download_segmented(url=server.url('/test_archive.tar'), part_file=PART_FILE_PATH,
+                                      total_size_byte=len(CONTENT), segment_count=4, user='test_dummy')
+
+            ranges = [headers['Range'] for method, path, headers in server.requests if 'Range' in headers]
+
+        with open(PART_FILE_PATH, 'rb') as f:
+            assert f.read() == CONTENT
+
+        # One request to check for range support and one per segment
+        assert len(ranges) == 5
+        assert os.path.exists(SegmentJournal.get_path(PART_FILE_PATH)) is False
+
+    def test_download_segmented_resume(self):
+        journal = SegmentJournal.create(part_file=PART_FILE_PATH, total_size_byte=len(CONTENT), segment_count=2)
+        journal.segments[0].done = 100
+        journal.segments[1].done = len(journal.segments[1])
+        journal.save()
+
+        # Only the bytes marked as done in the journal are correct in the .part file
+        with open(PART_FILE_PATH, 'wb') as f:
+            f.write(CONTENT[:100])
+            f.write(b'\0' * (journal.segments[1].start - 100))
+            f.write(CONTENT[journal.segments[1].start:])
+
+        with LocalServer({'/test_archive.tar': CONTENT}) as server:
+            assert download_segmented(url=server.url('/test_archive.tar'), part_file=PART_FILE_PATH,
+                                      total_size_byte=len(CONTENT), segment_count=2, user='test_dummy')
+
+            ranges = [headers['Range'] for method, path, headers in server.requests if 'Range' in headers]
+
+        with open(PART_FILE_PATH, 'rb') as f:
+            assert f.read() == CONTENT
+
+        assert ranges == ['bytes=0-0', 'bytes=100-' + str(journal.segments[0].end)]
+
+    def test_download_segmented_nothing_remaining(self):
+        # A .part file that is already complete has nothing left to split into segments
+        journal = SegmentJournal.create(part_file=PART_FILE_PATH, total_size_byte=len(CONTENT), segment_count=4,
+                                        done_byte=len(CONTENT))
+        assert [segment.is_complete() for segment in journal.segments] == [True]
+        assert SegmentJournal.create(part_file=PART_FILE_PATH, total_size_byte=0, segment_count=4).segments == []
+
+        with open(PART_FILE_PATH, 'wb') as f:
+            f.write(CONTENT)
+
+        with LocalServer({'/test_archive.tar': CONTENT, '/empty.tar': b''}) as server:
+            assert download_segmented(url=server.url('/test_archive.tar'), part_file=PART_FILE_PATH,
+                                      total_size_byte=len(CONTENT), segment_count=4, user='test_dummy')
+
+            # An empty file is downloaded as a single stream instead
+            assert download_segmented(url=server.url('/empty.tar'), part_file=PART_FILE_PATH + '.empty',
+                                      total_size_byte=0, segment_count=4, user='test_dummy') is False
+
+            ranges = [headers['Range'] for method, path, headers in server.requests if 'Range' in headers]
+
+        with open(PART_FILE_PATH, 'rb') as f:
+            assert f.read() == CONTENT
+
+        # Only the request to check for range support was sent
+        assert ranges == ['bytes=0-0']
+        assert os.path.exists(SegmentJournal.get_path(PART_FILE_PATH)) is False
+
+    def test_download_complete_part(self):
+        content = make_tar({'jpgs/C0001.jpg': CONTENT, 'jpgs/C0001.geom': b'll_lat:  34.5\n'})
+
+        with open(PART_FILE_PATH, 'wb') as f:
+            f.write(content)
+
+        with LocalServer({'/test_archive.tar': content}) as server:
+            archive = Archive(archive_url=server.url('/test_archive.tar'))
+            archive.download_url(OUTPUT_PATH, user='test_dummy', segments=4).close()
+
+            methods = [method for method, path, headers in server.requests]
+
+        # The archive was finished without downloading any of it again
+        assert 'GET' not in methods
+        assert os.path.isfile(os.path.join(OUTPUT_PATH, 'test_archive', 'jpgs', 'C0001.jpg'))
+
+    def test_download_segmented_stopped_while_preallocating(self):
+        with LocalServer({'/test_archive.tar': CONTENT}) as server:
+            with patch('psicollect.collector.segmented.preallocate', side_effect=KeyboardInterrupt):
+                with self.assertRaises(KeyboardInterrupt):
+                    download_segmented(url=server.url('/test_archive.tar'), part_file=PART_FILE_PATH,
+                                       total_size_byte=len(CONTENT), segment_count=4, user='test_dummy')
+
+        # The segments were saved before the .part file grew, so it is resumed and never taken as a complete download
+        assert os.path.exists(SegmentJournal.get_path(PART_FILE_PATH))
+
+    def test_download_segmented_no_range_support(self):
+        with LocalServer({'/test_archive.tar': CONTENT}, support_range=False) as server:
+            assert download_segmented(url=server.url('/test_archive.tar'), part_file=PART_FILE_PATH,
+                                      total_size_byte=len(CONTENT), segment_count=4, user='test_dummy') is False
+
+        assert os.path.exists(PART_FILE_PATH) is False
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
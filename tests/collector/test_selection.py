@@ -0,0 +1,85 @@
+import os
+import shutil
+from unittest import TestCase
+
+from psicollect.collector.pipeline import MemberFilter
+from psicollect.collector.remote_zip import RemoteZip
+from psicollect.collector.selection import BoundingBox, fetch_selected, get_footprint, select_members
+from tests.collector.local_server import LocalServer
+from tests.collector.test_remote_zip import make_zip
+
+SELF_PATH = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(SELF_PATH, 'data')
+OUTPUT_PATH = os.path.join(DATA_PATH, 'output_selection')
+
+
+def make_geom(lon: float, lat: float) -> bytes:
+    """Create a .geom file for an image with a footprint of 0.01 degrees from its lower left corner"""
+    return ('ll_lat:  %f\nll_lon:  %f\nlr_lat:  %f\nlr_lon:  %f\nul_lat:  %f\nul_lon:  %f\nur_lat:  %f\nur_lon:  %f\n'
+            % (lat, lon, lat, lon + 0.01, lat + 0.01, lon, lat + 0.01, lon + 0.01)).encode()
+
+
+# A row of images going east, 0.1 degrees apart
+FILES = {}
+for i in range(10):
+    FILES['jpgs/C%04d.geom' % i] = make_geom(-76.0 + i * 0.1, 35.0)
+    FILES['jpgs/C%04d.jpg' % i] = bytes([i]) * 50000
+
+
+class TestSelection(TestCase):
+
+    def setUp(self) -> None:
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
+        os.makedirs(OUTPUT_PATH)
+
+    def test_footprint(self):
+        self.assertEqual(BoundingBox(-76.0, 35.0, -75.99, 35.01), get_footprint(make_geom(-76.0, 35.0)))
+        self.assertIsNone(get_footprint(b'll_lat:  35.0\n'))
+
+        self.assertTrue(BoundingBox.parse('-76,35,-75,36').intersects(BoundingBox(-75.5, 35.5, -74, 37)))
+        self.assertFalse(BoundingBox.parse('-76,35,-75,36').intersects(BoundingBox(-74, 35.5, -73, 37)))
+        self.assertRaises(ValueError, BoundingBox.parse, '-75,35,-76,36')
+
+    def test_select_members(self):
+        with LocalServer({'/storm/archive.zip': make_zip(FILES)}) as server:
+            remote = RemoteZip(server.url('/storm/archive.zip'))
+
+            self.assertEqual(['jpgs/C0003.geom', 'jpgs/C0003.jpg'], select_members(remote, image_ids=['C0003']))
+            self.assertEqual(['jpgs/C0003.jpg', 'jpgs/C0007.jpg'],
+                             select_members(remote, image_ids=['C0003', 'C0007'],
+                                            member_filter=MemberFilter(extensions=['jpg'])))
+
+            # Only the images whose footprint is between -75.75 and -75.45 degrees of longitude
+            self.assertEqual(['jpgs/C0003.jpg', 'jpgs/C0004.jpg', 'jpgs/C0005.jpg'],
+                             select_members(remote, bbox=BoundingBox.parse('-75.75,34.9,-75.45,35.1'),
+                                            member_filter=MemberFilter(extensions=['jpg'])))
+
+    def test_fetch_selected(self):
+        extract_dir = os.path.join(OUTPUT_PATH, 'archive')
+
+        with LocalServer({'/storm/archive.zip': make_zip(FILES)}) as server:
+            remote = RemoteZip(server.url('/storm/archive.zip'))
+            written = fetch_selected(remote, extract_dir, image_ids=['C0001', 'C0002'], workers=4,
+                                     log=lambda message: None)
+
+            self.assertEqual(4, len(written))
+
+            for name in written:
+                with open(os.path.join(extract_dir, name), 'rb') as f:
+                    self.assertEqual(FILES[name], f.read())
+
+            self.assertEqual(['C0001.geom', 'C0001.jpg', 'C0002.geom', 'C0002.jpg'],
+                             sorted(os.listdir(os.path.join(extract_dir, 'jpgs'))))
+
+            # Files that already exist are not fetched again
+            request_count = remote.request_count
+            self.assertEqual([], fetch_selected(remote, extract_dir, image_ids=['C0001', 'C0002'],
+                                                log=lambda message: None))
+            self.assertEqual(request_count, remote.request_count)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
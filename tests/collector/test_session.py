@@ -0,0 +1,38 @@
+from unittest import TestCase
+
+from psicollect.collector.response_getter import get_full_content_length
+from psicollect.collector.session import get_session, configure_session, close_session
+from psicollect.common import s
+from tests.collector.local_server import LocalServer
+
+
+class TestSession(TestCase):
+
+    def test_get_session_is_shared(self):
+        self.assertIs(get_session(), get_session())
+
+    def test_configure_session(self):
+        configure_session(pool_size=4, connect_timeout=1, read_timeout=2, retries=0)
+
+        session = get_session()
+        self.assertEqual((1, 2), session.timeout)
+        self.assertEqual(4, session.get_adapter('https://').poolmanager.connection_pool_kw['maxsize'])
+
+        configure_session(pool_size=8)
+        self.assertIsNot(session, get_session())
+        self.assertEqual((1, 2), get_session().timeout)
+
+    def test_connections_are_reused(self):
+        files = {'/' + str(i) + '.tar': b'x' * i for i in range(1, 21)}
+
+        with LocalServer(files) as server:
+            sizes = [get_full_content_length(server.url(path)) for path in files]
+            connection_count = len(server.connections)
+
+        self.assertEqual(list(range(1, 21)), sizes)
+        self.assertEqual(1, connection_count)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        configure_session(pool_size=s.DEFAULT_POOL_SIZE, connect_timeout=s.DEFAULT_CONNECT_TIMEOUT,
+                          read_timeout=s.DEFAULT_READ_TIMEOUT, retries=s.DEFAULT_REQUEST_RETRIES)
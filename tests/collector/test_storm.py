@@ -1,7 +1,12 @@
+import threading
+import time
 from unittest import TestCase
+from unittest.mock import patch
 
-from psicollect.collector.storm import Storm
+from psicollect.collector import storm as storm_module
+from psicollect.collector.storm import Storm, crawl_storms
 from psicollect.common import s
+from tests.collector.local_server import LocalServer
 
 
 class TestStorm(TestCase):
@@ -23,3 +28,72 @@ class TestStorm(TestCase):
         self.storm.generate_archive_list(search_re="RGB")
         self.assertGreaterEqual(len(self.storm.archive_list), 5)
         self.assertEqual(str(self.storm.archive_list_last_pattern), 'RGB')
+
+    def test_generate_archive_list_local(self):
+        with LocalServer({'/storms/test/20180915a_jpgs.tar': b'x' * 10,
+                          '/storms/test/20180916a_jpgs.zip': b'x' * 20,
+                          '/downloads/20180917a_RGB.tar': b'x' * 30}) as server:
+            server.files['/storms/test/index.html'] = (
+                '<a href="20180915a_jpgs.tar">1</a> <a href="20180916a_jpgs.zip">2</a> '
+                '<a href="20180915a_jpgs.tar">1 (again)</a> <a href="missing.tar">3</a> '
+                '<a href="' + server.url('/downloads/20180917a_RGB.tar') + '">4</a>').encode()
+
+            storm = Storm(server.url('/storms/test/index.html'), 'test', 'Hurricane Test', 2018)
+            storm.generate_archive_list()
+
+            # Each archive is asked about once, even if it is linked to more than once
+            heads = sorted(request_path for method, request_path, _ in server.requests if method == 'HEAD')
+            self.assertEqual(['/downloads/20180917a_RGB.tar', '/storms/test/20180915a_jpgs.tar',
+                              '/storms/test/20180916a_jpgs.zip', '/storms/test/missing.tar'], heads)
+
+            # Archives that do not match the search are never asked about
+            server.requests.clear()
+            storm.generate_archive_list(search_re='RGB')
+            heads = [request_path for method, request_path, _ in server.requests if method == 'HEAD']
+            self.assertEqual(['/downloads/20180917a_RGB.tar'], heads)
+            self.assertEqual(['20180917a_RGB'], [archive.name for archive in storm.archive_list])
+
+            storm.generate_archive_list()
+
+        self.assertEqual(['20180915a_jpgs', '20180916a_jpgs', '20180917a_RGB'],
+                         [archive.name for archive in storm.archive_list])
+        self.assertEqual([10, 20, 30], [archive.get_file_size_origin() for archive in storm.archive_list])
+
+    def test_crawl_storms(self):
+        files = {'/storms/' + str(i) + '/' + str(i) + '_jpgs.tar': b'x' * i for i in range(1, 11)}
+
+        with LocalServer(files) as server:
+            storms = list()
+
+            for i in range(1, 11):
+                server.files['/storms/' + str(i) + '/index.html'] = ('<a href="' + str(i) + '_jpgs.tar">1</a>').encode()
+                storms.append(Storm(server.url('/storms/' + str(i) + '/index.html'), str(i), 'Storm ' + str(i), 2018))
+
+            crawled = list(crawl_storms(storms, workers=4))
+
+        self.assertCountEqual(storms, crawled)
+        self.assertEqual(list(range(1, 11)), [storm.archive_list[0].get_file_size_origin() for storm in storms])
+
+    def test_crawl_storms_shares_probes(self):
+        files = {'/storms/' + str(i) + '/' + str(i) + '_jpgs.tar': b'x' * i for i in range(1, 11)}
+        probe_threads = set()
+        get_full_content_length = storm_module.get_full_content_length
+
+        def probe(url: str, **kwargs) -> int:
+            probe_threads.add(threading.current_thread())
+            time.sleep(0.01)
+            return get_full_content_length(url, **kwargs)
+
+        with LocalServer(files) as server, patch.object(storm_module, 'get_full_content_length', side_effect=probe):
+            storms = list()
+
+            for i in range(1, 11):
+                server.files['/storms/' + str(i) + '/index.html'] = ('<a href="' + str(i) + '_jpgs.tar">1</a>').encode()
+                storms.append(Storm(server.url('/storms/' + str(i) + '/index.html'), str(i), 'Storm ' + str(i), 2018))
+                storms[-1].probe_concurrency = 2
+
+            list(crawl_storms(storms, workers=4))
+
+        # Every storm asked for its sizes on the same pool, instead of each one starting a pool of its own
+        self.assertLessEqual(len(probe_threads), 2)
+        self.assertEqual(list(range(1, 11)), [storm.archive_list[0].get_file_size_origin() for storm in storms])
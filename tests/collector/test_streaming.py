@@ -0,0 +1,138 @@
+import os
+import shutil
+import threading
+from unittest import TestCase
+from unittest.mock import patch
+
+from psicollect.collector import streaming
+from psicollect.collector.archive import Archive
+from psicollect.collector.member_index import MemberIndex
+from psicollect.collector.streaming import ChunkPipe, StreamingTarExtractor
+from psicollect.common import s
+from tests.collector.local_server import LocalServer
+from tests.collector.test_downloader import make_tar
+
+SELF_PATH = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(SELF_PATH, 'data')
+OUTPUT_PATH = os.path.join(DATA_PATH, 'output_streaming')
+EXTRACT_PATH = os.path.join(OUTPUT_PATH, 'test_archive')
+
+FILES = {'jpgs/C0001.jpg': b'\xff\xd8' * 40000, 'jpgs/C0001.geom': b'll_lat:  34.5\n',
+         'jpgs/C0002.jpg': b'\xff\xd9' * 40000}
+TAR_CONTENT = make_tar(FILES)
+
+
+def feed_in_chunks(extractor: StreamingTarExtractor, data: bytes, chunk_size: int = 7000) -> None:
+    """Feed bytes to an extractor the way a download would, a chunk at a time"""
+    for i in range(0, len(data), chunk_size):
+        extractor.feed(data[i:i + chunk_size])
+
+
+class TestStreaming(TestCase):
+
+    def setUp(self) -> None:
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
+        os.makedirs(OUTPUT_PATH)
+
+    def assert_extracted(self):
+        for name, content in FILES.items():
+            with open(os.path.join(EXTRACT_PATH, name), 'rb') as f:
+                self.assertEqual(content, f.read())
+
+    def test_chunk_pipe_read(self):
+        pipe = ChunkPipe()
+        for chunk in (b'abc', b'defg', b'h', None):
+            pipe.put(chunk)
+
+        self.assertEqual(b'ab', pipe.read(2))
+        self.assertEqual(b'cdefg', pipe.read(5))
+        self.assertEqual(b'h', pipe.read())
+        self.assertEqual(b'', pipe.read(10))
+
+    def test_extract_while_feeding(self):
+        extractor = StreamingTarExtractor(extract_dir=EXTRACT_PATH, max_chunks=2)
+        feed_in_chunks(extractor, TAR_CONTENT)
+
+        self.assertTrue(extractor.close())
+        self.assertEqual(3, extractor.member_count)
+        self.assert_extracted()
+
+    def test_extract_saves_index(self):
+        archive_file_path = os.path.join(OUTPUT_PATH, 'test_archive.tar')
+
+        with open(archive_file_path, 'wb') as f:
+            f.write(TAR_CONTENT)
+
+        extractor = StreamingTarExtractor(extract_dir=EXTRACT_PATH, archive_file_path=archive_file_path)
+        feed_in_chunks(extractor, TAR_CONTENT)
+        self.assertTrue(extractor.close())
+
+        # The index was found while the archive was read, so it does not have to be built from the archive after
+        index = MemberIndex.load(archive_file_path)
+        self.assertIsNotNone(index)
+        self.assertEqual(MemberIndex.build(archive_file_path).entries, index.entries)
+
+    def test_extract_resumed(self):
+        extractor = StreamingTarExtractor(extract_dir=EXTRACT_PATH)
+        feed_in_chunks(extractor, TAR_CONTENT[:100000])
+        extractor.abort()
+
+        # The first image and the .geom file were fully extracted before the stop, so only the second image is written
+        extractor = StreamingTarExtractor(extract_dir=EXTRACT_PATH)
+        feed_in_chunks(extractor, TAR_CONTENT)
+
+        self.assertTrue(extractor.close())
+        self.assertEqual(1, extractor.member_count)
+        self.assert_extracted()
+
+    def test_extract_corrupted(self):
+        extractor = StreamingTarExtractor(extract_dir=EXTRACT_PATH)
+        feed_in_chunks(extractor, b'not a tar archive' * 10000)
+
+        self.assertFalse(extractor.close())
+        self.assertIsNotNone(extractor.error)
+
+    def test_extract_unexpected_error(self):
+        with patch.object(streaming, 'process_tar', side_effect=ValueError('Bad header')):
+            extractor = StreamingTarExtractor(extract_dir=EXTRACT_PATH, max_chunks=2)
+
+            # The download keeps going (and does not wait forever on the full pipe) after the extraction stopped
+            feeder = threading.Thread(target=feed_in_chunks, args=(extractor, TAR_CONTENT), daemon=True)
+            feeder.start()
+            feeder.join(timeout=10)
+
+            self.assertFalse(feeder.is_alive())
+            self.assertFalse(extractor.close())
+            self.assertIsInstance(extractor.error, ValueError)
+
+    def test_download_url_stream_extract_resume(self):
+
+        # Pretend that part of the archive was downloaded before
+        with open(os.path.join(OUTPUT_PATH, 'test_archive.tar' + s.PART_SUFFIX), 'wb') as f:
+            f.write(TAR_CONTENT[:50000])
+
+        with LocalServer({'/storm/test_archive.tar': TAR_CONTENT}) as server:
+            archive = Archive(archive_url=server.url('/storm/test_archive.tar'))
+            archive.download_url(output_dir=OUTPUT_PATH, user='test_dummy', stream_extract=True).close()
+
+        with open(os.path.join(OUTPUT_PATH, 'test_archive.tar'), 'rb') as f:
+            self.assertEqual(TAR_CONTENT, f.read())
+
+        self.assert_extracted()
+        self.assertTrue(os.path.isfile(os.path.join(OUTPUT_PATH, 'test_archive.tar' + s.MANIFEST_SUFFIX)))
+
+    def test_download_url_size_mismatch(self):
+        with LocalServer({'/storm/test_archive.tar': TAR_CONTENT}) as server:
+            archive = Archive(archive_url=server.url('/storm/test_archive.tar'))
+
+            # The website lists a different size than it sends, which is tried again instead of stopping the program
+            with patch.object(archive, 'get_file_size_origin', return_value=len(TAR_CONTENT) + 512):
+                with self.assertRaises(ConnectionError):
+                    archive.download_url(output_dir=OUTPUT_PATH, user='test_dummy', stream_extract=True)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
@@ -1,10 +1,29 @@
+import os
+import shutil
 from unittest import TestCase
 
 from psicollect.common import h
 
+SELF_PATH = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(SELF_PATH, 'data')
+OUTPUT_PATH = os.path.join(DATA_PATH, 'output_h')
+
+
+def make_file(path: str, size: int) -> None:
+    """Create a file (and the directories it is in) with the given number of bytes"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+
 
 class TestHelper(TestCase):
 
+    def setUp(self) -> None:
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)
+        os.makedirs(OUTPUT_PATH)
+
     def test_to_readable_bytes(self):
         self.assertIn('???', h.to_readable_bytes('taco'))
         self.assertIn('???', h.to_readable_bytes(None))
@@ -12,3 +31,39 @@ class TestHelper(TestCase):
         self.assertIn('KiB', h.to_readable_bytes(1024 ** 1 + 1))
         self.assertIn('MiB', h.to_readable_bytes(1024 ** 2 + 1))
         self.assertIn('GiB', h.to_readable_bytes(1024 ** 3 + 1))
+
+    def test_find_images(self):
+        for archive in range(3):
+            jpgs = os.path.join(OUTPUT_PATH, 'Florence', '2018091' + str(archive) + 'a_RGB', 'jpgs')
+
+            make_file(os.path.join(jpgs, 'C000' + str(archive) + '.jpg'), 100 + archive)
+            make_file(os.path.join(jpgs, 'C000' + str(archive) + '.geom'), 10)
+
+        jpgs = os.path.join(OUTPUT_PATH, 'Florence', '20180910a_RGB', 'jpgs')
+
+        # A copy with the same size as the original, a different image that only has a similar name, an image without
+        # a .geom file, and a file of another type
+        make_file(os.path.join(jpgs, 'C0000 (1).jpg'), 100)
+        make_file(os.path.join(jpgs, 'C0000 (2).jpg'), 555)
+        make_file(os.path.join(jpgs, 'C0009.jpg'), 100)
+        make_file(os.path.join(jpgs, 'C0000.txt'), 100)
+
+        images = h.find_images(OUTPUT_PATH, require_geom=True, workers=2)
+
+        self.assertEqual([(os.path.join(OUTPUT_PATH, 'Florence', '20180910a_RGB', 'jpgs', 'C0000.jpg'), 100),
+                          (os.path.join(OUTPUT_PATH, 'Florence', '20180911a_RGB', 'jpgs', 'C0001.jpg'), 101),
+                          (os.path.join(OUTPUT_PATH, 'Florence', '20180912a_RGB', 'jpgs', 'C0002.jpg'), 102)], images)
+
+        self.assertEqual(['Florence/20180910a_RGB/jpgs/C0000 (2).jpg', 'Florence/20180910a_RGB/jpgs/C0000.jpg',
+                          'Florence/20180910a_RGB/jpgs/C0009.jpg', 'Florence/20180911a_RGB/jpgs/C0001.jpg',
+                          'Florence/20180912a_RGB/jpgs/C0002.jpg'],
+                         h.all_files_recursively(OUTPUT_PATH, unix_sep=True))
+
+        self.assertEqual(['Florence/20180911a_RGB/jpgs/C0001.jpg'],
+                         h.all_files_recursively(OUTPUT_PATH, unix_sep=True, file_search_re='C0001'))
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+
+        if os.path.exists(OUTPUT_PATH):
+            shutil.rmtree(OUTPUT_PATH)